@@ -8,6 +8,7 @@ from .schemas import (
 )
 from auth.services.login_service import LoginService
 from .database_config import DatabaseConfig
+from shared.serialization import trusted_json_response
 
 router = APIRouter(prefix='/api/admin', tags=['Admin'])
 
@@ -87,12 +88,12 @@ def get_all_rides(
     current_admin_id: str = Depends(login_service.get_current_user)
 ):
     """Get all rides with optional status filter - Admin only"""
-    return admin_service.get_all_rides(
+    return trusted_json_response(admin_service.get_all_rides(
         current_admin_id, 
         status_filter=status, 
         page=page, 
         limit=limit
-    )
+    ))
 
 @router.get("/rides/{ride_id}/details")
 def get_ride_details(
@@ -110,7 +111,7 @@ def get_all_payments(
     current_admin_id: str = Depends(login_service.get_current_user)
 ):
     """Get all payments - Admin only"""
-    return admin_service.get_all_payments(current_admin_id, page=page, limit=limit)
+    return trusted_json_response(admin_service.get_all_payments(current_admin_id, page=page, limit=limit))
 
 @router.get("/payments/{payment_id}/details")
 def get_payment_details(
@@ -120,6 +121,14 @@ def get_payment_details(
     """Get detailed payment information - Admin only"""
     return admin_service.get_payment_details_admin(current_admin_id, payment_id)
 
+# Runtime Metrics Routes
+@router.get("/metrics")
+def get_runtime_metrics(
+    current_admin_id: str = Depends(login_service.get_current_user)
+):
+    """Get in-process cache and connection metrics for this worker - Admin only"""
+    return admin_service.get_runtime_metrics(current_admin_id)
+
 # Dashboard and Analytics Routes
 @router.get("/dashboard", response_model=AdminDashboardResponse)
 def get_dashboard_stats(
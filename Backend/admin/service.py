@@ -5,7 +5,11 @@ import uuid
 
 from users.service import UserService
 from drivers.service import DriverService
-from rides.service import RideService
+from rides.service import RideService, rating_summary_cache
+from rides.expiry import ride_expiry_sweeper
+from rides.dispatch import ride_dispatcher
+from rides.websocket.connection_manager import connection_manager
+from rides.websocket.location_relay import location_relay
 from payments.service import PaymentService
 from .schemas import (
     AdminUserResponse, AdminDriverResponse, AdminRideResponse, 
@@ -269,23 +273,23 @@ class AdminService:
                 except:
                     payment_info = None
                 
-                admin_ride = AdminRideResponse(
-                    ride_id=ride["ride_id"],
-                    user_id=ride["user_id"],
-                    user_name=ride.get("user_name", "Unknown"),
-                    driver_id=ride.get("driver_id"),
-                    driver_name=ride.get("driver_name"),
-                    pickup=ride["pickup"],
-                    drop=ride["drop"],
-                    fare=ride.get("fare"),
-                    distance=ride.get("distance"),
-                    status=ride["status"],
-                    payment_status=ride.get("payment_status", "pending"),
-                    payment_method=payment_info.get("payment_method") if payment_info else None,
-                    created_at=ride["created_at"],
-                    completed_at=ride.get("completed_at")
-                )
-                admin_rides.append(admin_ride)
+                # Plain dict in AdminRideResponse shape; validated once by the route
+                admin_rides.append({
+                    "ride_id": ride["ride_id"],
+                    "user_id": ride["user_id"],
+                    "user_name": ride.get("user_name", "Unknown"),
+                    "driver_id": ride.get("driver_id"),
+                    "driver_name": ride.get("driver_name"),
+                    "pickup": ride["pickup"],
+                    "drop": ride["drop"],
+                    "fare": ride.get("fare"),
+                    "distance": ride.get("distance"),
+                    "status": ride["status"],
+                    "payment_status": ride.get("payment_status", "pending"),
+                    "payment_method": payment_info.get("payment_method") if payment_info else None,
+                    "created_at": ride["created_at"],
+                    "completed_at": ride.get("completed_at")
+                })
             
             return {
                 "rides": admin_rides,
@@ -320,18 +324,18 @@ class AdminService:
             # Transform data for admin response
             admin_payments = []
             for payment in payments_data.get("payments", []):
-                admin_payment = AdminPaymentResponse(
-                    payment_id=payment["id"],
-                    ride_id=payment["ride_id"],
-                    user_id=payment.get("user_id"),
-                    driver_id=payment.get("driver_id"),
-                    amount=payment["amount"],
-                    payment_method=payment["payment_method"],
-                    transaction_id=payment.get("transaction_id"),
-                    status=payment["status"],
-                    created_at=payment["created_at"]
-                )
-                admin_payments.append(admin_payment)
+                # Plain dict in AdminPaymentResponse shape; validated once by the route
+                admin_payments.append({
+                    "payment_id": payment["id"],
+                    "ride_id": payment["ride_id"],
+                    "user_id": payment.get("user_id"),
+                    "driver_id": payment.get("driver_id"),
+                    "amount": payment["amount"],
+                    "payment_method": payment["payment_method"],
+                    "transaction_id": payment.get("transaction_id"),
+                    "status": payment["status"],
+                    "created_at": payment["created_at"]
+                })
             
             return {
                 "payments": admin_payments,
@@ -349,6 +353,24 @@ class AdminService:
                 detail=f"Error fetching payments: {str(e)}"
             )
     
+    # Runtime Metrics Methods
+    def get_runtime_metrics(self, current_admin_id: str) -> Dict:
+        """Get in-process cache and connection metrics for this worker"""
+        if not self.verify_admin_access(current_admin_id):
+            raise HTTPException(
+                status_code=status.HTTP_403_FORBIDDEN,
+                detail="Admin access required"
+            )
+        
+        return {
+            "rating_summary_cache": rating_summary_cache.stats(),
+            "ride_expiry": ride_expiry_sweeper.stats(),
+            "ride_dispatch": ride_dispatcher.stats(),
+            "websocket": connection_manager.stats(),
+            "ride_rooms": connection_manager.room_stats(),
+            "location_relay": location_relay.stats()
+        }
+    
     # Dashboard and Analytics Methods
     def get_dashboard_stats(self, current_admin_id: str) -> AdminDashboardResponse:
         """Get admin dashboard statistics"""
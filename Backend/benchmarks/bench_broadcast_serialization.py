@@ -0,0 +1,90 @@
+"""Benchmark: cost per recipient of a `new_ride` broadcast to N drivers.
+
+  before  the payload re-built with a fresh timestamp and json.dumps'd for
+          every recipient (the previous send_personal_message loop)
+  after   ConnectionManager.broadcast_to_drivers: one encoded frame, shared
+          by every recipient's send queue
+
+Only the producer side is measured (building and enqueueing frames); socket
+writes happen in the per-connection writer tasks either way.
+
+Run from Backend/:  python -m benchmarks.bench_broadcast_serialization [drivers] [repeats]
+"""
+import asyncio
+import json
+import sys
+import time
+import uuid
+from datetime import datetime
+
+from rides.websocket.connection_manager import ClientConnection, ConnectionManager
+from shared.serialization import orjson
+
+def make_message():
+    return {
+        "type": "new_ride",
+        "message": "New ride request available",
+        "data": {
+            "ride_id": str(uuid.uuid4()),
+            "user_id": str(uuid.uuid4()),
+            "driver_id": None,
+            "pickup": "Dhanmondi 27, Dhaka",
+            "drop": "Gulshan 2, Dhaka",
+            "status": "pending",
+            "payment_status": "pending",
+            "requested_at": datetime.now().isoformat(),
+            "fare": 187.35
+        }
+    }
+
+def make_manager(driver_ids):
+    # Connections without writer tasks: frames stay queued and are discarded
+    manager = ConnectionManager(max_queue=sys.maxsize)
+    for driver_id in driver_ids:
+        connection = ClientConnection(driver_id, None)
+        manager.active_connections[driver_id] = {connection.connection_id: connection}
+    return manager
+
+def drain(manager):
+    for connections in manager.active_connections.values():
+        for connection in connections.values():
+            connection.queue.clear()
+
+async def before(manager, message, driver_ids):
+    for driver_id in driver_ids:
+        if driver_id in manager.active_connections:
+            manager._enqueue(driver_id, json.dumps({
+                **message,
+                "timestamp": datetime.now().isoformat()
+            }))
+
+async def after(manager, message, driver_ids):
+    await manager.broadcast_to_drivers(message, driver_ids)
+
+async def measure(func, manager, message, driver_ids, repeats):
+    best = float("inf")
+    for _ in range(3):
+        elapsed = 0.0
+        for _ in range(repeats):
+            drain(manager)
+            start = time.perf_counter()
+            await func(manager, message, driver_ids)
+            elapsed += time.perf_counter() - start
+        best = min(best, elapsed / repeats)
+    return best
+
+async def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    repeats = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+    driver_ids = [str(uuid.uuid4()) for _ in range(count)]
+    manager = make_manager(driver_ids)
+    message = make_message()
+
+    print(f"{count} drivers x {repeats} repeats (orjson {'installed' if orjson else 'not installed'})")
+    reference = await measure(before, manager, message, driver_ids, repeats)
+    for name, func in (("before", before), ("after", after)):
+        seconds = reference if func is before else await measure(func, manager, message, driver_ids, repeats)
+        print(f"  {name:8s} {seconds * 1e3:8.2f} ms/broadcast  {seconds / count * 1e6:6.2f} us/recipient  {reference / seconds:5.2f}x")
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,85 @@
+"""Benchmark: a 500-row /api/admin/rides page through the default response path
+vs the trusted-construction + fast JSON path.
+
+  baseline  AdminRideResponse built per row, then FastAPI's response_model
+            validation and the standard JSONResponse encoder
+  dicts     rows built as plain dicts, still validated by response_model
+            (FAST_JSON_RESPONSES off)
+  fast      plain dicts encoded by FastJSONResponse (FAST_JSON_RESPONSES on;
+            orjson if installed)
+
+Run from Backend/:  python -m benchmarks.bench_list_serialization [rows] [repeats]
+"""
+import asyncio
+import sys
+import time
+import uuid
+from datetime import datetime, timedelta
+
+from fastapi.responses import JSONResponse
+from fastapi.routing import serialize_response
+from fastapi.utils import create_model_field
+
+from admin.schemas import AdminRideResponse, AdminRidesListResponse
+from shared.serialization import FastJSONResponse, orjson
+
+response_field = create_model_field(name="response", type_=AdminRidesListResponse, mode="serialization")
+
+def make_rides(count: int):
+    base = datetime(2024, 1, 1, 8, 0, 0)
+    return [
+        {
+            "ride_id": str(uuid.uuid4()),
+            "user_id": str(uuid.uuid4()),
+            "user_name": "Rahim Uddin",
+            "driver_id": str(uuid.uuid4()),
+            "driver_name": "Karim Mia",
+            "pickup": "Dhanmondi 27, Dhaka",
+            "drop": "Gulshan 2, Dhaka",
+            "fare": 187.35,
+            "distance": 9.1,
+            "status": "completed",
+            "payment_status": "paid",
+            "payment_method": "cash",
+            "created_at": (base + timedelta(minutes=i)).isoformat(),
+            "completed_at": (base + timedelta(minutes=i + 25)).isoformat(),
+        }
+        for i in range(count)
+    ]
+
+def page(rides):
+    return {"rides": rides, "total_count": len(rides), "page": 1, "limit": len(rides), "total_pages": 1, "status_filter": None}
+
+async def baseline(rows):
+    content = page([AdminRideResponse(**row) for row in rows])
+    return JSONResponse(await serialize_response(field=response_field, response_content=content)).body
+
+async def dicts(rows):
+    content = page([dict(row) for row in rows])
+    return JSONResponse(await serialize_response(field=response_field, response_content=content)).body
+
+async def fast(rows):
+    return FastJSONResponse(page([dict(row) for row in rows])).body
+
+async def measure(func, rows, repeats):
+    best = float("inf")
+    for _ in range(3):
+        start = time.perf_counter()
+        for _ in range(repeats):
+            await func(rows)
+        best = min(best, (time.perf_counter() - start) / repeats)
+    return best
+
+async def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    repeats = int(sys.argv[2]) if len(sys.argv) > 2 else 100
+    rows = make_rides(count)
+
+    print(f"{count} rows x {repeats} repeats (orjson {'installed' if orjson else 'not installed'})")
+    reference = await measure(baseline, rows, repeats)
+    for name, func in (("baseline", baseline), ("dicts", dicts), ("fast", fast)):
+        seconds = reference if func is baseline else await measure(func, rows, repeats)
+        print(f"  {name:10s} {seconds * 1e3:8.3f} ms/page  {reference / seconds:5.2f}x")
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,86 @@
+"""Micro-benchmark: raw dict rows validated into RideResponse instances vs
+slotted Ride entities turned into response payloads.
+
+Each path is timed through the same response step FastAPI performs for a
+`response_model=List[RideResponse]` route (model instances are dumped back to
+dicts, then validated and serialized), so the numbers reflect a /rides/pending
+page rather than object construction alone.
+
+Run from Backend/:  python -m benchmarks.bench_ride_entities [rows] [repeats]
+"""
+import json
+import sys
+import timeit
+import tracemalloc
+import uuid
+from datetime import datetime, timedelta
+from typing import List
+
+from pydantic import BaseModel, TypeAdapter
+
+from rides.models.entities import Ride
+from rides.schemas import RideResponse, ride_response_payload
+
+response_adapter = TypeAdapter(List[RideResponse])
+
+def make_rows(count: int):
+    base = datetime(2024, 1, 1, 8, 0, 0)
+    return [
+        {
+            "ride_id": str(uuid.uuid4()),
+            "user_id": str(uuid.uuid4()),
+            "driver_id": None,
+            "pickup": "Dhanmondi 27, Dhaka",
+            "drop": "Gulshan 2, Dhaka",
+            "status": "pending",
+            "payment_status": "pending",
+            "requested_at": (base + timedelta(minutes=i)).isoformat(),
+            "start_time": None,
+            "end_time": None,
+            "fare": 187.35,
+            "rating_by_user": None,
+            "rating_by_driver": None,
+            "cancel_reason": None,
+            "created_at": (base + timedelta(minutes=i)).isoformat(),
+            "updated_at": (base + timedelta(minutes=i)).isoformat(),
+        }
+        for i in range(count)
+    ]
+
+def respond(content) -> bytes:
+    # What FastAPI's serialize_response does for a List[RideResponse] response_model
+    content = [item.model_dump() if isinstance(item, BaseModel) else item for item in content]
+    validated = response_adapter.validate_python(content)
+    return json.dumps(response_adapter.dump_python(validated, mode="json")).encode("utf-8")
+
+def dict_path(rows):
+    return respond([RideResponse(**row) for row in rows])
+
+def entity_path(rows):
+    return respond([ride_response_payload(Ride.from_row(row)) for row in rows])
+
+def retained_bytes(build):
+    tracemalloc.start()
+    snapshot = tracemalloc.take_snapshot()
+    objects = build()
+    size = sum(stat.size_diff for stat in tracemalloc.take_snapshot().compare_to(snapshot, "filename"))
+    tracemalloc.stop()
+    del objects
+    return size
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    repeats = int(sys.argv[2]) if len(sys.argv) > 2 else 100
+    rows = make_rows(count)
+
+    print(f"{count} rows x {repeats} repeats")
+    for name, func in (("dict -> RideResponse(**row)", dict_path), ("Ride entity -> payload", entity_path)):
+        seconds = min(timeit.repeat(lambda: func(rows), number=repeats, repeat=3)) / repeats
+        print(f"  {name:30s} {seconds * 1e3:8.3f} ms/page  {seconds / count * 1e6:6.2f} us/row")
+
+    print("retained memory per materialized row:")
+    print(f"  {'raw dict row':30s} {retained_bytes(lambda: make_rows(count)) / count:8.0f} B")
+    print(f"  {'slotted Ride entity':30s} {retained_bytes(lambda: [Ride.from_row(row) for row in rows]) / count:8.0f} B")
+
+if __name__ == "__main__":
+    main()
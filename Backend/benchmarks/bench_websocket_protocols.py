@@ -0,0 +1,86 @@
+"""Benchmark: parse + dispatch cost of one driver location ping per protocol.
+
+  json    a JSON text frame, parsed with json.loads (the default protocol)
+  binary  a fixed-layout frame on the bhaijaben.binary.v1 subprotocol
+
+Each ping goes through the websocket router's parse_frame and handle_message,
+ending in LocationRelay.submit with the ride's driver check already cached,
+i.e. the steady-state path of a driver pinging during a ride. Frame sizes are
+reported as well, for both directions of a location update.
+
+Run from Backend/:  python -m benchmarks.bench_websocket_protocols [messages] [repeats]
+"""
+import asyncio
+import json
+import sys
+import time
+import uuid
+
+from rides.websocket.connection_manager import ConnectionManager
+from rides.websocket.location_relay import location_relay
+from rides.websocket.protocol import encode_driver_location, encode_location_update
+from rides.websocket.router import handle_message, parse_frame
+
+RIDE_ID = str(uuid.uuid4())
+DRIVER_ID = str(uuid.uuid4())
+
+def make_pings(count):
+    pings = []
+    for i in range(count):
+        latitude, longitude = 23.7465 + i * 1e-5, 90.3760 + i * 1e-5
+        recorded_at = int(time.time() * 1000) + i * 1000
+        text = json.dumps({
+            "type": "location_update",
+            "data": {
+                "ride_id": RIDE_ID,
+                "latitude": latitude,
+                "longitude": longitude,
+                "heading": 87.5,
+                "speed": 8.3,
+                "recorded_at": recorded_at
+            }
+        })
+        binary = encode_location_update(RIDE_ID, latitude, longitude, 87.5, 8.3, recorded_at)
+        pings.append(({"type": "websocket.receive", "text": text}, {"type": "websocket.receive", "bytes": binary}))
+    return pings
+
+async def measure(frames, repeats, dispatch=True):
+    best = float("inf")
+    for _ in range(repeats):
+        start = time.perf_counter()
+        for frame in frames:
+            message = parse_frame(frame)
+            if dispatch and message is not None:
+                await handle_message(DRIVER_ID, message)
+        best = min(best, time.perf_counter() - start)
+    return best / len(frames)
+
+async def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 50000
+    repeats = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+    # Driver check cached, as after the ride's first ping
+    location_relay._authorized[RIDE_ID] = (None, DRIVER_ID, "ongoing", float("inf"))
+    pings = make_pings(count)
+
+    position = {**json.loads(pings[0][0]["text"])["data"], "driver_id": DRIVER_ID}
+    outbound_json = ConnectionManager.encode_frame({"type": "driver_location", "data": position}).encode("utf-8")
+    outbound_binary = encode_driver_location(position)
+
+    print(f"{count} pings x {repeats} repeats (best run)")
+    texts, binaries = [text for text, _ in pings], [binary for _, binary in pings]
+    rows = (
+        ("json", texts, len(texts[0]["text"]), len(outbound_json)),
+        ("binary", binaries, len(binaries[0]["bytes"]), len(outbound_binary))
+    )
+    reference = None
+    for name, frames, inbound, outbound in rows:
+        parse = await measure(frames, repeats, dispatch=False)
+        total = await measure(frames, repeats)
+        reference = reference or (parse, total)
+        print(f"  {name:8s} parse {parse * 1e6:6.2f} us ({reference[0] / parse:4.1f}x)  "
+              f"parse+dispatch {total * 1e6:6.2f} us ({reference[1] / total:4.1f}x)  "
+              f"inbound {inbound:4d} B  outbound {outbound:4d} B")
+    print(f"  pings received by the relay: {location_relay.pings_received}, coalesced: {location_relay.pings_coalesced}")
+
+if __name__ == "__main__":
+    asyncio.run(main())
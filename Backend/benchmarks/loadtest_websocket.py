@@ -0,0 +1,292 @@
+"""Load test: simulated drivers and riders driving the websocket layer in-process.
+
+Every simulated user runs the real websocket endpoint (rides.websocket.router)
+over an in-memory socket, and rides go through RideService against the
+offline database stand-in (benchmarks.offline_db), so the whole path is
+exercised without a network or a database:
+
+  drivers  connect, then send a location_update every --ping-interval seconds:
+           their position while waiting, their ride's position while on one
+  riders   create rides at --ride-rate per second overall; the first driver
+           offered a ride applies, is selected (which puts rider and driver
+           in the ride room) and starts it, the rider also subscribes with
+           subscribe_ride, and the ride completes after --ride-seconds
+
+Reported: connection set-up rate and memory per connection (tracemalloc,
+measured while connecting only), location updates handled per second,
+latency percentiles of ride offers (create_ride called -> new_ride handed
+to the driver's socket) and of relayed driver locations (ping ->
+driver_location at the rider's socket, which includes up to one relay
+interval of coalescing), and event-loop lag. Raise --drivers until the lag percentiles exceed your
+budget to find a worker's capacity.
+
+Run from Backend/:  python -m benchmarks.loadtest_websocket [--drivers N] [--riders N] [--duration S] ...
+"""
+import argparse
+import asyncio
+import gc
+import json
+import random
+import time
+import tracemalloc
+import uuid
+from typing import Dict, List, Optional
+
+from benchmarks.offline_db import OfflineClient
+from rides.dispatch import ride_dispatcher
+from rides.schemas import RideApplicationRequest, RideCreateRequest
+from rides.service import RideService
+from rides.websocket.connection_manager import connection_manager
+from rides.websocket.location_relay import location_relay
+from rides.websocket.router import websocket_endpoint
+
+# Simulated city: positions within ~10 km of central Dhaka
+CENTER = (23.7806, 90.4070)
+SPREAD_DEGREES = 0.09
+
+def random_position(rng: random.Random):
+    return (CENTER[0] + rng.uniform(-SPREAD_DEGREES, SPREAD_DEGREES),
+            CENTER[1] + rng.uniform(-SPREAD_DEGREES, SPREAD_DEGREES))
+
+def percentiles(samples: List[float]) -> str:
+    if not samples:
+        return "no samples"
+    ordered = sorted(samples)
+    pick = lambda q: ordered[min(int(q * len(ordered)), len(ordered) - 1)]
+    return (f"p50 {pick(0.50):7.2f}  p95 {pick(0.95):7.2f}  p99 {pick(0.99):7.2f}  "
+            f"max {ordered[-1]:7.2f} ms  (n={len(ordered)})")
+
+class SimulatedSocket:
+    """The parts of starlette's WebSocket the endpoint uses, in memory"""
+
+    def __init__(self, on_frame):
+        self.scope = {"subprotocols": []}
+        self.query_params: Dict[str, str] = {}
+        self.inbound: asyncio.Queue = asyncio.Queue()
+        self.on_frame = on_frame
+        self.accepted = asyncio.Event()
+
+    async def accept(self, subprotocol: Optional[str] = None):
+        self.accepted.set()
+
+    async def receive(self) -> Dict:
+        return await self.inbound.get()
+
+    async def send_text(self, text: str):
+        self.on_frame(text)
+
+    async def send_bytes(self, data: bytes):
+        self.on_frame(data)
+
+    async def close(self, code: int = 1000):
+        self.inbound.put_nowait({"type": "websocket.disconnect", "code": code})
+
+    def send_json(self, message: Dict):
+        self.inbound.put_nowait({"type": "websocket.receive", "text": json.dumps(message)})
+
+class LoadTest:
+    def __init__(self, args):
+        self.args = args
+        self.rng = random.Random(args.seed)
+        self.driver_ids = [str(uuid.uuid4()) for _ in range(args.drivers)]
+        self.rider_ids = [str(uuid.uuid4()) for _ in range(args.riders)]
+        self.client = OfflineClient(self._seed_tables())
+        self.service = RideService(self.client)
+        self.sockets: Dict[str, SimulatedSocket] = {}
+        self.endpoints: List[asyncio.Task] = []
+        self.positions = {driver_id: random_position(self.rng) for driver_id in self.driver_ids}
+        self.driver_rides: Dict[str, str] = {}  # driver on a ride -> ride_id
+        self.offers: Dict[str, asyncio.Future] = {}  # ride_id -> first driver offered it
+        self.ride_created_at: Dict[str, float] = {}
+        self.offer_latency: List[float] = []
+        self.location_latency: List[float] = []
+        self.loop_lag: List[float] = []
+        self.pings_sent = 0
+        self.rides_created = 0
+        self.rides_completed = 0
+        self.ride_errors = 0
+        self.subscribed = 0
+        self.subscribe_rejected = 0
+
+    def _seed_tables(self) -> Dict[str, List[Dict]]:
+        users = [{"id": driver_id, "role": "driver", "name": "Driver", "phone": "0"} for driver_id in self.driver_ids]
+        users += [{"id": rider_id, "role": "rider", "name": "Rider", "phone": "0"} for rider_id in self.rider_ids]
+        profiles = [{"user_id": driver_id, "license": "L", "vehicle_info": "V", "is_approved": True}
+                    for driver_id in self.driver_ids]
+        return {"users": users, "driver_profiles": profiles}
+
+    # Simulated clients
+
+    def _frame_handler(self, user_id: str):
+        def on_frame(frame):
+            if isinstance(frame, bytes):
+                return
+            message = json.loads(frame)
+            kind = message.get("type")
+            if kind == "new_ride":
+                ride_id = message["data"]["ride_id"]
+                created = self.ride_created_at.get(ride_id)
+                if created is not None:
+                    self.offer_latency.append((time.perf_counter() - created) * 1000)
+                offer = self.offers.get(ride_id)
+                if offer is not None and not offer.done() and user_id not in self.driver_rides:
+                    offer.set_result(user_id)
+            elif kind == "subscribed":
+                self.subscribed += 1
+            elif kind == "subscribe_rejected":
+                self.subscribe_rejected += 1
+            elif kind == "driver_location":
+                sent_at = message["data"].get("recorded_at")
+                if sent_at is not None:
+                    self.location_latency.append(time.perf_counter() * 1000 - sent_at)
+        return on_frame
+
+    async def connect(self, user_id: str):
+        socket = SimulatedSocket(self._frame_handler(user_id))
+        self.sockets[user_id] = socket
+        self.endpoints.append(asyncio.create_task(websocket_endpoint(socket, user_id)))
+        await socket.accepted.wait()
+
+    async def drive(self, driver_id: str, until: float):
+        socket = self.sockets[driver_id]
+        await asyncio.sleep(self.rng.uniform(0, self.args.ping_interval))
+        while time.perf_counter() < until:
+            latitude, longitude = self.positions[driver_id]
+            latitude += self.rng.uniform(-0.0003, 0.0003)
+            longitude += self.rng.uniform(-0.0003, 0.0003)
+            self.positions[driver_id] = (latitude, longitude)
+            socket.send_json({"type": "location_update", "data": {
+                "ride_id": self.driver_rides.get(driver_id),
+                "latitude": latitude,
+                "longitude": longitude,
+                # perf_counter milliseconds, echoed back by the relay for latency
+                "recorded_at": time.perf_counter() * 1000
+            }})
+            self.pings_sent += 1
+            await asyncio.sleep(self.args.ping_interval)
+
+    async def ride(self, rider_id: str):
+        pickup, drop = random_position(self.rng), random_position(self.rng)
+        try:
+            started = time.perf_counter()
+            ride = await self.service.create_ride(rider_id, RideCreateRequest(
+                pickup="Pickup", drop="Drop",
+                pickup_coordinates={"latitude": pickup[0], "longitude": pickup[1]},
+                drop_coordinates={"latitude": drop[0], "longitude": drop[1]}
+            ))
+            self.rides_created += 1
+            # Offers are delivered by writer tasks after create_ride returns
+            self.ride_created_at[ride.ride_id] = started
+            offer = self.offers[ride.ride_id] = asyncio.get_running_loop().create_future()
+            driver_id = await asyncio.wait_for(offer, timeout=self.args.ride_seconds)
+            self.driver_rides[driver_id] = ride.ride_id
+
+            position = self.positions[driver_id]
+            await self.service.apply_for_ride(driver_id, RideApplicationRequest(
+                ride_id=ride.ride_id, current_location={"latitude": position[0], "longitude": position[1]}
+            ))
+            await self.service.select_driver(rider_id, ride.ride_id, driver_id)
+            await self.service.start_ride(driver_id, ride.ride_id)
+            # Exercises the client-initiated path (participant check included)
+            self.sockets[rider_id].send_json({"type": "subscribe_ride", "data": {"ride_id": ride.ride_id}})
+
+            await asyncio.sleep(self.args.ride_seconds)
+            await self.service.complete_ride(driver_id, ride.ride_id)
+            self.driver_rides.pop(driver_id, None)
+            self.rides_completed += 1
+        except asyncio.TimeoutError:
+            pass
+        except Exception as e:
+            self.ride_errors += 1
+            print(f"  ride error: {e!r}")
+
+    async def create_rides(self, until: float):
+        rides = []
+        while time.perf_counter() < until - self.args.ride_seconds:
+            rides.append(asyncio.create_task(self.ride(self.rng.choice(self.rider_ids))))
+            await asyncio.sleep(self.rng.expovariate(self.args.ride_rate))
+        await asyncio.gather(*rides)
+
+    async def watch_loop_lag(self, interval: float = 0.05):
+        while True:
+            expected = time.perf_counter() + interval
+            await asyncio.sleep(interval)
+            self.loop_lag.append(max(time.perf_counter() - expected, 0.0) * 1000)
+
+    # Run
+
+    async def run(self):
+        args = self.args
+        location_relay.interval_seconds = args.relay_interval
+        await connection_manager.start(self.client)
+        location_relay.start(self.client)
+        ride_dispatcher.start(self.client)
+
+        users = self.driver_ids + self.rider_ids
+        gc.collect()
+        tracemalloc.start()
+        memory_before = tracemalloc.get_traced_memory()[0]
+        started = time.perf_counter()
+        for user_id in users:
+            await self.connect(user_id)
+        connect_seconds = time.perf_counter() - started
+        memory_per_connection = (tracemalloc.get_traced_memory()[0] - memory_before) / len(users)
+        tracemalloc.stop()
+
+        # Let presence lookups finish before rides are offered
+        while connection_manager.presence.stats()["pending_lookups"]:
+            await asyncio.sleep(0.05)
+
+        print(f"{args.drivers} drivers + {args.riders} riders, {args.duration:.0f} s, "
+              f"ping every {args.ping_interval} s, {args.ride_rate} rides/s")
+        print(f"  connections   {len(users)} in {connect_seconds:.2f} s ({len(users) / connect_seconds:.0f}/s), "
+              f"{memory_per_connection / 1024:.1f} KiB per connection")
+
+        lag = asyncio.create_task(self.watch_loop_lag())
+        until = time.perf_counter() + args.duration
+        load_started = time.perf_counter()
+        await asyncio.gather(self.create_rides(until), *(self.drive(driver_id, until) for driver_id in self.driver_ids))
+        elapsed = time.perf_counter() - load_started
+        lag.cancel()
+
+        relay = location_relay.stats()
+        print(f"  locations     {self.pings_sent} updates, {self.pings_sent / elapsed:.0f}/s; "
+              f"{relay['updates_sent']} relayed to ride rooms, {relay['pings_coalesced']} coalesced")
+        print(f"  rides         {self.rides_created} created, {self.rides_completed} completed, "
+              f"{self.ride_errors} errors, {ride_dispatcher.stats()['notifications_sent']} offers sent; "
+              f"{self.subscribed} room subscriptions, {self.subscribe_rejected} rejected")
+        print(f"  offer latency     {percentiles(self.offer_latency)}")
+        print(f"  location latency  {percentiles(self.location_latency)}")
+        print(f"  event-loop lag    {percentiles(self.loop_lag)}")
+        websocket = connection_manager.stats()
+        print(f"  send queues   max depth {websocket['max_queue_depth']}, "
+              f"{websocket['frames_dropped']} frames dropped, {websocket['send_failures']} send failures")
+        rooms = connection_manager.room_stats()
+        print(f"  ride rooms    {rooms['rooms_opened']} opened, {rooms['rooms_closed']} closed, "
+              f"{rooms['rooms']} left ({rooms['approx_bytes'] / 1024:.1f} KiB of room indexes)")
+
+        for socket in self.sockets.values():
+            await socket.close()
+        await asyncio.gather(*self.endpoints, return_exceptions=True)
+        await ride_dispatcher.stop()
+        await location_relay.stop()
+        await connection_manager.stop()
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="In-process websocket load test against the offline database")
+    parser.add_argument("--drivers", type=int, default=2000)
+    parser.add_argument("--riders", type=int, default=200)
+    parser.add_argument("--duration", type=float, default=20.0, help="seconds of load after connecting")
+    parser.add_argument("--ping-interval", type=float, default=1.0, help="seconds between a driver's location updates")
+    parser.add_argument("--ride-rate", type=float, default=2.0, help="new rides per second, across all riders")
+    parser.add_argument("--ride-seconds", type=float, default=5.0, help="how long each simulated ride lasts")
+    parser.add_argument("--relay-interval", type=float, default=2.0, help="location relay coalescing interval")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+    if args.duration <= args.ride_seconds:
+        # Rides are only created while one can still finish within the run
+        parser.error("--duration must be greater than --ride-seconds")
+    return args
+
+if __name__ == "__main__":
+    asyncio.run(LoadTest(parse_args()).run())
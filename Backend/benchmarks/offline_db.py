@@ -0,0 +1,162 @@
+"""In-memory stand-in for the Supabase client, for benchmarks and load tests
+that must run without a database.
+
+Supports the subset of the query builder the services use: select (with
+count), insert, update, delete, the eq/neq/gt/gte/lt/in_/or_ filters, order
+and limit. Rows are plain dicts; every query scans its table, and embedded
+selects ("*, users(name)") return only the table's own columns.
+
+    client = OfflineClient({"users": [{"id": "u1", "role": "rider"}]})
+    RideService(client)
+"""
+import copy
+import itertools
+import threading
+from datetime import datetime
+from types import SimpleNamespace
+from typing import Callable, Dict, List, Optional
+
+Row = Dict
+Predicate = Callable[[Row], bool]
+
+# Column defaults the real schema fills in on insert
+_DEFAULTS = {
+    "rides": lambda: {"created_at": datetime.now().isoformat()},
+}
+
+class OfflineQuery:
+    def __init__(self, client: "OfflineClient", table: str):
+        self.client = client
+        self.table = table
+        self.operation = "select"
+        self.payload = None
+        self.filters: List[Predicate] = []
+        self.orders = []
+        self.row_limit: Optional[int] = None
+
+    def select(self, columns: str = "*", count: Optional[str] = None):
+        self.operation = "select"
+        return self
+
+    def insert(self, data):
+        self.operation, self.payload = "insert", data
+        return self
+
+    def update(self, data: Dict):
+        self.operation, self.payload = "update", data
+        return self
+
+    def delete(self):
+        self.operation = "delete"
+        return self
+
+    def eq(self, column: str, value):
+        self.filters.append(lambda row: row.get(column) == value)
+        return self
+
+    def neq(self, column: str, value):
+        self.filters.append(lambda row: row.get(column) != value)
+        return self
+
+    def gt(self, column: str, value):
+        self.filters.append(lambda row: row.get(column) is not None and row[column] > value)
+        return self
+
+    def gte(self, column: str, value):
+        self.filters.append(lambda row: row.get(column) is not None and row[column] >= value)
+        return self
+
+    def lt(self, column: str, value):
+        self.filters.append(lambda row: row.get(column) is not None and row[column] < value)
+        return self
+
+    def in_(self, column: str, values):
+        values = set(values)
+        self.filters.append(lambda row: row.get(column) in values)
+        return self
+
+    def or_(self, expression: str):
+        self.filters.append(_parse_or(expression))
+        return self
+
+    def order(self, column: str, desc: bool = False):
+        self.orders.append((column, desc))
+        return self
+
+    def limit(self, count: int):
+        self.row_limit = count
+        return self
+
+    def execute(self):
+        with self.client.lock:
+            rows = self.client.tables.setdefault(self.table, [])
+            if self.operation == "insert":
+                inserted = []
+                for data in self.payload if isinstance(self.payload, list) else [self.payload]:
+                    row = {**_DEFAULTS.get(self.table, dict)(), **data}
+                    if self.table == "ride_events":
+                        row["seq"] = next(self.client.sequence)
+                    rows.append(row)
+                    inserted.append(copy.deepcopy(row))
+                return SimpleNamespace(data=inserted, count=None)
+
+            matched = [row for row in rows if all(match(row) for match in self.filters)]
+            if self.operation == "update":
+                for row in matched:
+                    row.update(self.payload)
+            elif self.operation == "delete":
+                kept = [row for row in rows if not any(row is match for match in matched)]
+                self.client.tables[self.table] = kept
+            else:
+                for column, desc in reversed(self.orders):
+                    matched.sort(key=lambda row: (row.get(column) is None, row.get(column)), reverse=desc)
+                if self.row_limit is not None:
+                    matched = matched[:self.row_limit]
+            return SimpleNamespace(data=copy.deepcopy(matched), count=len(matched))
+
+class OfflineClient:
+    """Client whose tables are lists of row dicts; safe to share with the
+    worker threads services run blocking queries in"""
+
+    def __init__(self, tables: Optional[Dict[str, List[Row]]] = None):
+        self.tables: Dict[str, List[Row]] = tables or {}
+        self.sequence = itertools.count(1)
+        self.lock = threading.Lock()
+
+    def table(self, name: str) -> OfflineQuery:
+        return OfflineQuery(self, name)
+
+# PostgREST or_ filters: "col.op.value,and(col.op.value,...)"
+
+def _condition(text: str) -> Predicate:
+    column, operator, value = text.split(".", 2)
+    value = value.strip('"')
+    if operator == "eq":
+        return lambda row: str(row.get(column)) == value
+    if operator == "lt":
+        return lambda row: row.get(column) is not None and str(row[column]) < value
+    if operator == "gt":
+        return lambda row: row.get(column) is not None and str(row[column]) > value
+    raise ValueError(f"Unsupported or_ operator: {operator}")
+
+def _split(text: str) -> List[str]:
+    parts, depth, current = [], 0, ""
+    for char in text:
+        if char == "," and depth == 0:
+            parts.append(current)
+            current = ""
+            continue
+        depth += (char == "(") - (char == ")")
+        current += char
+    parts.append(current)
+    return parts
+
+def _parse_or(expression: str) -> Predicate:
+    alternatives = []
+    for part in _split(expression):
+        if part.startswith("and("):
+            conditions = [_condition(text) for text in _split(part[4:-1])]
+            alternatives.append(lambda row, conditions=conditions: all(match(row) for match in conditions))
+        else:
+            alternatives.append(_condition(part))
+    return lambda row: any(match(row) for match in alternatives)
@@ -222,16 +222,17 @@ class DriverService:
                 
                 total_earnings = sum(payment['amount'] for payment in payments_response.data)
             
-            # Get average rating
-            ratings_response = self.supabase.table('ride_ratings')\
-                .select('rating')\
+            # Get average rating from the maintained aggregate row
+            ratings_response = self.supabase.table('rating_aggregates')\
+                .select('rating_count, rating_sum')\
                 .eq('rated_user_id', driver_id)\
                 .eq('rater_type', 'user')\
                 .execute()
             
             average_rating = 0.0
-            if ratings_response.data:
-                average_rating = sum(rating['rating'] for rating in ratings_response.data) / len(ratings_response.data)
+            if ratings_response.data and ratings_response.data[0]['rating_count']:
+                aggregate = ratings_response.data[0]
+                average_rating = aggregate['rating_sum'] / aggregate['rating_count']
             
             return {
                 "total_rides": total_rides,
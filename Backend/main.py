@@ -6,6 +6,11 @@ from drivers.router import router as driver_router
 from rides.router import router as ride_router
 from payments.router import router as payment_router
 from admin.routes import router as admin_router
+from rides.database_config import DatabaseConfig
+from rides.expiry import ride_expiry_sweeper
+from rides.dispatch import ride_dispatcher
+from rides.websocket.connection_manager import connection_manager
+from rides.websocket.location_relay import location_relay
 
 app = FastAPI()
 
@@ -16,6 +21,21 @@ app.include_router(ride_router)
 app.include_router(payment_router)
 app.include_router(admin_router, prefix="/admin", tags=["admin"])
 
+@app.on_event("startup")
+async def start_background_tasks():
+    supabase_client = DatabaseConfig().get_client()
+    await connection_manager.start(supabase_client)
+    ride_expiry_sweeper.start(supabase_client)
+    ride_dispatcher.start(supabase_client)
+    location_relay.start(supabase_client)
+
+@app.on_event("shutdown")
+async def stop_background_tasks():
+    await location_relay.stop()
+    await ride_dispatcher.stop()
+    await ride_expiry_sweeper.stop()
+    await connection_manager.stop()
+
 @app.get("/")
 def read_root():
     return {"Message": "Application running in localhost"}
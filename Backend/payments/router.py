@@ -1,4 +1,4 @@
-from fastapi import APIRouter, Depends, HTTPException, Request, Form
+from fastapi import APIRouter, Depends, HTTPException, Request, Form, Header
 from fastapi.responses import HTMLResponse, RedirectResponse
 from typing import Dict, Optional
 from .service import PaymentService
@@ -9,6 +9,7 @@ from .schemas import (
 )
 from auth.services.login_service import LoginService
 from .database_config import DatabaseConfig
+from shared.idempotency import IdempotencyStore
 
 router = APIRouter(prefix='/payment', tags=['Payments'])
 
@@ -16,14 +17,19 @@ router = APIRouter(prefix='/payment', tags=['Payments'])
 database_client = DatabaseConfig().get_client()
 payment_service = PaymentService(database_client)
 login_service = LoginService(database_client)
+idempotency_store = IdempotencyStore(database_client)
 
 @router.post("/cash/{ride_id}", response_model=PaymentResponse)
 def process_cash_payment(
     ride_id: str,
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key"),
     current_user_id: str = Depends(login_service.get_current_user)
 ) -> PaymentResponse:
     """Driver marks cash payment as completed"""
-    return payment_service.process_cash_payment(current_user_id, ride_id)
+    return idempotency_store.run(
+        current_user_id, "payment.cash", idempotency_key, {"ride_id": ride_id},
+        lambda: payment_service.process_cash_payment(current_user_id, ride_id)
+    )
 
 @router.post("/online/{ride_id}", response_model=OnlinePaymentInitResponse)
 def initiate_online_payment(
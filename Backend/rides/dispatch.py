@@ -0,0 +1,163 @@
+from typing import Callable, Dict, List, Optional, Set
+import asyncio
+import os
+import time
+
+from shared.grid_index import Cell
+from shared.timer_wheel import TimerWheel
+from .repositories.ride_repository import RideRepository, RideApplicationRepository
+from .websocket.connection_manager import connection_manager
+
+class _Search:
+    __slots__ = ("message", "center", "step", "notified")
+
+    def __init__(self, message: Dict, center: Cell):
+        self.message = message
+        self.center = center
+        self.step = 0
+        self.notified: Set[str] = set()
+
+class RideDispatcher:
+    """Offers a new ride to the available drivers nearest its pickup first.
+
+    The search starts with the drivers within `radii_km[0]` of the pickup,
+    found by a ring search over the driver location grid. Every `step_seconds`
+    without an application it widens to the next radius and notifies only the
+    drivers it has not reached yet. After the last radius, drivers that have
+    not reported a position (or are farther away) get the ride too, so no ride
+    is offered to fewer drivers than before. A step that reaches nobody is
+    skipped at once rather than waited out.
+
+    Applying, confirming or cancelling on this worker ends the search; before
+    widening, rides that were answered or cancelled elsewhere are filtered out
+    with one query per batch.
+    """
+
+    def __init__(self, radii_km: List[float], step_seconds: float, tick_seconds: float = 1.0,
+                 batch_size: int = 500, retry_seconds: float = 5.0, clock: Callable[[], float] = time.monotonic):
+        self.radii_km = radii_km
+        self.step_seconds = step_seconds
+        self.tick_seconds = tick_seconds
+        self.batch_size = batch_size
+        self.retry_seconds = retry_seconds
+        self.wheel = TimerWheel(tick_seconds=tick_seconds, clock=clock)
+        self.ride_repo: Optional[RideRepository] = None
+        self.app_repo: Optional[RideApplicationRepository] = None
+        self._searches: Dict[str, _Search] = {}
+        self._task: Optional[asyncio.Task] = None
+        self.searches_started = 0
+        self.searches_answered = 0
+        self.steps_widened = 0
+        self.fallback_offers = 0
+        self.notifications_sent = 0
+        self._widen_errors = 0
+
+    def start(self, supabase_client):
+        if self._task is not None:
+            return
+        self.ride_repo = RideRepository(supabase_client)
+        self.app_repo = RideApplicationRepository(supabase_client)
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    async def dispatch(self, ride_id: str, message: Dict, latitude: float, longitude: float):
+        """Offer a new ride to the drivers nearest its pickup"""
+        search = _Search(message, connection_manager.presence.cells.cell_of(latitude, longitude))
+        self._searches[ride_id] = search
+        self.searches_started += 1
+        await self._offer(ride_id, search)
+
+    def end_search(self, ride_id: str):
+        """Stop widening: the ride was applied for, confirmed or cancelled"""
+        self.wheel.cancel(ride_id)
+        self._searches.pop(ride_id, None)
+
+    async def _offer(self, ride_id: str, search: _Search):
+        presence = connection_manager.presence
+        driver_ids: List[str] = []
+        while not driver_ids and search.step <= len(self.radii_km):
+            if search.step < len(self.radii_km):
+                rows, columns = presence.cells.rings_for(self.radii_km[search.step], search.center)
+                candidates = presence.available_within(search.center, rows, columns)
+            else:
+                # Last resort: every available driver, located or not
+                self.fallback_offers += 1
+                candidates = presence.available
+            driver_ids = [driver_id for driver_id in candidates if driver_id not in search.notified]
+            search.step += 1
+
+        search.notified.update(driver_ids)
+        self.notifications_sent += len(driver_ids)
+        await connection_manager.broadcast_to_drivers(search.message, driver_ids)
+
+        if search.step <= len(self.radii_km):
+            self.wheel.schedule(ride_id, self.step_seconds)
+        else:
+            del self._searches[ride_id]
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.tick_seconds)
+            ride_ids = self.wheel.advance()
+            for start in range(0, len(ride_ids), self.batch_size):
+                batch = ride_ids[start:start + self.batch_size]
+                try:
+                    await self._widen(batch)
+                except Exception as e:
+                    self._widen_errors += 1
+                    print(f"Error widening the driver search of {len(batch)} rides: {str(e)}")
+                    # The wheel already dropped these timers; retry the searches
+                    # not yet widened rather than leaving them stranded
+                    for ride_id in batch:
+                        if ride_id in self._searches and ride_id not in self.wheel:
+                            self.wheel.schedule(ride_id, self.retry_seconds)
+
+    async def _widen(self, ride_ids: List[str]):
+        # Database calls are blocking; keep them off the event loop
+        unanswered = await asyncio.to_thread(self._unanswered, ride_ids)
+        for ride_id in ride_ids:
+            search = self._searches.get(ride_id)
+            if search is None:
+                continue
+            if ride_id not in unanswered:
+                self.searches_answered += 1
+                del self._searches[ride_id]
+                continue
+            self.steps_widened += 1
+            await self._offer(ride_id, search)
+
+    def _unanswered(self, ride_ids: List[str]) -> Set[str]:
+        """The given rides still pending with no application"""
+        pending = self.ride_repo.get_ride_ids_in_status(ride_ids, ("pending",))
+        if not pending:
+            return set()
+        return set(pending) - self.app_repo.get_ride_ids_with_applications(pending)
+
+    def stats(self) -> Dict:
+        return {
+            "active_searches": len(self._searches),
+            "radii_km": self.radii_km,
+            "step_seconds": self.step_seconds,
+            "searches_started": self.searches_started,
+            "searches_answered": self.searches_answered,
+            "steps_widened": self.steps_widened,
+            "fallback_offers": self.fallback_offers,
+            "notifications_sent": self.notifications_sent,
+            "widen_errors": self._widen_errors,
+            "running": self._task is not None
+        }
+
+# Global dispatcher; started from the application's startup hook
+ride_dispatcher = RideDispatcher(
+    radii_km=[float(radius) for radius in os.getenv("RIDE_DISPATCH_RADII_KM", "2,5,10").split(",")],
+    step_seconds=float(os.getenv("RIDE_DISPATCH_STEP_SECONDS", "20"))
+)
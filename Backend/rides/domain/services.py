@@ -1,8 +1,9 @@
-from typing import Optional
+from typing import Dict, Optional
 from decimal import Decimal
-import json
 import math
 
+from ..models.entities import Location
+
 class FareCalculationService:
     BASE_FARE = Decimal('50.00')  # Base fare in currency units
     RATE_PER_KM = Decimal('15.00')  # Rate per kilometer
@@ -39,21 +40,29 @@ class FareCalculationService:
             return cls.BASE_FARE
 
 class LocationService:
+    """Converts locations between entities and their numeric table columns.
+
+    A location is stored as `<prefix>_latitude` / `<prefix>_longitude` (plus
+    `<prefix>_address` where the table has one), e.g. `driver_*` on
+    ride_applications and `pickup_*` / `drop_*` on rides.
+    """
+
     @staticmethod
-    def parse_location(location_string: str) -> dict:
-        """Parse location string to coordinates"""
-        try:
-            return json.loads(location_string)
-        except json.JSONDecodeError:
-            return {"latitude": 0.0, "longitude": 0.0}
-    
-    @staticmethod
-    def format_location(latitude: float, longitude: float, address: str = None) -> str:
-        """Format location to JSON string"""
-        location_data = {
-            "latitude": latitude,
-            "longitude": longitude
+    def to_columns(location: Location, prefix: str, with_address: bool = True) -> Dict:
+        """Map a location to column values for an insert or update"""
+        columns = {
+            f"{prefix}_latitude": location.latitude,
+            f"{prefix}_longitude": location.longitude
         }
-        if address:
-            location_data["address"] = address
-        return json.dumps(location_data)
\ No newline at end of file
+        if with_address:
+            columns[f"{prefix}_address"] = location.address
+        return columns
+
+    @staticmethod
+    def from_columns(row: Dict, prefix: str) -> Optional[Location]:
+        """Build a location from a row, or None when its coordinates are unset"""
+        latitude = row.get(f"{prefix}_latitude")
+        longitude = row.get(f"{prefix}_longitude")
+        if latitude is None or longitude is None:
+            return None
+        return Location(float(latitude), float(longitude), row.get(f"{prefix}_address"))
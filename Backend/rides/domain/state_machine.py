@@ -0,0 +1,95 @@
+from dataclasses import dataclass
+from typing import Dict, Optional, Tuple
+from fastapi import HTTPException, status
+from ..models.entities import Ride
+
+@dataclass(frozen=True)
+class RideTransition:
+    name: str
+    from_statuses: Tuple[str, ...]
+    to_status: str
+    actor_columns: Tuple[str, ...]  # Ride columns allowed to perform the transition
+    forbidden_detail: str
+    invalid_status_detail: str
+    not_found_status_code: int = status.HTTP_403_FORBIDDEN
+    not_found_detail: Optional[str] = None
+
+# Declared transition table: action -> allowed source statuses, target status and actor
+TRANSITIONS: Dict[str, RideTransition] = {
+    "confirm": RideTransition(
+        name="confirm",
+        from_statuses=("pending",),
+        to_status="confirmed",
+        actor_columns=("user_id",),
+        forbidden_detail="You don't have permission to select driver for this ride",
+        invalid_status_detail="Ride is not in pending status"
+    ),
+    "start": RideTransition(
+        name="start",
+        from_statuses=("confirmed",),
+        to_status="ongoing",
+        actor_columns=("driver_id",),
+        forbidden_detail="You don't have permission to start this ride",
+        invalid_status_detail="Ride must be confirmed to start"
+    ),
+    "complete": RideTransition(
+        name="complete",
+        from_statuses=("ongoing",),
+        to_status="completed",
+        actor_columns=("driver_id",),
+        forbidden_detail="You don't have permission to complete this ride",
+        invalid_status_detail="Ride must be ongoing to complete"
+    ),
+    "cancel": RideTransition(
+        name="cancel",
+        from_statuses=("pending", "confirmed", "ongoing"),
+        to_status="cancelled",
+        actor_columns=("user_id", "driver_id"),
+        forbidden_detail="You don't have permission to cancel this ride",
+        invalid_status_detail="Ride cannot be cancelled in current status",
+        not_found_status_code=status.HTTP_404_NOT_FOUND,
+        not_found_detail="Ride not found"
+    ),
+}
+
+class RideStateMachine:
+    """Applies ride status transitions as a single conditional update.
+
+    The update only matches when the ride is in one of the transition's source
+    statuses and the actor owns it, so concurrent transitions cannot both win.
+    The ride is only re-read when the update matched nothing, to report why.
+    """
+
+    def __init__(self, ride_repo):
+        self.ride_repo = ride_repo
+
+    def transition(self, ride_id: str, action: str, actor_id: str, updates: Optional[Dict] = None) -> Ride:
+        rule = TRANSITIONS[action]
+        changes = {**(updates or {}), "status": rule.to_status}
+
+        ride = self.ride_repo.update_ride_if(
+            ride_id, changes, rule.from_statuses, rule.actor_columns, actor_id
+        )
+        if ride:
+            return ride
+
+        self._raise_rejection(rule, ride_id, actor_id)
+
+    def _raise_rejection(self, rule: RideTransition, ride_id: str, actor_id: str):
+        ride = self.ride_repo.get_ride_by_id(ride_id)
+        if not ride:
+            raise HTTPException(
+                status_code=rule.not_found_status_code,
+                detail=rule.not_found_detail or rule.forbidden_detail
+            )
+
+        if actor_id not in [getattr(ride, column) for column in rule.actor_columns]:
+            raise HTTPException(
+                status_code=status.HTTP_403_FORBIDDEN,
+                detail=rule.forbidden_detail
+            )
+
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=rule.invalid_status_detail
+        )
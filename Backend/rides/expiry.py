@@ -0,0 +1,174 @@
+from typing import Dict, List, Optional, Set
+from datetime import datetime
+import asyncio
+import os
+import time
+
+from shared.timer_wheel import TimerWheel
+from .repositories.ride_repository import RideRepository, RideApplicationRepository
+from .repositories.ride_event_repository import RideEventRepository
+from .websocket.connection_manager import connection_manager
+
+EXPIRED_CANCEL_REASON = "Expired: no driver was selected in time"
+
+class RideExpirySweeper:
+    """Expires pending rides that were not confirmed within `ttl_seconds`.
+
+    Every pending ride arms a timer in a hierarchical timer wheel when it is
+    created (or, at startup, when it is loaded); confirming or cancelling the
+    ride disarms it. Each tick the rides whose timers fired are cancelled with
+    one conditional bulk update, so a ride confirmed meanwhile (possibly by
+    another worker) is left alone. Their applications are deleted in bulk and
+    riders and applicants are notified through `connection_manager`. A failed
+    cancel re-arms the rides' timers; a failed deletion after the cancel keeps
+    the cancelled ride ids and retries only the deletion and the applicants'
+    notices, since a retried cancel would no longer find the rides pending.
+    """
+
+    def __init__(self, ttl_seconds: float, tick_seconds: float = 1.0, batch_size: int = 500,
+                 retry_seconds: float = 5.0):
+        self.ttl_seconds = ttl_seconds
+        self.tick_seconds = tick_seconds
+        self.batch_size = batch_size
+        self.retry_seconds = retry_seconds
+        self.wheel = TimerWheel(tick_seconds=tick_seconds)
+        self.ride_repo: Optional[RideRepository] = None
+        self.app_repo: Optional[RideApplicationRepository] = None
+        self.event_repo: Optional[RideEventRepository] = None
+        self._task: Optional[asyncio.Task] = None
+        self._expired_total = 0
+        self._sweep_errors = 0
+        # Cancelled rides whose applications are still to be deleted
+        self._unfinished: Set[str] = set()
+        self._retry_at = 0.0
+
+    def arm(self, ride_id: str, requested_at: Optional[datetime] = None):
+        """Schedule expiry of a pending ride `ttl_seconds` after it was requested"""
+        delay = self.ttl_seconds
+        if requested_at is not None:
+            now = datetime.now(requested_at.tzinfo)
+            delay -= (now - requested_at).total_seconds()
+        self.wheel.schedule(ride_id, delay)
+
+    def disarm(self, ride_id: str):
+        self.wheel.cancel(ride_id)
+
+    def start(self, supabase_client):
+        """Arm timers for rides already pending and start the sweep loop"""
+        if self._task is not None:
+            return
+        self.ride_repo = RideRepository(supabase_client)
+        self.app_repo = RideApplicationRepository(supabase_client)
+        self.event_repo = RideEventRepository(supabase_client)
+
+        try:
+            for ride in self.ride_repo.get_rides_by_status("pending"):
+                self.arm(ride.ride_id, ride.requested_at or ride.created_at)
+        except Exception as e:
+            print(f"Error loading pending rides for expiry: {str(e)}")
+
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.tick_seconds)
+            ride_ids = self.wheel.advance()
+            for start in range(0, len(ride_ids), self.batch_size):
+                batch = ride_ids[start:start + self.batch_size]
+                try:
+                    await self.expire_rides(batch)
+                except Exception as e:
+                    self._sweep_errors += 1
+                    print(f"Error expiring {len(batch)} pending rides: {str(e)}")
+                    # The wheel already dropped these timers; re-arm them so a
+                    # transient failure delays expiry instead of losing it
+                    for ride_id in batch:
+                        self.wheel.schedule(ride_id, self.retry_seconds)
+            if self._unfinished and time.monotonic() >= self._retry_at:
+                await self.retry_unfinished()
+
+    async def retry_unfinished(self):
+        """Retry deleting the applications of rides cancelled by earlier sweeps"""
+        unfinished, self._unfinished = list(self._unfinished), set()
+        for start in range(0, len(unfinished), self.batch_size):
+            await self._withdraw_applications(unfinished[start:start + self.batch_size])
+
+    async def expire_rides(self, ride_ids: List[str]) -> int:
+        """Cancel the given rides that are still pending and notify participants"""
+        # Database calls are blocking; keep them off the event loop
+        rides = await asyncio.to_thread(self._expire_batch, ride_ids)
+        self._expired_total += len(rides)
+
+        for ride in rides:
+            await connection_manager.send_personal_message({
+                "type": "ride_expired",
+                "message": "Your ride request expired before a driver was selected",
+                "data": {"ride_id": ride.ride_id}
+            }, ride.user_id)
+        if rides:
+            await self._withdraw_applications([ride.ride_id for ride in rides])
+
+        return len(rides)
+
+    def _expire_batch(self, ride_ids: List[str]):
+        rides = self.ride_repo.update_rides_in_status(ride_ids, {
+            "status": "cancelled",
+            "cancel_reason": EXPIRED_CANCEL_REASON
+        }, "pending")
+        if not rides:
+            return []
+
+        try:
+            self.event_repo.append_events([
+                {"ride_id": ride.ride_id, "event_type": "cancelled", "data": {"reason": "expired"}}
+                for ride in rides
+            ])
+        except Exception as e:
+            print(f"Error recording expiry events: {str(e)}")
+
+        return rides
+
+    async def _withdraw_applications(self, ride_ids: List[str]):
+        """Delete the applications of cancelled rides and tell their drivers;
+        on failure the rides are kept and retried after `retry_seconds`"""
+        try:
+            applications = await asyncio.to_thread(self.app_repo.delete_applications_for_rides, ride_ids)
+        except Exception as e:
+            self._sweep_errors += 1
+            print(f"Error deleting applications of {len(ride_ids)} expired rides: {str(e)}")
+            self._unfinished.update(ride_ids)
+            self._retry_at = time.monotonic() + self.retry_seconds
+            return
+
+        for app in applications:
+            await connection_manager.send_personal_message({
+                "type": "ride_unavailable",
+                "message": "Ride is no longer available",
+                "data": {"ride_id": app.ride_id}
+            }, app.driver_id)
+
+    def stats(self) -> Dict:
+        return {
+            "armed_timers": len(self.wheel),
+            "ttl_seconds": self.ttl_seconds,
+            "expired_total": self._expired_total,
+            "sweep_errors": self._sweep_errors,
+            "unfinished_cleanups": len(self._unfinished),
+            "running": self._task is not None
+        }
+
+# Global sweeper; started from the application's startup hook
+ride_expiry_sweeper = RideExpirySweeper(
+    ttl_seconds=float(os.getenv("PENDING_RIDE_TTL_SECONDS", "900")),
+    tick_seconds=float(os.getenv("RIDE_EXPIRY_TICK_SECONDS", "1"))
+)
@@ -0,0 +1,34 @@
+from typing import Dict, Iterable, Iterator
+import csv
+import io
+import json
+
+RIDE_EXPORT_COLUMNS = [
+    "ride_id", "user_id", "driver_id", "pickup", "drop", "status", "payment_status",
+    "fare", "requested_at", "start_time", "end_time", "completed_at", "cancel_reason",
+    "created_at"
+]
+
+EXPORT_MEDIA_TYPES = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv"
+}
+
+def iter_ndjson(rides: Iterable[Dict]) -> Iterator[str]:
+    """One JSON object per line, restricted to the export columns"""
+    for ride in rides:
+        yield json.dumps({column: ride.get(column) for column in RIDE_EXPORT_COLUMNS}, default=str) + "\n"
+
+def iter_csv(rides: Iterable[Dict]) -> Iterator[str]:
+    """Header row followed by one CSV row per ride"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+
+    writer.writerow(RIDE_EXPORT_COLUMNS)
+    yield buffer.getvalue()
+
+    for ride in rides:
+        buffer.seek(0)
+        buffer.truncate(0)
+        writer.writerow(["" if ride.get(column) is None else ride.get(column) for column in RIDE_EXPORT_COLUMNS])
+        yield buffer.getvalue()
@@ -1,9 +1,34 @@
 from dataclasses import dataclass
-from typing import Optional
+from typing import Dict, Optional
 from datetime import datetime
 from decimal import Decimal
 
-@dataclass
+def parse_datetime(value) -> Optional[datetime]:
+    """Parse a timestamp as returned by the database (ISO 8601 string) once"""
+    if value is None or value.__class__ is datetime:
+        return value
+    if value[-1] == "Z":
+        value = value[:-1] + "+00:00"
+    return datetime.fromisoformat(value)
+
+def parse_decimal(value) -> Optional[Decimal]:
+    if value is None or isinstance(value, Decimal):
+        return value
+    return Decimal(str(value))
+
+def format_datetime(value: Optional[datetime]) -> Optional[str]:
+    return value.isoformat() if value is not None else None
+
+# Entities use __slots__ (slots=True): no per-instance __dict__, smaller and
+# faster attribute access for the hundreds of rows list endpoints materialize.
+
+@dataclass(slots=True)
+class Location:
+    latitude: float
+    longitude: float
+    address: Optional[str] = None
+
+@dataclass(slots=True)
 class Ride:
     ride_id: str
     user_id: str
@@ -11,7 +36,7 @@ class Ride:
     drop: str
     status: str
     payment_status: str
-    requested_at: datetime
+    requested_at: Optional[datetime]
     driver_id: Optional[str] = None
     start_time: Optional[datetime] = None
     end_time: Optional[datetime] = None
@@ -19,17 +44,51 @@ class Ride:
     rating_by_user: Optional[float] = None
     rating_by_driver: Optional[float] = None
     cancel_reason: Optional[str] = None
+    created_at: Optional[datetime] = None
+    completed_at: Optional[datetime] = None
+
+    @classmethod
+    def from_row(cls, row: Dict) -> "Ride":
+        # Positional in field order: this runs once per row on every list read
+        get = row.get
+        return cls(
+            row["ride_id"],
+            row["user_id"],
+            row["pickup"],
+            row["drop"],
+            row["status"],
+            get("payment_status") or "pending",
+            parse_datetime(get("requested_at")),
+            get("driver_id"),
+            parse_datetime(get("start_time")),
+            parse_datetime(get("end_time")),
+            parse_decimal(get("fare")),
+            get("rating_by_user"),
+            get("rating_by_driver"),
+            get("cancel_reason"),
+            parse_datetime(get("created_at")),
+            parse_datetime(get("completed_at"))
+        )
+
+    def is_participant(self, user_id: str) -> bool:
+        return user_id == self.user_id or (self.driver_id is not None and user_id == self.driver_id)
 
-@dataclass
+@dataclass(slots=True)
 class RideApplication:
     application_id: str
     ride_id: str
     driver_id: str
-    locations: str
-    applied_at: datetime
+    location: Optional[Location]
+    applied_at: Optional[datetime]
 
-@dataclass
-class Location:
-    latitude: float
-    longitude: float
-    address: Optional[str] = None
\ No newline at end of file
+    @classmethod
+    def from_row(cls, row: Dict, location: Optional[Location] = None) -> "RideApplication":
+        # The driver's location comes from the driver_* columns, converted by
+        # the repository through LocationService
+        return cls(
+            application_id=row["application_id"],
+            ride_id=row["ride_id"],
+            driver_id=row["driver_id"],
+            location=location,
+            applied_at=parse_datetime(row.get("applied_at"))
+        )
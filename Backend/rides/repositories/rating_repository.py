@@ -5,6 +5,7 @@ from datetime import datetime
 class IRatingRepository(ABC):
     @abstractmethod
     def create_rating(self, rating_data: Dict) -> Dict:
+        # rating_aggregates is updated by trigger in the same transaction as the insert
         pass
     
     @abstractmethod
@@ -15,6 +16,10 @@ class IRatingRepository(ABC):
     def get_ratings_by_ride_id(self, ride_id: str) -> List[Dict]:
         pass
     
+    @abstractmethod
+    def get_ratings_by_ride_ids(self, ride_ids: List[str]) -> List[Dict]:
+        pass
+    
     @abstractmethod
     def get_rating_by_ride_and_rater(self, ride_id: str, rater_id: str) -> Optional[Dict]:
         pass
@@ -30,6 +35,10 @@ class IRatingRepository(ABC):
     @abstractmethod
     def update_rating(self, rating_id: str, updates: Dict) -> Optional[Dict]:
         pass
+    
+    @abstractmethod
+    def get_rating_aggregate(self, rated_user_id: str, rater_type: str) -> Optional[Dict]:
+        pass
 
 class RatingRepository(IRatingRepository):
     def __init__(self, supabase_client):
@@ -49,6 +58,12 @@ class RatingRepository(IRatingRepository):
         response = self.supabase.table('ride_ratings').select("*").eq('ride_id', ride_id).execute()
         return response.data
     
+    def get_ratings_by_ride_ids(self, ride_ids: List[str]) -> List[Dict]:
+        if not ride_ids:
+            return []
+        response = self.supabase.table('ride_ratings').select("*").in_('ride_id', ride_ids).execute()
+        return response.data
+    
     def get_rating_by_ride_and_rater(self, ride_id: str, rater_id: str) -> Optional[Dict]:
         response = self.supabase.table('ride_ratings')\
             .select("*")\
@@ -76,6 +91,16 @@ class RatingRepository(IRatingRepository):
         return response.data
     
     def update_rating(self, rating_id: str, updates: Dict) -> Optional[Dict]:
+        # rating_aggregates is updated by trigger in the same transaction as the update
         updates["updated_at"] = datetime.now().isoformat()
         response = self.supabase.table('ride_ratings').update(updates).eq('rating_id', rating_id).execute()
+        return response.data[0] if response.data else None
+    
+    def get_rating_aggregate(self, rated_user_id: str, rater_type: str) -> Optional[Dict]:
+        """Get count, sum and per-star histogram of ratings received from `rater_type` raters"""
+        response = self.supabase.table('rating_aggregates')\
+            .select("*")\
+            .eq('rated_user_id', rated_user_id)\
+            .eq('rater_type', rater_type)\
+            .execute()
         return response.data[0] if response.data else None
\ No newline at end of file
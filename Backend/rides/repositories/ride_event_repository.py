@@ -0,0 +1,65 @@
+from typing import List, Optional, Dict
+from abc import ABC, abstractmethod
+from datetime import datetime
+
+class IRideEventRepository(ABC):
+    @abstractmethod
+    def append_event(self, ride_id: str, event_type: str, actor_id: Optional[str] = None, data: Optional[Dict] = None) -> Dict:
+        pass
+
+    @abstractmethod
+    def append_events(self, events: List[Dict]) -> List[Dict]:
+        pass
+
+    @abstractmethod
+    def get_events_for_ride(self, ride_id: str, after_seq: int = 0, limit: int = 100) -> List[Dict]:
+        pass
+
+class RideEventRepository(IRideEventRepository):
+    """Append-only log of ride state changes. Rows are never updated or deleted;
+    `seq` is assigned by the database and, within a ride, increases in commit
+    order (ride_events_commit_order.sql), so a reader tailing with after_seq
+    never skips an event that commits later."""
+
+    def __init__(self, supabase_client):
+        self.supabase = supabase_client
+
+    def append_event(self, ride_id: str, event_type: str, actor_id: Optional[str] = None, data: Optional[Dict] = None) -> Dict:
+        event = {
+            "ride_id": ride_id,
+            "event_type": event_type,
+            "actor_id": actor_id,
+            "data": data or {},
+            "created_at": datetime.now().isoformat()
+        }
+        response = self.supabase.table('ride_events').insert(event).execute()
+        if response.data:
+            return response.data[0]
+        raise Exception("Failed to append ride event")
+
+    def append_events(self, events: List[Dict]) -> List[Dict]:
+        """Append several events (ride_id, event_type, actor_id, data) in one insert"""
+        created_at = datetime.now().isoformat()
+        # Each row takes its ride's lock until commit; a fixed order keeps two
+        # concurrent batches from deadlocking on each other's rides
+        events = sorted(events, key=lambda event: event["ride_id"])
+        rows = [{
+            "ride_id": event["ride_id"],
+            "event_type": event["event_type"],
+            "actor_id": event.get("actor_id"),
+            "data": event.get("data") or {},
+            "created_at": created_at
+        } for event in events]
+        response = self.supabase.table('ride_events').insert(rows).execute()
+        return response.data
+
+    def get_events_for_ride(self, ride_id: str, after_seq: int = 0, limit: int = 100) -> List[Dict]:
+        """Events for a ride with seq > after_seq, oldest first"""
+        response = self.supabase.table('ride_events')\
+            .select("*")\
+            .eq('ride_id', ride_id)\
+            .gt('seq', after_seq)\
+            .order('seq')\
+            .limit(limit)\
+            .execute()
+        return response.data
@@ -1,11 +1,12 @@
-from typing import List, Optional, Dict
+from typing import List, Optional, Dict, Set, Tuple, Iterator
 from abc import ABC, abstractmethod
 
-from ..models.entities import Ride
+from ..models.entities import Ride, RideApplication
+from ..domain.services import LocationService
 
 class IRideRepository(ABC):
     @abstractmethod
-    def create_ride(self, ride: Ride) -> Ride:
+    def create_ride(self, ride_data: Dict) -> Ride:
         pass
     
     @abstractmethod
@@ -28,36 +29,143 @@ class RideRepository(IRideRepository):
     def __init__(self, supabase_client):
         self.supabase = supabase_client
     
-    def create_ride(self, ride_data: Dict) -> Dict:
+    def create_ride(self, ride_data: Dict) -> Ride:
         response = self.supabase.table('rides').insert(ride_data).execute()
         if response.data:
-            return response.data[0]
+            return Ride.from_row(response.data[0])
         raise Exception("Failed to create ride")
     
-    def get_ride_by_id(self, ride_id: str) -> Optional[Dict]:
+    def get_ride_by_id(self, ride_id: str) -> Optional[Ride]:
         response = self.supabase.table('rides').select("*").eq('ride_id', ride_id).execute()
-        return response.data[0] if response.data else None
+        return Ride.from_row(response.data[0]) if response.data else None
     
-    def get_rides_by_user_id(self, user_id: str) -> List[Dict]:
+    def get_rides_by_user_id(self, user_id: str) -> List[Ride]:
         response = self.supabase.table('rides').select("*").eq('user_id', user_id).execute()
-        return response.data
+        return [Ride.from_row(row) for row in response.data]
     
-    def get_rides_by_status(self, status: str) -> List[Dict]:
+    def get_rides_by_status(self, status: str) -> List[Ride]:
         response = self.supabase.table('rides').select("*").eq('status', status).execute()
-        return response.data
+        return [Ride.from_row(row) for row in response.data]
     
-    def update_ride(self, ride_id: str, updates: Dict) -> Optional[Dict]:
+    def update_ride(self, ride_id: str, updates: Dict) -> Optional[Ride]:
         response = self.supabase.table('rides').update(updates).eq('ride_id', ride_id).execute()
-        return response.data[0] if response.data else None
+        return Ride.from_row(response.data[0]) if response.data else None
+    
+    def get_rides_page(self, participant_column: str, participant_id: str, limit: int,
+                       after: Optional[Tuple[str, str]] = None, columns: str = "*",
+                       created_from: Optional[str] = None, created_before: Optional[str] = None) -> List[Dict]:
+        """Keyset page of a rider's ('user_id') or driver's ('driver_id') rides, oldest first,
+        strictly after the (created_at, ride_id) position if given"""
+        query = self.supabase.table('rides')\
+            .select(columns)\
+            .eq(participant_column, participant_id)
+        if created_from:
+            query = query.gte('created_at', created_from)
+        if created_before:
+            query = query.lt('created_at', created_before)
+        if after:
+            created_at, ride_id = after
+            query = query.or_(
+                f'created_at.gt."{created_at}",and(created_at.eq."{created_at}",ride_id.gt.{ride_id})'
+            )
+        response = query\
+            .order('created_at')\
+            .order('ride_id')\
+            .limit(limit)\
+            .execute()
+        return response.data
+    
+    def iter_rides(self, participant_column: str, participant_id: str, chunk_size: int = 500,
+                   columns: str = "*", created_from: Optional[str] = None,
+                   created_before: Optional[str] = None) -> Iterator[Dict]:
+        """Yield every matching ride as a raw row, fetching one keyset page at a time so
+        memory stays bounded by chunk_size regardless of history length. Rows go straight
+        to the export serializers, so they are not materialized as entities."""
+        after = None
+        while True:
+            rides = self.get_rides_page(
+                participant_column, participant_id, chunk_size, after,
+                columns=columns, created_from=created_from, created_before=created_before
+            )
+            yield from rides
+            if len(rides) < chunk_size:
+                return
+            after = (rides[-1]["created_at"], rides[-1]["ride_id"])
+    
+    def update_ride_if(self, ride_id: str, updates: Dict, statuses: Tuple[str, ...],
+                       actor_columns: Tuple[str, ...], actor_id: str) -> Optional[Ride]:
+        """Update the ride only if it is in one of `statuses` and `actor_id` matches one of
+        `actor_columns`; returns the updated row, or None if nothing matched"""
+        query = self.supabase.table('rides')\
+            .update(updates)\
+            .eq('ride_id', ride_id)\
+            .in_('status', list(statuses))
+        if len(actor_columns) == 1:
+            query = query.eq(actor_columns[0], actor_id)
+        else:
+            query = query.or_(",".join(f"{column}.eq.{actor_id}" for column in actor_columns))
+        response = query.execute()
+        return Ride.from_row(response.data[0]) if response.data else None
+    
+    def update_rides_in_status(self, ride_ids: List[str], updates: Dict, status: str) -> List[Ride]:
+        """Bulk update the given rides that are still in `status`; returns the rows updated"""
+        response = self.supabase.table('rides')\
+            .update(updates)\
+            .in_('ride_id', ride_ids)\
+            .eq('status', status)\
+            .execute()
+        return [Ride.from_row(row) for row in response.data]
+    
+    def get_ride_ids_in_status(self, ride_ids: List[str], statuses: Tuple[str, ...]) -> List[str]:
+        """The given rides that are currently in one of `statuses`"""
+        response = self.supabase.table('rides')\
+            .select("ride_id")\
+            .in_('ride_id', ride_ids)\
+            .in_('status', list(statuses))\
+            .execute()
+        return [row["ride_id"] for row in response.data]
+    
+    def driver_has_active_ride(self, driver_id: str) -> bool:
+        """Whether the driver has a confirmed or ongoing ride"""
+        response = self.supabase.table('rides')\
+            .select("ride_id")\
+            .eq('driver_id', driver_id)\
+            .in_('status', ['confirmed', 'ongoing'])\
+            .limit(1)\
+            .execute()
+        return bool(response.data)
+    
+    def get_completed_rides_page(self, participant_column: str, participant_id: str,
+                                 limit: int, after: Optional[Tuple[str, str]] = None) -> List[Ride]:
+        """Keyset page of completed rides for a rider ('user_id') or driver ('driver_id'),
+        newest first, strictly after the (created_at, ride_id) position if given"""
+        query = self.supabase.table('rides')\
+            .select("*")\
+            .eq(participant_column, participant_id)\
+            .eq('status', 'completed')
+        if after:
+            created_at, ride_id = after
+            query = query.or_(
+                f'created_at.lt."{created_at}",and(created_at.eq."{created_at}",ride_id.lt.{ride_id})'
+            )
+        response = query\
+            .order('created_at', desc=True)\
+            .order('ride_id', desc=True)\
+            .limit(limit)\
+            .execute()
+        return [Ride.from_row(row) for row in response.data]
+
+def _to_application(row: Dict) -> RideApplication:
+    return RideApplication.from_row(row, LocationService.from_columns(row, "driver"))
 
 class RideApplicationRepository:
     def __init__(self, supabase_client):
         self.supabase = supabase_client
     
-    def create_application(self, application_data: Dict) -> Dict:
+    def create_application(self, application_data: Dict) -> RideApplication:
         response = self.supabase.table('ride_applications').insert(application_data).execute()
         if response.data:
-            return response.data[0]
+            return _to_application(response.data[0])
         raise Exception("Failed to create application")
     
     def get_applications_by_ride_id(self, ride_id: str) -> List[Dict]:
@@ -67,19 +175,43 @@ class RideApplicationRepository:
             .eq('ride_id', ride_id).execute()
         return response.data
     
-    def get_applications_by_ride_id_simple(self, ride_id: str) -> List[Dict]:
+    def get_applications_by_ride_id_simple(self, ride_id: str) -> List[RideApplication]:
         # New method without joins - just get application data
         response = self.supabase.table('ride_applications')\
             .select("*")\
             .eq('ride_id', ride_id).execute()
+        return [_to_application(row) for row in response.data]
+    
+    def get_applications_with_driver_details(self, ride_id: str) -> List[Dict]:
+        # Single round trip: applications embedded with the applicant's user row
+        # and, through users, their driver profile
+        response = self.supabase.table('ride_applications')\
+            .select("*, driver:users!driver_id(name, phone, role, driver_profiles(license, vehicle_info, is_approved))")\
+            .eq('ride_id', ride_id).execute()
         return response.data
     
-    def check_existing_application(self, ride_id: str, driver_id: str) -> Optional[Dict]:
+    def check_existing_application(self, ride_id: str, driver_id: str) -> Optional[RideApplication]:
         response = self.supabase.table('ride_applications')\
             .select("*").eq('ride_id', ride_id).eq('driver_id', driver_id).execute()
-        return response.data[0] if response.data else None
+        return _to_application(response.data[0]) if response.data else None
     
-    def get_applications_by_driver_id(self, driver_id: str) -> List[Dict]:
+    def get_applications_by_driver_id(self, driver_id: str) -> List[RideApplication]:
         response = self.supabase.table('ride_applications')\
             .select("*").eq('driver_id', driver_id).execute()
-        return response.data
\ No newline at end of file
+        return [_to_application(row) for row in response.data]
+    
+    def get_ride_ids_with_applications(self, ride_ids: List[str]) -> Set[str]:
+        """The given rides that have at least one application"""
+        response = self.supabase.table('ride_applications')\
+            .select("ride_id")\
+            .in_('ride_id', ride_ids)\
+            .execute()
+        return {row["ride_id"] for row in response.data}
+    
+    def delete_applications_for_rides(self, ride_ids: List[str]) -> List[RideApplication]:
+        """Delete every application for the given rides; returns the deleted rows"""
+        response = self.supabase.table('ride_applications')\
+            .delete()\
+            .in_('ride_id', ride_ids)\
+            .execute()
+        return [_to_application(row) for row in response.data]
@@ -1,9 +1,13 @@
-from fastapi import APIRouter, Depends, HTTPException
-from typing import List, Dict
+from fastapi import APIRouter, Depends, HTTPException, Query, Header, Response
+from fastapi.responses import StreamingResponse
+from typing import List, Dict, Optional
 from .service import RideService
-from .schemas import RideCreateRequest, RideResponse, RideApplicationRequest, RideApplicationResponse, DriverSelectionRequest, RideCancellationRequest, RideRatingRequest, RideRatingResponse, RideWithRatingsResponse, UserRatingsSummary, DriverRatingsSummary
+from .schemas import RideCreateRequest, RideResponse, RideApplicationRequest, RideApplicationResponse, DriverSelectionRequest, RideCancellationRequest, RideRatingRequest, RideRatingResponse, RideWithRatingsResponse, UserRatingsSummary, DriverRatingsSummary, CompletedRidesPage, RideTimelineResponse
 from auth.services.login_service import LoginService
 from .database_config import DatabaseConfig
+from .export import EXPORT_MEDIA_TYPES
+from shared.idempotency import IdempotencyStore
+from shared.serialization import trusted_json_response
 
 router = APIRouter(prefix='/rides', tags=['Rides'])
 
@@ -11,26 +15,35 @@ router = APIRouter(prefix='/rides', tags=['Rides'])
 database_client = DatabaseConfig().get_client()
 ride_service = RideService(database_client)
 login_service = LoginService(database_client)
+idempotency_store = IdempotencyStore(database_client)
 
 @router.post("/create", response_model=RideResponse)
 async def create_ride(
     ride_data: RideCreateRequest,
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key"),
     current_user_id: str = Depends(login_service.get_current_user)
 ) -> RideResponse:
-    return await ride_service.create_ride(current_user_id, ride_data)
+    return await idempotency_store.run_async(
+        current_user_id, "rides.create", idempotency_key, ride_data,
+        lambda: ride_service.create_ride(current_user_id, ride_data)
+    )
 
 @router.get("/pending", response_model=List[RideResponse])
 def get_pending_rides(
     current_user_id: str = Depends(login_service.get_current_user)
-) -> List[RideResponse]:
-    return ride_service.get_pending_rides(current_user_id)
+) -> List[Dict]:
+    return trusted_json_response(ride_service.get_pending_rides(current_user_id))
 
 @router.post("/apply")
 async def apply_for_ride(
     application_data: RideApplicationRequest,
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key"),
     current_user_id: str = Depends(login_service.get_current_user)
 ) -> Dict[str, str]:
-    return await ride_service.apply_for_ride(current_user_id, application_data)
+    return await idempotency_store.run_async(
+        current_user_id, "rides.apply", idempotency_key, application_data,
+        lambda: ride_service.apply_for_ride(current_user_id, application_data)
+    )
 
 @router.get("/{ride_id}/applications", response_model=List[RideApplicationResponse])
 def get_ride_applications(
@@ -85,25 +98,72 @@ def get_ride_with_ratings(
     """Get ride details with rating information"""
     return ride_service.get_ride_with_ratings(current_user_id, ride_id)
 
-@router.get("/my-completed", response_model=List[RideWithRatingsResponse])
+@router.get("/{ride_id}/events", response_model=RideTimelineResponse)
+def get_ride_timeline(
+    ride_id: str,
+    after_seq: int = Query(0, ge=0, description="Only return events with a greater sequence number"),
+    limit: int = Query(100, ge=1, le=500),
+    current_user_id: str = Depends(login_service.get_current_user)
+) -> RideTimelineResponse:
+    """Get the ride's event timeline, or tail events since a sequence number"""
+    return ride_service.get_ride_timeline(current_user_id, ride_id, after_seq=after_seq, limit=limit)
+
+@router.get("/my-completed", response_model=CompletedRidesPage)
 def get_my_completed_rides(
+    limit: int = Query(20, ge=1, le=100),
+    cursor: Optional[str] = Query(None, description="next_cursor from the previous page"),
+    current_user_id: str = Depends(login_service.get_current_user)
+) -> CompletedRidesPage:
+    """Get completed rides with rating info, newest first, one page at a time"""
+    return trusted_json_response(
+        ride_service.get_my_completed_rides(current_user_id, limit=limit, cursor=cursor)
+    )
+
+def _etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    candidates = [tag.strip() for tag in if_none_match.split(",")]
+    return "*" in candidates or etag in candidates or f"W/{etag}" in candidates
+
+@router.get("/export")
+def export_ride_history(
+    format: str = Query("ndjson", description="Export format: ndjson or csv"),
+    start_date: Optional[str] = Query(None, description="Start date (YYYY-MM-DD)"),
+    end_date: Optional[str] = Query(None, description="End date (YYYY-MM-DD), inclusive"),
     current_user_id: str = Depends(login_service.get_current_user)
-) -> List[RideWithRatingsResponse]:
-    """Get all completed rides with rating info"""
-    return ride_service.get_my_completed_rides(current_user_id)
+) -> StreamingResponse:
+    """Stream the current user's full ride history as NDJSON or CSV"""
+    rows = ride_service.export_ride_history(current_user_id, format, start_date, end_date)
+    return StreamingResponse(
+        rows,
+        media_type=EXPORT_MEDIA_TYPES[format],
+        headers={"Content-Disposition": f'attachment; filename="rides.{format}"'}
+    )
 
 @router.get("/ratings/user/{user_id}", response_model=UserRatingsSummary)
 def get_user_ratings_summary(
     user_id: str,
+    response: Response,
+    if_none_match: Optional[str] = Header(None),
     current_user_id: str = Depends(login_service.get_current_user)
-) -> UserRatingsSummary:
+):
     """Get summary of ratings for a user"""
-    return ride_service.get_user_ratings_summary(user_id)
+    summary, etag = ride_service.get_user_ratings_summary_with_etag(user_id)
+    if _etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers={"ETag": etag})
+    response.headers["ETag"] = etag
+    return summary
 
 @router.get("/ratings/driver/{driver_id}", response_model=DriverRatingsSummary)
 def get_driver_ratings_summary(
     driver_id: str,
+    response: Response,
+    if_none_match: Optional[str] = Header(None),
     current_user_id: str = Depends(login_service.get_current_user)
-) -> DriverRatingsSummary:
+):
     """Get summary of ratings for a driver"""
-    return ride_service.get_driver_ratings_summary(driver_id)
\ No newline at end of file
+    summary, etag = ride_service.get_driver_ratings_summary_with_etag(driver_id)
+    if _etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers={"ETag": etag})
+    response.headers["ETag"] = etag
+    return summary
\ No newline at end of file
@@ -2,6 +2,7 @@ from pydantic import BaseModel, validator
 from typing import Dict, Optional, List
 from datetime import datetime
 from decimal import Decimal
+from .models.entities import Ride, format_datetime
 
 class LocationSchema(BaseModel):
     latitude: float
@@ -22,13 +23,42 @@ class RideResponse(BaseModel):
     drop: str
     status: str
     payment_status: str
-    requested_at: str
+    requested_at: Optional[str] = None
     start_time: Optional[str] = None
     end_time: Optional[str] = None
     fare: Optional[float] = None
     rating_by_user: Optional[float] = None
     rating_by_driver: Optional[float] = None
     cancel_reason: Optional[str] = None
+    
+    @classmethod
+    def from_entity(cls, ride: Ride) -> "RideResponse":
+        return cls(**ride_response_payload(ride))
+
+def ride_response_payload(ride: Ride) -> Dict:
+    """Plain dict in RideResponse shape, for list endpoints.
+
+    Returning these instead of RideResponse instances lets the route's
+    response_model validate each row once, rather than FastAPI dumping an
+    already-built model back to a dict and validating it again.
+    """
+    fare = ride.fare
+    return {
+        "ride_id": ride.ride_id,
+        "user_id": ride.user_id,
+        "driver_id": ride.driver_id,
+        "pickup": ride.pickup,
+        "drop": ride.drop,
+        "status": ride.status,
+        "payment_status": ride.payment_status,
+        "requested_at": format_datetime(ride.requested_at),
+        "start_time": format_datetime(ride.start_time),
+        "end_time": format_datetime(ride.end_time),
+        "fare": float(fare) if fare is not None else None,
+        "rating_by_user": ride.rating_by_user,
+        "rating_by_driver": ride.rating_by_driver,
+        "cancel_reason": ride.cancel_reason
+    }
 
 class RideApplicationRequest(BaseModel):
     ride_id: str
@@ -121,6 +151,24 @@ class RideWithRatingsResponse(BaseModel):
     can_rate_driver: bool = False  # If current user can rate the driver
     can_rate_user: bool = False    # If current user can rate the user
 
+class CompletedRidesPage(BaseModel):
+    rides: List[RideWithRatingsResponse]
+    next_cursor: Optional[str] = None  # Pass back as `cursor` to fetch the next page
+    limit: int
+
+class RideEventResponse(BaseModel):
+    seq: int
+    ride_id: str
+    event_type: str  # created, applied, confirmed, started, completed, cancelled, rated, paid
+    actor_id: Optional[str] = None
+    data: dict = {}
+    created_at: str
+
+class RideTimelineResponse(BaseModel):
+    ride_id: str
+    events: List[RideEventResponse]
+    last_seq: int  # Pass back as `after_seq` to receive only newer events
+
 class UserRatingsSummary(BaseModel):
     user_id: str
     total_ratings: int
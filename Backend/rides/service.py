@@ -1,28 +1,56 @@
 from fastapi import HTTPException, status
-from typing import List, Dict, Optional
+from typing import List, Dict, Optional, Tuple, Iterator
 import uuid
+import hashlib
+import json
+import os
 from .repositories.ride_repository import RideRepository, RideApplicationRepository
 from .repositories.rating_repository import RatingRepository
+from .repositories.ride_event_repository import RideEventRepository
 from .use_cases.ride_use_cases import CreateRideUseCase, ApplyForRideUseCase, GetPendingRidesUseCase, SelectDriverUseCase
 from .schemas import (
     RideCreateRequest, RideResponse, RideApplicationRequest, RideApplicationResponse,
     RideRatingRequest, RideRatingResponse, RideWithRatingsResponse, 
-    UserRatingsSummary, DriverRatingsSummary
+    UserRatingsSummary, DriverRatingsSummary, CompletedRidesPage,
+    RideEventResponse, RideTimelineResponse
 )
 from .websocket.connection_manager import connection_manager
+from .expiry import ride_expiry_sweeper
+from .dispatch import ride_dispatcher
+from .websocket.location_relay import location_relay
 from .domain.services import LocationService
+from .domain.state_machine import RideStateMachine
+from .models.entities import Ride, format_datetime
+from .export import RIDE_EXPORT_COLUMNS, iter_ndjson, iter_csv
 from users.service import UserService
 from drivers.service import DriverService
+from shared.utils import encode_cursor, decode_cursor
+from shared.cache import TTLCache
 from datetime import datetime, timedelta
 
+MAX_COMPLETED_RIDES_PAGE_SIZE = 100
+MAX_RIDE_EVENTS_PAGE_SIZE = 500
+RIDE_EXPORT_CHUNK_SIZE = 500
+
+# Rating summaries keyed by (rater_type, rated_user_id); shared by every RideService
+# in the process so that rate_ride invalidates what the summary routes read, and
+# invalidated on the other workers through the websocket backplane
+rating_summary_cache = TTLCache(
+    max_entries=int(os.getenv("RATING_SUMMARY_CACHE_SIZE", "5000")),
+    ttl_seconds=float(os.getenv("RATING_SUMMARY_CACHE_TTL_SECONDS", "60"))
+)
+connection_manager.share_cache("rating_summary", rating_summary_cache)
+
 class RideService:
     def __init__(self, supabase_client):
         self.ride_repo = RideRepository(supabase_client)
         self.app_repo = RideApplicationRepository(supabase_client)
         self.rating_repo = RatingRepository(supabase_client)  # Add rating repository
+        self.event_repo = RideEventRepository(supabase_client)
         self.user_service = UserService(supabase_client)
         self.driver_service = DriverService(supabase_client)
         self.location_service = LocationService()
+        self.state_machine = RideStateMachine(self.ride_repo)
         
         # Initialize use cases
         self.create_ride_use_case = CreateRideUseCase(self.ride_repo, self.user_service)
@@ -35,18 +63,22 @@ class RideService:
     
     async def create_ride(self, user_id: str, request: RideCreateRequest) -> RideResponse:
         ride = self.create_ride_use_case.execute(user_id, request)
+        self._record_event(ride.ride_id, "created", user_id, {"fare": ride.fare})
+        ride_expiry_sweeper.arm(ride.ride_id)
         
-        # Notify all drivers about new ride
-        await connection_manager.broadcast_to_drivers({
+        # Offer the ride to nearby drivers first, widening if nobody applies
+        await ride_dispatcher.dispatch(ride.ride_id, {
             "type": "new_ride",
             "message": "New ride request available",
             "data": ride.dict()
-        }, await self._get_available_driver_ids())
+        }, request.pickup_coordinates.latitude, request.pickup_coordinates.longitude)
         
         return ride
     
     async def apply_for_ride(self, driver_id: str, request: RideApplicationRequest) -> Dict[str, str]:
         result = self.apply_ride_use_case.execute(driver_id, request)
+        self._record_event(request.ride_id, "applied", driver_id)
+        ride_dispatcher.end_search(request.ride_id)
         
         # Get ride details
         ride = self.ride_repo.get_ride_by_id(request.ride_id)
@@ -56,54 +88,55 @@ class RideService:
                 "type": "new_application",
                 "message": "A driver has applied for your ride",
                 "data": {"ride_id": request.ride_id}
-            }, ride["user_id"])
+            }, ride.user_id)
         
         return result
     
-    def get_pending_rides(self, driver_id: str) -> List[RideResponse]:
+    def get_pending_rides(self, driver_id: str) -> List[Dict]:
         return self.get_pending_rides_use_case.execute(driver_id)
     
     def get_ride_applications(self, user_id: str, ride_id: str) -> List[RideApplicationResponse]:
         try:
             # Verify user owns the ride
             ride = self.ride_repo.get_ride_by_id(ride_id)
-            if not ride or ride["user_id"] != user_id:
+            if not ride or ride.user_id != user_id:
                 raise HTTPException(
                     status_code=status.HTTP_403_FORBIDDEN,
                     detail="You don't have permission to view applications for this ride"
                 )
             
-            # Get applications (without driver details)
-            applications = self.app_repo.get_applications_by_ride_id_simple(ride_id)
+            # Get applications joined with driver user and profile in one query
+            applications = self.app_repo.get_applications_with_driver_details(ride_id)
             
             result = []
             for app in applications:
-                try:
-                    # Get driver profile from driver service
-                    driver_profile = self.driver_service.get_driver_profile_for_ride(app["driver_id"])
-                    
-                    # Parse location data
-                    location_data = self.location_service.parse_location(app.get("locations", "{}"))
-                    
-                    result.append(RideApplicationResponse(
-                        application_id=app["application_id"],
-                        ride_id=app["ride_id"],
-                        driver_id=app["driver_id"],
-                        applied_at=app["applied_at"],
-                        driver_name=driver_profile["name"],
-                        driver_phone=driver_profile["phone"],
-                        license=driver_profile["license"],
-                        vehicle_info=driver_profile["vehicle_info"],
-                        current_location={
-                            "latitude": location_data.get("latitude", 0.0),
-                            "longitude": location_data.get("longitude", 0.0),
-                            "address": location_data.get("address")
-                        }
-                    ))
-                except Exception as e:
-                    # Skip applications where driver profile cannot be retrieved
-                    print(f"Error getting driver profile for {app['driver_id']}: {str(e)}")
+                driver = app.get("driver") or {}
+                profile = driver.get("driver_profiles")
+                if isinstance(profile, list):
+                    profile = profile[0] if profile else None
+                
+                # Skip applications where driver profile cannot be retrieved
+                if driver.get("role") != "driver" or not profile:
+                    print(f"Error getting driver profile for {app['driver_id']}: profile not found")
                     continue
+                
+                location = self.location_service.from_columns(app, "driver")
+                
+                result.append(RideApplicationResponse(
+                    application_id=app["application_id"],
+                    ride_id=app["ride_id"],
+                    driver_id=app["driver_id"],
+                    applied_at=app["applied_at"],
+                    driver_name=driver["name"],
+                    driver_phone=driver["phone"],
+                    license=profile["license"],
+                    vehicle_info=profile["vehicle_info"],
+                    current_location={
+                        "latitude": location.latitude if location else 0.0,
+                        "longitude": location.longitude if location else 0.0,
+                        "address": location.address if location else None
+                    }
+                ))
             
             return result
             
@@ -117,6 +150,11 @@ class RideService:
     
     async def select_driver(self, user_id: str, ride_id: str, driver_id: str) -> Dict[str, str]:
         result = self.select_driver_use_case.execute(user_id, ride_id, driver_id)
+        self._record_event(ride_id, "confirmed", user_id, {"driver_id": driver_id})
+        ride_expiry_sweeper.disarm(ride_id)
+        ride_dispatcher.end_search(ride_id)
+        connection_manager.presence.set_busy(driver_id, True)
+        connection_manager.open_ride_room(ride_id, [user_id, driver_id])
         
         # Notify selected driver
         await connection_manager.send_personal_message({
@@ -128,69 +166,45 @@ class RideService:
         # Notify other applicants that ride is no longer available
         applications = self.app_repo.get_applications_by_ride_id_simple(ride_id)
         for app in applications:
-            if app["driver_id"] != driver_id:
+            if app.driver_id != driver_id:
                 await connection_manager.send_personal_message({
                     "type": "ride_unavailable",
                     "message": "Ride is no longer available",
                     "data": {"ride_id": ride_id}
-                }, app["driver_id"])
+                }, app.driver_id)
         
         return result
     
     async def start_ride(self, driver_id: str, ride_id: str) -> Dict[str, str]:
-        ride = self.ride_repo.get_ride_by_id(ride_id)
-        if not ride or ride["driver_id"] != driver_id:
-            raise HTTPException(
-                status_code=status.HTTP_403_FORBIDDEN,
-                detail="You don't have permission to start this ride"
-            )
-        
-        if ride["status"] != "confirmed":
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail="Ride must be confirmed to start"
-            )
-        
-        self.ride_repo.update_ride(ride_id, {
-            "status": "ongoing",
+        ride = self.state_machine.transition(ride_id, "start", driver_id, {
             "start_time": datetime.now().isoformat()
         })
+        self._record_event(ride_id, "started", driver_id)
         
         # Notify rider
         await connection_manager.send_personal_message({
             "type": "ride_started",
             "message": "Your ride has started",
             "data": {"ride_id": ride_id}
-        }, ride["user_id"])
+        }, ride.user_id)
         
         return {"message": "Ride started successfully"}
     
     async def complete_ride(self, driver_id: str, ride_id: str) -> Dict[str, str]:
-        ride = self.ride_repo.get_ride_by_id(ride_id)
-        if not ride or ride["driver_id"] != driver_id:
-            raise HTTPException(
-                status_code=status.HTTP_403_FORBIDDEN,
-                detail="You don't have permission to complete this ride"
-            )
-        
-        if ride["status"] != "ongoing":
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail="Ride must be ongoing to complete"
-            )
-        
-        self.ride_repo.update_ride(ride_id, {
-            "status": "completed",
+        ride = self.state_machine.transition(ride_id, "complete", driver_id, {
             "end_time": datetime.now().isoformat(),
             "completed_at": datetime.now().isoformat()  # Add completion timestamp
         })
+        self._record_event(ride_id, "completed", driver_id)
+        location_relay.end_ride(ride_id)
+        connection_manager.presence.set_busy(driver_id, False)
         
         # Notify rider
         await connection_manager.send_personal_message({
             "type": "ride_completed",
             "message": "Your ride has been completed. You can now rate your driver!",
             "data": {"ride_id": ride_id, "can_rate": True}
-        }, ride["user_id"])
+        }, ride.user_id)
         
         # Notify driver they can rate the rider
         await connection_manager.send_personal_message({
@@ -199,33 +213,26 @@ class RideService:
             "data": {"ride_id": ride_id, "can_rate": True}
         }, driver_id)
         
+        await connection_manager.close_ride_room(ride_id, {
+            "type": "ride_room_closed",
+            "data": {"ride_id": ride_id, "status": "completed"}
+        })
+        
         return {"message": "Ride completed successfully"}
     
     async def cancel_ride(self, user_id: str, ride_id: str, cancel_reason: str) -> Dict[str, str]:
-        ride = self.ride_repo.get_ride_by_id(ride_id)
-        if not ride:
-            raise HTTPException(status_code=404, detail="Ride not found")
-        
-        # Check permissions
-        if user_id not in [ride["user_id"], ride.get("driver_id")]:
-            raise HTTPException(
-                status_code=status.HTTP_403_FORBIDDEN,
-                detail="You don't have permission to cancel this ride"
-            )
-        
-        if ride["status"] not in ["pending", "confirmed", "ongoing"]:
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail="Ride cannot be cancelled in current status"
-            )
-        
-        self.ride_repo.update_ride(ride_id, {
-            "status": "cancelled",
+        ride = self.state_machine.transition(ride_id, "cancel", user_id, {
             "cancel_reason": cancel_reason
         })
+        self._record_event(ride_id, "cancelled", user_id, {"reason": cancel_reason})
+        ride_expiry_sweeper.disarm(ride_id)
+        ride_dispatcher.end_search(ride_id)
+        location_relay.end_ride(ride_id)
+        if ride.driver_id:
+            connection_manager.presence.set_busy(ride.driver_id, False)
         
         # Notify other party
-        other_user = ride["driver_id"] if user_id == ride["user_id"] else ride["user_id"]
+        other_user = ride.driver_id if user_id == ride.user_id else ride.user_id
         if other_user:
             await connection_manager.send_personal_message({
                 "type": "ride_cancelled",
@@ -233,21 +240,57 @@ class RideService:
                 "data": {"ride_id": ride_id, "reason": cancel_reason}
             }, other_user)
         
+        await connection_manager.close_ride_room(ride_id, {
+            "type": "ride_room_closed",
+            "data": {"ride_id": ride_id, "status": "cancelled"}
+        })
+        
         return {"message": "Ride cancelled successfully"}
     
-    async def _get_available_driver_ids(self) -> List[str]:
-        # Get all active drivers from connected users
-        driver_ids = []
-        for user_id in connection_manager.active_connections.keys():
-            try:
-                if self.user_service.verify_user_role(user_id, "driver"):
-                    driver_ids.append(user_id)
-            except:
-                continue
-        return driver_ids
+    def _record_event(self, ride_id: str, event_type: str, actor_id: Optional[str] = None, data: Optional[Dict] = None):
+        """Append to the ride event log; the state change has already been applied,
+        so a logging failure must not fail the request"""
+        try:
+            self.event_repo.append_event(ride_id, event_type, actor_id, data)
+        except Exception as e:
+            print(f"Error recording {event_type} event for ride {ride_id}: {str(e)}")
+    
+    def get_ride_timeline(self, current_user_id: str, ride_id: str, after_seq: int = 0, 
+                          limit: int = 100) -> RideTimelineResponse:
+        """Get a ride's events in order, optionally only those after a sequence number"""
+        try:
+            ride = self.ride_repo.get_ride_by_id(ride_id)
+            if not ride:
+                raise HTTPException(
+                    status_code=status.HTTP_404_NOT_FOUND,
+                    detail="Ride not found"
+                )
+            
+            if not ride.is_participant(current_user_id):
+                raise HTTPException(
+                    status_code=status.HTTP_403_FORBIDDEN,
+                    detail="You don't have permission to view this ride"
+                )
+            
+            limit = max(1, min(limit, MAX_RIDE_EVENTS_PAGE_SIZE))
+            events = self.event_repo.get_events_for_ride(ride_id, after_seq=after_seq, limit=limit)
+            
+            return RideTimelineResponse(
+                ride_id=ride_id,
+                events=[RideEventResponse(**event) for event in events],
+                last_seq=events[-1]["seq"] if events else after_seq
+            )
+            
+        except HTTPException:
+            raise
+        except Exception as e:
+            raise HTTPException(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                detail=f"Error fetching ride events: {str(e)}"
+            )
     
     # New methods for payment service
-    def get_ride_for_payment(self, ride_id: str) -> Optional[Dict]:
+    def get_ride_for_payment(self, ride_id: str) -> Optional[Ride]:
         """Get ride details for payment processing"""
         try:
             ride = self.ride_repo.get_ride_by_id(ride_id)
@@ -264,7 +307,7 @@ class RideService:
             ride = self.ride_repo.get_ride_by_id(ride_id)
             if not ride:
                 return False
-            return ride.get("driver_id") == driver_id
+            return ride.driver_id == driver_id
         except Exception:
             return False
 
@@ -274,7 +317,7 @@ class RideService:
             ride = self.ride_repo.get_ride_by_id(ride_id)
             if not ride:
                 return False
-            return ride.get("user_id") == user_id
+            return ride.user_id == user_id
         except Exception:
             return False
 
@@ -308,6 +351,11 @@ class RideService:
                     status_code=status.HTTP_400_BAD_REQUEST,
                     detail="Failed to update ride payment status"
                 )
+            
+            if payment_status == "paid":
+                self._record_event(ride_id, "paid", None, {
+                    "fare": float(ride.fare) if ride.fare is not None else None
+                })
 
             return {"message": f"Ride payment status updated to {payment_status}"}
 
@@ -330,14 +378,14 @@ class RideService:
                 )
 
             return {
-                "ride_id": ride["ride_id"],
-                "user_id": ride["user_id"],
-                "driver_id": ride.get("driver_id"),
-                "status": ride["status"],
-                "payment_status": ride["payment_status"],
-                "fare": ride.get("fare"),
-                "pickup": ride["pickup"],
-                "drop": ride["drop"]
+                "ride_id": ride.ride_id,
+                "user_id": ride.user_id,
+                "driver_id": ride.driver_id,
+                "status": ride.status,
+                "payment_status": ride.payment_status,
+                "fare": float(ride.fare) if ride.fare is not None else None,
+                "pickup": ride.pickup,
+                "drop": ride.drop
             }
 
         except HTTPException:
@@ -359,21 +407,21 @@ class RideService:
                 )
 
             # Check if ride is completed
-            if ride["status"] != "completed":
+            if ride.status != "completed":
                 raise HTTPException(
                     status_code=status.HTTP_400_BAD_REQUEST,
                     detail="Ride must be completed before payment"
                 )
 
             # Check if already paid
-            if ride["payment_status"] == "paid":
+            if ride.payment_status == "paid":
                 raise HTTPException(
                     status_code=status.HTTP_400_BAD_REQUEST,
                     detail="Payment already completed"
                 )
 
             # Check if fare is set
-            if not ride.get("fare") or ride["fare"] <= 0:
+            if not ride.fare or ride.fare <= 0:
                 raise HTTPException(
                     status_code=status.HTTP_400_BAD_REQUEST,
                     detail="Invalid ride fare"
@@ -382,9 +430,9 @@ class RideService:
             return {
                 "valid": True,
                 "ride_id": ride_id,
-                "fare": ride["fare"],
-                "user_id": ride["user_id"],
-                "driver_id": ride.get("driver_id")
+                "fare": float(ride.fare),
+                "user_id": ride.user_id,
+                "driver_id": ride.driver_id
             }
 
         except HTTPException:
@@ -407,7 +455,7 @@ class RideService:
                 )
             
             # Check if ride is completed
-            if ride["status"] != "completed":
+            if ride.status != "completed":
                 raise HTTPException(
                     status_code=status.HTTP_400_BAD_REQUEST,
                     detail="Can only rate completed rides"
@@ -417,19 +465,19 @@ class RideService:
             rater_type = None
             rated_user_id = None
             
-            if rater_id == ride["user_id"]:
+            if rater_id == ride.user_id:
                 # User is rating the driver
                 rater_type = "user"
-                rated_user_id = ride["driver_id"]
+                rated_user_id = ride.driver_id
                 if not rated_user_id:
                     raise HTTPException(
                         status_code=status.HTTP_400_BAD_REQUEST,
                         detail="No driver assigned to this ride"
                     )
-            elif rater_id == ride["driver_id"]:
+            elif rater_id == ride.driver_id:
                 # Driver is rating the user
                 rater_type = "driver"
-                rated_user_id = ride["user_id"]
+                rated_user_id = ride.user_id
             else:
                 raise HTTPException(
                     status_code=status.HTTP_403_FORBIDDEN,
@@ -459,6 +507,11 @@ class RideService:
             }
             
             rating = self.rating_repo.create_rating(rating_data)
+            rating_summary_cache.invalidate((rater_type, rated_user_id))
+            self._record_event(request.ride_id, "rated", rater_id, {
+                "rater_type": rater_type,
+                "rating": request.rating
+            })
             
             # Notify the rated user
             await connection_manager.send_personal_message({
@@ -492,7 +545,7 @@ class RideService:
                 )
             
             # Check if user has permission to view this ride
-            if current_user_id not in [ride["user_id"], ride.get("driver_id")]:
+            if not ride.is_participant(current_user_id):
                 raise HTTPException(
                     status_code=status.HTTP_403_FORBIDDEN,
                     detail="You don't have permission to view this ride"
@@ -501,41 +554,7 @@ class RideService:
             # Get ratings for this ride
             ratings = self.rating_repo.get_ratings_by_ride_id(ride_id)
             
-            user_rating = None
-            driver_rating = None
-            
-            for rating in ratings:
-                if rating["rater_type"] == "user":
-                    user_rating = RideRatingResponse(**rating)
-                elif rating["rater_type"] == "driver":
-                    driver_rating = RideRatingResponse(**rating)
-            
-            # Determine if current user can rate
-            can_rate_driver = False
-            can_rate_user = False
-            
-            if ride["status"] == "completed":
-                if current_user_id == ride["user_id"] and not user_rating:
-                    can_rate_driver = True
-                elif current_user_id == ride["driver_id"] and not driver_rating:
-                    can_rate_user = True
-            
-            return RideWithRatingsResponse(
-                ride_id=ride["ride_id"],
-                user_id=ride["user_id"],
-                driver_id=ride.get("driver_id"),
-                pickup=ride["pickup"],
-                drop=ride["drop"],
-                fare=ride.get("fare"),
-                status=ride["status"],
-                payment_status=ride["payment_status"],
-                created_at=ride["created_at"],
-                completed_at=ride.get("completed_at"),
-                user_rating=user_rating,
-                driver_rating=driver_rating,
-                can_rate_driver=can_rate_driver,
-                can_rate_user=can_rate_user
-            )
+            return self._build_ride_with_ratings(current_user_id, ride, ratings)
             
         except HTTPException:
             raise
@@ -545,34 +564,79 @@ class RideService:
                 detail=f"Error fetching ride with ratings: {str(e)}"
             )
 
-    def get_user_ratings_summary(self, user_id: str) -> UserRatingsSummary:
-        """Get summary of ratings received by a user"""
+    def _build_ride_with_ratings(self, current_user_id: str, ride: Ride, ratings: List[Dict]) -> RideWithRatingsResponse:
+        """Assemble a ride with its ratings already fetched"""
+        user_rating = None
+        driver_rating = None
+        
+        for rating in ratings:
+            if rating["rater_type"] == "user":
+                user_rating = RideRatingResponse(**rating)
+            elif rating["rater_type"] == "driver":
+                driver_rating = RideRatingResponse(**rating)
+        
+        # Determine if current user can rate
+        can_rate_driver = False
+        can_rate_user = False
+        
+        if ride.status == "completed":
+            if current_user_id == ride.user_id and not user_rating:
+                can_rate_driver = True
+            elif current_user_id == ride.driver_id and not driver_rating:
+                can_rate_user = True
+        
+        return RideWithRatingsResponse(
+            ride_id=ride.ride_id,
+            user_id=ride.user_id,
+            driver_id=ride.driver_id,
+            pickup=ride.pickup,
+            drop=ride.drop,
+            fare=float(ride.fare) if ride.fare is not None else None,
+            status=ride.status,
+            payment_status=ride.payment_status,
+            created_at=format_datetime(ride.created_at),
+            completed_at=format_datetime(ride.completed_at),
+            user_rating=user_rating,
+            driver_rating=driver_rating,
+            can_rate_driver=can_rate_driver,
+            can_rate_user=can_rate_user
+        )
+
+    @staticmethod
+    def _summarize_rating_aggregate(aggregate: Optional[Dict]) -> Dict:
+        """Turn a rating_aggregates row into summary fields"""
+        if not aggregate or not aggregate.get("rating_count"):
+            return {
+                "total_ratings": 0,
+                "average_rating": 0.0,
+                "ratings_breakdown": {1: 0, 2: 0, 3: 0, 4: 0, 5: 0}
+            }
+        
+        total_ratings = aggregate["rating_count"]
+        return {
+            "total_ratings": total_ratings,
+            "average_rating": round(aggregate["rating_sum"] / total_ratings, 2),
+            "ratings_breakdown": {star: aggregate[f"stars_{star}"] for star in range(1, 6)}
+        }
+
+    def _get_cached_ratings_summary(self, rater_type: str, rated_user_id: str) -> Tuple[Dict, str]:
+        """Read-through cached summary fields and their ETag"""
+        def load() -> Tuple[Dict, str]:
+            aggregate = self.rating_repo.get_rating_aggregate(rated_user_id, rater_type)
+            summary = self._summarize_rating_aggregate(aggregate)
+            digest = hashlib.sha1(
+                json.dumps([rater_type, rated_user_id, summary], sort_keys=True).encode("utf-8")
+            ).hexdigest()
+            return summary, f'"{digest}"'
+        
+        return rating_summary_cache.get_or_load((rater_type, rated_user_id), load)
+
+    def get_user_ratings_summary_with_etag(self, user_id: str) -> Tuple[UserRatingsSummary, str]:
+        """Get summary of ratings received by a user, with an ETag for revalidation"""
         try:
-            ratings = self.rating_repo.get_ratings_for_user(user_id)
-            
-            if not ratings:
-                return UserRatingsSummary(
-                    user_id=user_id,
-                    total_ratings=0,
-                    average_rating=0.0,
-                    ratings_breakdown={1: 0, 2: 0, 3: 0, 4: 0, 5: 0}
-                )
-            
-            total_ratings = len(ratings)
-            total_score = sum(rating["rating"] for rating in ratings)
-            average_rating = round(total_score / total_ratings, 2)
-            
-            # Count ratings by star value
-            breakdown = {1: 0, 2: 0, 3: 0, 4: 0, 5: 0}
-            for rating in ratings:
-                breakdown[rating["rating"]] += 1
-            
-            return UserRatingsSummary(
-                user_id=user_id,
-                total_ratings=total_ratings,
-                average_rating=average_rating,
-                ratings_breakdown=breakdown
-            )
+            # Ratings received as a rider are given by drivers
+            summary, etag = self._get_cached_ratings_summary("driver", user_id)
+            return UserRatingsSummary(user_id=user_id, **summary), etag
             
         except Exception as e:
             raise HTTPException(
@@ -580,34 +644,16 @@ class RideService:
                 detail=f"Error fetching user ratings: {str(e)}"
             )
 
-    def get_driver_ratings_summary(self, driver_id: str) -> DriverRatingsSummary:
-        """Get summary of ratings received by a driver"""
+    def get_user_ratings_summary(self, user_id: str) -> UserRatingsSummary:
+        """Get summary of ratings received by a user"""
+        return self.get_user_ratings_summary_with_etag(user_id)[0]
+
+    def get_driver_ratings_summary_with_etag(self, driver_id: str) -> Tuple[DriverRatingsSummary, str]:
+        """Get summary of ratings received by a driver, with an ETag for revalidation"""
         try:
-            ratings = self.rating_repo.get_ratings_for_driver(driver_id)
-            
-            if not ratings:
-                return DriverRatingsSummary(
-                    driver_id=driver_id,
-                    total_ratings=0,
-                    average_rating=0.0,
-                    ratings_breakdown={1: 0, 2: 0, 3: 0, 4: 0, 5: 0}
-                )
-            
-            total_ratings = len(ratings)
-            total_score = sum(rating["rating"] for rating in ratings)
-            average_rating = round(total_score / total_ratings, 2)
-            
-            # Count ratings by star value
-            breakdown = {1: 0, 2: 0, 3: 0, 4: 0, 5: 0}
-            for rating in ratings:
-                breakdown[rating["rating"]] += 1
-            
-            return DriverRatingsSummary(
-                driver_id=driver_id,
-                total_ratings=total_ratings,
-                average_rating=average_rating,
-                ratings_breakdown=breakdown
-            )
+            # Ratings received as a driver are given by users
+            summary, etag = self._get_cached_ratings_summary("user", driver_id)
+            return DriverRatingsSummary(driver_id=driver_id, **summary), etag
             
         except Exception as e:
             raise HTTPException(
@@ -615,40 +661,105 @@ class RideService:
                 detail=f"Error fetching driver ratings: {str(e)}"
             )
 
-    def get_my_completed_rides(self, current_user_id: str) -> List[RideWithRatingsResponse]:
-        """Get all completed rides for current user with rating info"""
+    def get_driver_ratings_summary(self, driver_id: str) -> DriverRatingsSummary:
+        """Get summary of ratings received by a driver"""
+        return self.get_driver_ratings_summary_with_etag(driver_id)[0]
+
+    def get_my_completed_rides(self, current_user_id: str, limit: int = 20, 
+                               cursor: Optional[str] = None) -> CompletedRidesPage:
+        """Get a page of completed rides for current user with rating info"""
         try:
+            try:
+                after = decode_cursor(cursor)
+            except ValueError:
+                raise HTTPException(
+                    status_code=status.HTTP_400_BAD_REQUEST,
+                    detail="Invalid cursor"
+                )
+            limit = max(1, min(limit, MAX_COMPLETED_RIDES_PAGE_SIZE))
+            
             # Check if user is a driver or regular user
             try:
                 is_driver = self.user_service.verify_user_role(current_user_id, "driver")
             except:
                 is_driver = False
             
-            if is_driver:
-                # Get rides where user is the driver
-                rides = self.ride_repo.get_rides_by_driver_id(current_user_id, status="completed")
-            else:
-                # Get rides where user is the rider
-                rides = self.ride_repo.get_rides_by_user_id(current_user_id, status="completed")
+            # Get rides where user is the driver or the rider; one extra row tells us
+            # whether another page exists
+            participant_column = "driver_id" if is_driver else "user_id"
+            rides = self.ride_repo.get_completed_rides_page(
+                participant_column, current_user_id, limit + 1, after
+            )
+            has_more = len(rides) > limit
+            rides = rides[:limit]
+            
+            # Fetch ratings for the whole page in one query
+            ratings_by_ride: Dict[str, List[Dict]] = {}
+            for rating in self.rating_repo.get_ratings_by_ride_ids([ride.ride_id for ride in rides]):
+                ratings_by_ride.setdefault(rating["ride_id"], []).append(rating)
             
             result = []
             for ride in rides:
                 try:
-                    ride_with_ratings = self.get_ride_with_ratings(current_user_id, ride["ride_id"])
-                    result.append(ride_with_ratings)
+                    result.append(self._build_ride_with_ratings(
+                        current_user_id, ride, ratings_by_ride.get(ride.ride_id, [])
+                    ))
                 except Exception as e:
                     # Skip rides that can't be processed
-                    print(f"Error processing ride {ride['ride_id']}: {str(e)}")
+                    print(f"Error processing ride {ride.ride_id}: {str(e)}")
                     continue
             
-            return result
+            next_cursor = None
+            if has_more and rides:
+                last = rides[-1]
+                next_cursor = encode_cursor(format_datetime(last.created_at), last.ride_id)
+            
+            return CompletedRidesPage(rides=result, next_cursor=next_cursor, limit=limit)
             
+        except HTTPException:
+            raise
         except Exception as e:
             raise HTTPException(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
                 detail=f"Error fetching completed rides: {str(e)}"
             )
     
+    def export_ride_history(self, current_user_id: str, export_format: str = "ndjson",
+                            start_date: Optional[str] = None, end_date: Optional[str] = None) -> Iterator[str]:
+        """Validate the request and return a lazy iterator over the user's ride history,
+        read from the database one keyset page at a time"""
+        if export_format not in ("ndjson", "csv"):
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Export format must be 'ndjson' or 'csv'"
+            )
+        
+        try:
+            created_from = datetime.strptime(start_date, '%Y-%m-%d').date().isoformat() if start_date else None
+            # end_date is inclusive
+            created_before = (datetime.strptime(end_date, '%Y-%m-%d').date() + timedelta(days=1)).isoformat() if end_date else None
+        except ValueError:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Dates must be in YYYY-MM-DD format"
+            )
+        
+        try:
+            is_driver = self.user_service.verify_user_role(current_user_id, "driver")
+        except:
+            is_driver = False
+        
+        rides = self.ride_repo.iter_rides(
+            "driver_id" if is_driver else "user_id",
+            current_user_id,
+            chunk_size=RIDE_EXPORT_CHUNK_SIZE,
+            columns=",".join(RIDE_EXPORT_COLUMNS),
+            created_from=created_from,
+            created_before=created_before
+        )
+        
+        return iter_csv(rides) if export_format == "csv" else iter_ndjson(rides)
+    
     def get_all_rides_admin(self, status_filter: Optional[str] = None, page: int = 1, limit: int = 50) -> Dict:
         """Get all rides for admin with optional status filter"""
         try:
@@ -1,7 +1,9 @@
 from typing import List, Dict, Optional
 from ..repositories.ride_repository import RideRepository, RideApplicationRepository
 from ..domain.services import FareCalculationService, LocationService
-from ..schemas import RideCreateRequest, RideResponse, RideApplicationRequest
+from ..domain.state_machine import RideStateMachine
+from ..models.entities import Location
+from ..schemas import RideCreateRequest, RideResponse, RideApplicationRequest, ride_response_payload
 from users.service import UserService
 from fastapi import HTTPException, status
 import uuid
@@ -13,6 +15,7 @@ class CreateRideUseCase:
         self.ride_repo = ride_repo
         self.user_service = user_service
         self.fare_service = FareCalculationService()
+        self.location_service = LocationService()
     
     def execute(self, user_id: str, request: RideCreateRequest) -> RideResponse:
         # Verify user is a rider
@@ -27,7 +30,7 @@ class CreateRideUseCase:
         drop_coords = request.drop_coordinates.dict()
         fare = self.fare_service.calculate_fare(pickup_coords, drop_coords)
         
-        # Create ride data
+        # Create ride data; coordinates go to numeric columns for geo queries
         ride_data = {
             "ride_id": str(uuid.uuid4()),
             "user_id": user_id,
@@ -36,11 +39,13 @@ class CreateRideUseCase:
             "status": "pending",
             "payment_status": "pending",
             "requested_at": datetime.now().isoformat(),
-            "fare": float(fare)
+            "fare": float(fare),
+            **self.location_service.to_columns(Location(**pickup_coords), "pickup", with_address=False),
+            **self.location_service.to_columns(Location(**drop_coords), "drop", with_address=False)
         }
         
         ride = self.ride_repo.create_ride(ride_data)
-        return RideResponse(**ride)
+        return RideResponse.from_entity(ride)
 
 class ApplyForRideUseCase:
     def __init__(self, ride_repo: RideRepository, app_repo: RideApplicationRepository, user_service: UserService):
@@ -59,7 +64,7 @@ class ApplyForRideUseCase:
         
         # Check if ride exists and is pending
         ride = self.ride_repo.get_ride_by_id(request.ride_id)
-        if not ride or ride["status"] != "pending":
+        if not ride or ride.status != "pending":
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail="Ride is not available for application"
@@ -74,17 +79,13 @@ class ApplyForRideUseCase:
             )
         
         # Create application
-        location_json = self.location_service.format_location(
-            request.current_location.latitude,
-            request.current_location.longitude,
-            request.current_location.address
-        )
+        location = Location(**request.current_location.dict())
         
         app_data = {
             "application_id": str(uuid.uuid4()),
             "ride_id": request.ride_id,
             "driver_id": driver_id,
-            "locations": location_json,
+            **self.location_service.to_columns(location, "driver"),
             "applied_at": datetime.now().isoformat()
         }
         
@@ -96,7 +97,7 @@ class GetPendingRidesUseCase:
         self.ride_repo = ride_repo
         self.user_service = user_service
     
-    def execute(self, driver_id: str) -> List[RideResponse]:
+    def execute(self, driver_id: str) -> List[Dict]:
         # Verify user is a driver
         if not self.user_service.verify_user_role(driver_id, "driver"):
             raise HTTPException(
@@ -105,40 +106,36 @@ class GetPendingRidesUseCase:
             )
         
         rides = self.ride_repo.get_rides_by_status("pending")
-        return [RideResponse(**ride) for ride in rides]
+        return [ride_response_payload(ride) for ride in rides]
 
 class SelectDriverUseCase:
     def __init__(self, ride_repo: RideRepository, app_repo: RideApplicationRepository):
         self.ride_repo = ride_repo
         self.app_repo = app_repo
+        self.state_machine = RideStateMachine(ride_repo)
     
     def execute(self, user_id: str, ride_id: str, driver_id: str) -> Dict[str, str]:
-        # Verify user owns the ride
-        ride = self.ride_repo.get_ride_by_id(ride_id)
-        if not ride or ride["user_id"] != user_id:
-            raise HTTPException(
-                status_code=status.HTTP_403_FORBIDDEN,
-                detail="You don't have permission to select driver for this ride"
-            )
-        
-        if ride["status"] != "pending":
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail="Ride is not in pending status"
-            )
-        
         # Verify driver applied
         application = self.app_repo.check_existing_application(ride_id, driver_id)
         if not application:
+            # Report ownership/status problems ahead of the missing application
+            ride = self.ride_repo.get_ride_by_id(ride_id)
+            if not ride or ride.user_id != user_id:
+                raise HTTPException(
+                    status_code=status.HTTP_403_FORBIDDEN,
+                    detail="You don't have permission to select driver for this ride"
+                )
+            if ride.status != "pending":
+                raise HTTPException(
+                    status_code=status.HTTP_400_BAD_REQUEST,
+                    detail="Ride is not in pending status"
+                )
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail="Driver has not applied for this ride"
             )
         
-        # Update ride
-        self.ride_repo.update_ride(ride_id, {
-            "driver_id": driver_id,
-            "status": "confirmed"
-        })
+        # Confirm the ride only if the user owns it and it is still pending
+        self.state_machine.transition(ride_id, "confirm", user_id, {"driver_id": driver_id})
         
-        return {"message": "Driver selected successfully"}
\ No newline at end of file
+        return {"message": "Driver selected successfully"}
@@ -0,0 +1,355 @@
+from abc import ABC, abstractmethod
+from typing import Callable, Dict, List, Optional, Set
+import asyncio
+import json
+import os
+import socket
+import struct
+
+from shared.serialization import dumps
+
+# Envelopes published between workers:
+#   {"kind": "users", "targets": [user_id, ...], "frame": str[, "room": room]}
+#   {"kind": "room_open", "ride_id": str, "participants": [user_id, ...]}
+#   {"kind": "room_close", "ride_id": str[, "frame": str]}      (`frame`: the room's final message)
+#   {"kind": "route", "targets": [user_id, ...], "frame": str[, "room": room]}  (to the users' directory owner)
+#   {"kind": "presence" | "heartbeat" | "leave", ...}           (cluster directory upkeep)
+#   {"kind": "driver", "op": "up" | "down" | "busy" | "cell", ...} (driver presence)
+#   {"kind": "personal", "user": str, "message": dict, "frame": str} (to the user's owner, for sequencing)
+#   {"kind": "resume" | "replay", ...}                          (replay after a reconnect)
+#   {"kind": "cache_invalidate", "cache": str, "key": ...}      (a shared cache's key changed)
+# `frame` is the already-encoded websocket frame, so receivers never re-serialize.
+# `room` ({"ride_id": str[, "binary": base64 str][, "coalescible": true]}) marks a
+# ride room frame, for the room's subscribers only; `binary` is its
+# binary-subprotocol form, and a coalescible frame may be dropped by a full queue.
+# An envelope goes to every other worker, or only to worker `to` when given.
+EnvelopeHandler = Callable[[Dict], None]
+
+BACKPLANE = os.getenv("WS_BACKPLANE", "inprocess").lower()
+BACKPLANE_SOCKET = os.getenv("WS_BACKPLANE_SOCKET", "/tmp/bhai_jaben_ws_backplane.sock")
+# Per-peer write buffer above which envelopes are dropped instead of buffered
+BACKPLANE_MAX_BUFFER = int(os.getenv("WS_BACKPLANE_MAX_BUFFER_BYTES", str(8 * 1024 * 1024)))
+
+_LENGTH = struct.Struct(">I")
+
+def worker_identity() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+def undeliverable_fallback(envelope: Dict) -> Optional[Dict]:
+    """What to fan out instead of an envelope whose addressee is gone: routed
+    messages must still reach whichever worker holds the sockets"""
+    if envelope.get("kind") == "route":
+        fallback = {"kind": "users", "targets": envelope["targets"], "frame": envelope["frame"]}
+        if "room" in envelope:
+            fallback["room"] = envelope["room"]
+        return fallback
+    if envelope.get("kind") == "personal":
+        # Delivered unsequenced: it cannot be replayed, but it is not lost
+        return {"kind": "users", "targets": [envelope["user"]], "frame": envelope["frame"]}
+    return None
+
+class Backplane(ABC):
+    """Carries websocket envelopes to the other workers. Publishing never awaits:
+    envelopes that cannot be handed off are dropped and counted."""
+
+    def __init__(self, worker_id: Optional[str] = None):
+        self.worker_id = worker_id or worker_identity()
+        self.published = 0
+        self.received = 0
+        self.dropped = 0
+
+    @abstractmethod
+    async def start(self, handler: EnvelopeHandler):
+        pass
+
+    @abstractmethod
+    def publish(self, envelope: Dict, to: Optional[str] = None):
+        pass
+
+    @abstractmethod
+    async def stop(self):
+        pass
+
+    def stats(self) -> Dict:
+        return {
+            "type": type(self).__name__,
+            "worker_id": self.worker_id,
+            "published": self.published,
+            "received": self.received,
+            "dropped": self.dropped
+        }
+
+class InProcessBackplane(Backplane):
+    """Backplane between managers in one process. With a private hub (the
+    default) there are no other workers and publishing is a no-op; tests pass
+    one shared `hub` set to simulate several workers."""
+
+    def __init__(self, hub: Optional[Set["InProcessBackplane"]] = None, worker_id: Optional[str] = None):
+        super().__init__(worker_id)
+        self.hub = hub if hub is not None else set()
+        self._handler: Optional[EnvelopeHandler] = None
+
+    async def start(self, handler: EnvelopeHandler):
+        self._handler = handler
+        self.hub.add(self)
+
+    def publish(self, envelope: Dict, to: Optional[str] = None):
+        self.published += 1
+        peers = [peer for peer in self.hub if peer is not self and peer._handler is not None]
+        if to is not None:
+            addressed = [peer for peer in peers if peer.worker_id == to]
+            if addressed:
+                peers = addressed
+            else:
+                envelope = undeliverable_fallback(envelope)
+                if envelope is None:
+                    return
+        loop = asyncio.get_running_loop()
+        for peer in peers:
+            loop.call_soon(peer._deliver, envelope)
+
+    def _deliver(self, envelope: Dict):
+        if self._handler is None:
+            return
+        self.received += 1
+        self._handler(envelope)
+
+    async def stop(self):
+        self.hub.discard(self)
+        self._handler = None
+        # Like the Unix broker, tell the remaining workers this one is gone
+        loop = asyncio.get_running_loop()
+        for peer in self.hub:
+            loop.call_soon(peer._deliver, {"kind": "leave", "worker": self.worker_id})
+
+class UnixSocketBackplane(Backplane):
+    """Backplane over a Unix domain socket broker shared by the workers of one host.
+
+    Each worker connects to the broker at `path` and registers its worker id;
+    the broker relays every length-prefixed packet to the addressed worker, or
+    to all other workers when the packet has no address, and announces a
+    worker's departure as soon as its connection drops. If no broker is
+    listening, the worker hosts one itself, so a deployment needs no extra
+    process: when the hosting worker exits, the others reconnect and one of
+    them takes over.
+    """
+
+    def __init__(self, path: str = BACKPLANE_SOCKET, max_buffer: int = BACKPLANE_MAX_BUFFER,
+                 reconnect_delay: float = 0.5, worker_id: Optional[str] = None):
+        super().__init__(worker_id)
+        self.path = path
+        self.max_buffer = max_buffer
+        self.reconnect_delay = reconnect_delay
+        self._handler: Optional[EnvelopeHandler] = None
+        self._writer: Optional[asyncio.StreamWriter] = None
+        # Packets published while (re)connecting to the broker, up to max_buffer bytes
+        self._pending: List[bytes] = []
+        self._pending_bytes = 0
+        self._task: Optional[asyncio.Task] = None
+        self._watchdog: Optional[asyncio.Task] = None
+        self._broker: Optional[asyncio.AbstractServer] = None
+        self._broker_inode: Optional[int] = None
+        # Broker side: registered worker id -> connection, and the tasks serving them
+        self._peers: Dict[str, asyncio.StreamWriter] = {}
+        self._peer_tasks: Set[asyncio.Task] = set()
+
+    async def start(self, handler: EnvelopeHandler):
+        self._handler = handler
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+            self._watchdog = asyncio.create_task(self._watch_broker())
+
+    def publish(self, envelope: Dict, to: Optional[str] = None):
+        writer = self._writer
+        if writer is None:
+            # Broker failover in progress: hold the packet until we reconnect
+            packet = _pack(to or "", dumps(envelope))
+            if self._pending_bytes + len(packet) > self.max_buffer:
+                self.dropped += 1
+                return
+            self._pending.append(packet)
+            self._pending_bytes += len(packet)
+            self.published += 1
+            return
+        if writer.transport.get_write_buffer_size() > self.max_buffer:
+            self.dropped += 1
+            return
+        writer.write(_pack(to or "", dumps(envelope)))
+        self.published += 1
+
+    async def stop(self):
+        for task in (self._task, self._watchdog):
+            if task is None:
+                continue
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+        self._task = None
+        self._watchdog = None
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+        self._close_broker()
+        # Closing the peers' connections ends their tasks; wait for them so none
+        # is left to be cancelled (and reported) when the event loop shuts down
+        if self._peer_tasks:
+            await asyncio.wait(list(self._peer_tasks), timeout=1.0)
+        for task in list(self._peer_tasks):
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+
+    async def _run(self):
+        while True:
+            try:
+                reader, writer = await self._connect_or_host()
+                # First packet registers this worker with the broker
+                writer.write(_pack("", self.worker_id.encode("utf-8")))
+                for packet in self._pending:
+                    writer.write(packet)
+                self._pending.clear()
+                self._pending_bytes = 0
+                self._writer = writer
+                await self._read_loop(reader)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"Websocket backplane connection error: {str(e)}")
+            if self._writer is not None:
+                self._writer.close()
+            self._writer = None
+            await asyncio.sleep(self.reconnect_delay)
+
+    async def _connect_or_host(self):
+        try:
+            return await asyncio.open_unix_connection(self.path)
+        except (ConnectionRefusedError, FileNotFoundError):
+            pass
+
+        # No live broker: a leftover socket file from a dead host is removed and
+        # this worker hosts the broker. Concurrent takeovers settle on the last
+        # worker to bind; the others notice their socket file was replaced and
+        # shut their broker down, so every worker ends up on the same one.
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+        self._close_broker()
+        self._broker = await asyncio.start_unix_server(self._serve_peer, path=self.path)
+        self._broker_inode = os.stat(self.path).st_ino
+        return await asyncio.open_unix_connection(self.path)
+
+    async def _watch_broker(self, interval: float = 5.0):
+        """Shut down a broker hosted here once another worker's has replaced it"""
+        while True:
+            await asyncio.sleep(interval)
+            if self._broker is not None and self._broker_superseded():
+                self._close_broker()
+
+    def _broker_superseded(self) -> bool:
+        try:
+            return os.stat(self.path).st_ino != self._broker_inode
+        except FileNotFoundError:
+            return True
+
+    def _close_broker(self):
+        if self._broker is None:
+            return
+        self._broker.close()
+        for peer in list(self._peers.values()):
+            peer.close()
+        self._peers.clear()
+        self._broker = None
+        self._broker_inode = None
+
+    async def _read_loop(self, reader: asyncio.StreamReader):
+        try:
+            while True:
+                _, payload = _unpack(await _read_packet(reader))
+                self.received += 1
+                try:
+                    self._handler(json.loads(payload))
+                except Exception as e:
+                    print(f"Error handling backplane envelope: {str(e)}")
+        except asyncio.IncompleteReadError:
+            return
+
+    async def _serve_peer(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        """Broker side: relay each packet verbatim to its addressee, or to every
+        other worker"""
+        task = asyncio.current_task()
+        self._peer_tasks.add(task)
+        worker_id = None
+        try:
+            _, registration = _unpack(await _read_packet(reader))
+            worker_id = registration.decode("utf-8")
+            previous = self._peers.get(worker_id)
+            if previous is not None:
+                previous.close()
+            self._peers[worker_id] = writer
+
+            while True:
+                packet = await _read_packet(reader)
+                to, payload = _unpack(packet)
+                if to:
+                    peer = self._peers.get(to)
+                    if peer is not None:
+                        self._relay(packet, (peer,))
+                        continue
+                    # Addressee gone: fan out what must still be delivered
+                    fallback = undeliverable_fallback(json.loads(payload))
+                    if fallback is None:
+                        continue
+                    packet = _pack("", dumps(fallback))
+                self._relay(packet, [peer for peer in self._peers.values() if peer is not writer])
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        except asyncio.CancelledError:
+            # Shutting down: end quietly rather than as a cancelled connection task
+            pass
+        finally:
+            self._peer_tasks.discard(task)
+            if worker_id is not None and self._peers.get(worker_id) is writer:
+                del self._peers[worker_id]
+                # Tell the remaining workers at once rather than after missed heartbeats
+                self._relay(_pack("", dumps({"kind": "leave", "worker": worker_id})), list(self._peers.values()))
+            writer.close()
+
+    def _relay(self, packet: bytes, peers):
+        for peer in peers:
+            if peer.transport.get_write_buffer_size() > self.max_buffer:
+                self.dropped += 1
+                continue
+            peer.write(packet)
+
+    def stats(self) -> Dict:
+        return {
+            **super().stats(),
+            "path": self.path,
+            "connected": self._writer is not None,
+            "hosting_broker": self._broker is not None,
+            "broker_peers": len(self._peers)
+        }
+
+def _pack(to: str, payload: bytes) -> bytes:
+    """Packet: 4-byte length, 1-byte address length, address, payload"""
+    address = to.encode("utf-8")
+    return _LENGTH.pack(1 + len(address) + len(payload)) + bytes((len(address),)) + address + payload
+
+def _unpack(packet: bytes):
+    address_length = packet[_LENGTH.size]
+    start = _LENGTH.size + 1
+    return packet[start:start + address_length].decode("utf-8"), packet[start + address_length:]
+
+async def _read_packet(reader: asyncio.StreamReader) -> bytes:
+    header = await reader.readexactly(_LENGTH.size)
+    return header + await reader.readexactly(_LENGTH.unpack(header)[0])
+
+def create_backplane() -> Backplane:
+    """Backplane selected by WS_BACKPLANE: "inprocess" (single worker) or "unix"
+    (several workers on one host)"""
+    if BACKPLANE == "unix":
+        return UnixSocketBackplane()
+    return InProcessBackplane()
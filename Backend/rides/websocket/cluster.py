@@ -0,0 +1,252 @@
+from bisect import bisect
+from collections import defaultdict
+from typing import Callable, Dict, Iterable, List, Optional
+import asyncio
+import hashlib
+import os
+import time
+
+from .backplane import Backplane
+
+HEARTBEAT_SECONDS = float(os.getenv("WS_CLUSTER_HEARTBEAT_SECONDS", "2"))
+# After membership changes, users missing from a directory may just not have
+# been re-announced yet: their messages fan out instead of being dropped
+REBALANCE_GRACE_SECONDS = float(os.getenv("WS_CLUSTER_REBALANCE_GRACE_SECONDS", "10"))
+
+def _hash(key: str) -> int:
+    return int.from_bytes(hashlib.md5(key.encode("utf-8")).digest()[:8], "big")
+
+class HashRing:
+    """Consistent-hash ring: adding or removing a node only moves the keys of
+    the ring arcs it gains or loses"""
+
+    def __init__(self, nodes: Iterable[str] = (), replicas: int = 100):
+        self.replicas = replicas
+        self._points: List[int] = []
+        self._owners: List[str] = []
+        self.nodes = set()
+        for node in nodes:
+            self.add(node)
+
+    def add(self, node: str):
+        if node in self.nodes:
+            return
+        self.nodes.add(node)
+        self._rebuild()
+
+    def remove(self, node: str):
+        if node not in self.nodes:
+            return
+        self.nodes.discard(node)
+        self._rebuild()
+
+    def _rebuild(self):
+        points = sorted(
+            (_hash(f"{node}#{replica}"), node)
+            for node in self.nodes
+            for replica in range(self.replicas)
+        )
+        self._points = [point for point, _ in points]
+        self._owners = [node for _, node in points]
+
+    def owner(self, key: str) -> Optional[str]:
+        if not self._points:
+            return None
+        index = bisect(self._points, _hash(key)) % len(self._points)
+        return self._owners[index]
+
+class ClusterDirectory:
+    """Sharded user -> worker directory for routing websocket messages.
+
+    Each connected user is owned by one worker on the consistent-hash ring of
+    live workers. The worker holding a user's socket tells the owner when the
+    user connects or disconnects (incremental presence), and a message for a
+    user on another worker goes sender -> owner -> holder, point-to-point
+    instead of to every worker. Owners that cannot resolve a user while the
+    ring is rebalancing fall back to a fan-out, so no message is dropped
+    while ownership moves.
+    """
+
+    def __init__(self, backplane: Backplane, deliver_local: Callable[[str, str, Optional[Dict]], bool],
+                 local_users: Callable[[], Iterable[str]]):
+        self.backplane = backplane
+        self.worker_id = backplane.worker_id
+        self.deliver_local = deliver_local
+        self.local_users = local_users
+        self.ring = HashRing([self.worker_id])
+        self.workers: Dict[str, float] = {}  # other workers -> last heartbeat (monotonic)
+        self.holders: Dict[str, str] = {}    # owned user_id -> worker holding the socket
+        self._ring_changed_at = time.monotonic()
+        self._prune_pending = False
+        self._task: Optional[asyncio.Task] = None
+        # Called with a worker id when it joins / leaves the cluster
+        self.on_worker_joined: List[Callable[[str], None]] = []
+        self.on_worker_left: List[Callable[[str], None]] = []
+        self.routed = 0
+        self.fanout_fallbacks = 0
+
+    async def start(self):
+        self._ring_changed_at = time.monotonic()
+        self.backplane.publish({"kind": "heartbeat", "worker": self.worker_id})
+        if self._task is None:
+            self._task = asyncio.create_task(self._heartbeat_loop())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        self.backplane.publish({"kind": "leave", "worker": self.worker_id})
+
+    # Presence
+
+    def user_connected(self, user_id: str):
+        owner = self.ring.owner(user_id)
+        if owner == self.worker_id:
+            self.holders[user_id] = self.worker_id
+        else:
+            self.backplane.publish({"kind": "presence", "op": "up", "user": user_id, "holder": self.worker_id}, to=owner)
+
+    def user_disconnected(self, user_id: str):
+        owner = self.ring.owner(user_id)
+        if owner == self.worker_id:
+            if self.holders.get(user_id) == self.worker_id:
+                del self.holders[user_id]
+        else:
+            self.backplane.publish({"kind": "presence", "op": "down", "user": user_id, "holder": self.worker_id}, to=owner)
+
+    # Routing
+
+    def route(self, user_ids: List[str], frame: str, room: Optional[Dict] = None):
+        """Send a frame to users that are not connected to this worker. A ride
+        room frame carries `room` ({"ride_id": ...[, "binary": ...]}), so the
+        holder delivers it only to sockets subscribed to that room"""
+        by_owner: Dict[str, List[str]] = defaultdict(list)
+        for user_id in user_ids:
+            by_owner[self.ring.owner(user_id)].append(user_id)
+
+        for owner, users in by_owner.items():
+            if owner == self.worker_id:
+                self._route_owned(users, frame, room)
+            else:
+                self.routed += 1
+                self.backplane.publish(self._addressed("route", users, frame, room), to=owner)
+
+    @staticmethod
+    def _addressed(kind: str, user_ids: List[str], frame: str, room: Optional[Dict]) -> Dict:
+        envelope = {"kind": kind, "targets": user_ids, "frame": frame}
+        if room is not None:
+            envelope["room"] = room
+        return envelope
+
+    def _route_owned(self, user_ids: List[str], frame: str, room: Optional[Dict] = None):
+        by_holder: Dict[str, List[str]] = defaultdict(list)
+        unknown = []
+        for user_id in user_ids:
+            holder = self.holders.get(user_id)
+            if holder is None:
+                unknown.append(user_id)
+            elif holder != self.worker_id:
+                by_holder[holder].append(user_id)
+
+        for holder, users in by_holder.items():
+            self.backplane.publish(self._addressed("users", users, frame, room), to=holder)
+
+        # Unknown users are offline, unless their holder has not re-announced
+        # them since the last membership change
+        if unknown and self.rebalancing():
+            self.fanout_fallbacks += 1
+            self.backplane.publish(self._addressed("users", unknown, frame, room))
+
+    def rebalancing(self) -> bool:
+        return time.monotonic() - self._ring_changed_at < REBALANCE_GRACE_SECONDS
+
+    # Envelopes from other workers
+
+    def handle(self, envelope: Dict):
+        kind = envelope["kind"]
+        if kind == "route":
+            frame, room = envelope["frame"], envelope.get("room")
+            remaining = [user_id for user_id in envelope["targets"] if not self.deliver_local(user_id, frame, room)]
+            if remaining:
+                self._route_owned(remaining, frame, room)
+        elif kind == "presence":
+            user_id, holder = envelope["user"], envelope["holder"]
+            if envelope["op"] == "up":
+                self.holders[user_id] = holder
+            elif self.holders.get(user_id) == holder:
+                del self.holders[user_id]
+        elif kind == "heartbeat":
+            worker = envelope["worker"]
+            if worker not in self.workers:
+                self.workers[worker] = time.monotonic()
+                # Let the newcomer learn about us without waiting a full interval
+                self.backplane.publish({"kind": "heartbeat", "worker": self.worker_id}, to=worker)
+                self._join(worker)
+            else:
+                self.workers[worker] = time.monotonic()
+        elif kind == "leave":
+            self._leave(envelope["worker"])
+
+    # Membership
+
+    def _join(self, worker: str):
+        previous = self._owner_snapshot()
+        self.ring.add(worker)
+        self._rebalance(previous)
+        for listener in self.on_worker_joined:
+            listener(worker)
+
+    def _leave(self, worker: str):
+        if self.workers.pop(worker, None) is None:
+            return
+        previous = self._owner_snapshot()
+        self.ring.remove(worker)
+        # Sockets that worker held are gone with it
+        for user_id in [user_id for user_id, holder in self.holders.items() if holder == worker]:
+            del self.holders[user_id]
+        self._rebalance(previous)
+        for listener in self.on_worker_left:
+            listener(worker)
+
+    def _owner_snapshot(self) -> Dict[str, str]:
+        return {user_id: self.ring.owner(user_id) for user_id in self.local_users()}
+
+    def _rebalance(self, previous_owners: Dict[str, str]):
+        """Re-announce local users whose owner changed; entries this worker no
+        longer owns are pruned once the grace period ends"""
+        self._ring_changed_at = time.monotonic()
+        self._prune_pending = True
+        for user_id, previous in previous_owners.items():
+            owner = self.ring.owner(user_id)
+            if owner != previous:
+                if owner == self.worker_id:
+                    self.holders[user_id] = self.worker_id
+                else:
+                    self.backplane.publish({"kind": "presence", "op": "up", "user": user_id, "holder": self.worker_id}, to=owner)
+
+    async def _heartbeat_loop(self):
+        while True:
+            await asyncio.sleep(HEARTBEAT_SECONDS)
+            self.backplane.publish({"kind": "heartbeat", "worker": self.worker_id})
+
+            deadline = time.monotonic() - 3 * HEARTBEAT_SECONDS
+            for worker in [worker for worker, seen in self.workers.items() if seen < deadline]:
+                self._leave(worker)
+
+            if self._prune_pending and not self.rebalancing():
+                self._prune_pending = False
+                for user_id in [user_id for user_id in self.holders if self.ring.owner(user_id) != self.worker_id]:
+                    del self.holders[user_id]
+
+    def stats(self) -> Dict:
+        return {
+            "workers": len(self.ring.nodes),
+            "directory_entries": len(self.holders),
+            "rebalancing": self.rebalancing(),
+            "routed_envelopes": self.routed,
+            "fanout_fallbacks": self.fanout_fallbacks
+        }
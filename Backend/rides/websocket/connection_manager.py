@@ -1,50 +1,564 @@
-from typing import Dict, List
+from collections import deque
+from typing import Deque, Dict, Iterable, List, Optional, Set, Tuple, Union
 from fastapi import WebSocket
-import json
+import asyncio
+import base64
+import os
+import sys
+import time
+import uuid
 from datetime import datetime
 
+from shared.cache import TTLCache
+from shared.serialization import dumps
+from ..repositories.ride_repository import RideRepository
+from .backplane import Backplane, create_backplane
+from .cluster import ClusterDirectory
+from .presence import DriverPresence, driver_lookup
+from .protocol import BINARY_SUBPROTOCOL
+from .replay import ReplayStore
+
+# Outbound frames buffered per connection before the slow-consumer policy applies
+SEND_QUEUE_SIZE = int(os.getenv("WS_SEND_QUEUE_SIZE", "256"))
+# "drop": discard the connection's oldest queued frame that a newer one
+# supersedes (a location update), and disconnect it only when there is none;
+# "close": disconnect it
+SLOW_CONSUMER_POLICY = os.getenv("WS_SLOW_CONSUMER_POLICY", "drop").lower()
+
+# 1013 "Try Again Later": the client should reconnect and resync
+SLOW_CONSUMER_CLOSE_CODE = 1013
+# Sockets replaced by a newer connection from the same device, or evicted by the
+# per-user limit (application-defined 4000-4999 range)
+SUPERSEDED_CLOSE_CODE = 4000
+# Concurrent sockets kept per user (phone, tablet, ...); the oldest is evicted
+MAX_CONNECTIONS_PER_USER = int(os.getenv("WS_MAX_CONNECTIONS_PER_USER", "5"))
+# Period of the manager's housekeeping (replay buffer expiry)
+MAINTENANCE_INTERVAL_SECONDS = float(os.getenv("WS_MAINTENANCE_INTERVAL_SECONDS", "30"))
+# Period of the check for rooms whose ride has ended without closing them
+ROOM_SWEEP_INTERVAL_SECONDS = float(os.getenv("WS_ROOM_SWEEP_INTERVAL_SECONDS", "300"))
+# A room is live while its ride is in one of these statuses
+LIVE_RIDE_STATUSES = ("pending", "confirmed", "ongoing")
+
+Frame = Union[str, bytes]
+
+class ClientConnection:
+    """A websocket with a bounded outbound queue drained by its own writer task,
+    so producers never await network I/O and one slow socket cannot delay
+    delivery to the others. Queued frames are kept with whether a later frame
+    supersedes them (coalescible), which decides what a full queue may drop."""
+
+    __slots__ = ("connection_id", "user_id", "device_id", "binary", "websocket", "queue", "ready", "writer",
+                 "dropped")
+
+    def __init__(self, user_id: str, websocket: WebSocket, device_id: Optional[str] = None,
+                 subprotocol: Optional[str] = None):
+        self.connection_id = uuid.uuid4().hex
+        self.user_id = user_id
+        self.device_id = device_id
+        self.binary = subprotocol == BINARY_SUBPROTOCOL
+        self.websocket = websocket
+        self.queue: Deque[Tuple[Frame, bool]] = deque()
+        # Set while the queue has frames for the writer
+        self.ready = asyncio.Event()
+        self.writer: Optional[asyncio.Task] = None
+        self.dropped = 0
+
 class ConnectionManager:
-    def __init__(self):
-        # Store active connections by user_id
-        self.active_connections: Dict[str, WebSocket] = {}
-        # Store connections by ride_id for ride-specific updates
-        self.ride_connections: Dict[str, List[str]] = {}
-    
-    async def connect(self, websocket: WebSocket, user_id: str):
-        await websocket.accept()
-        self.active_connections[user_id] = websocket
-    
-    def disconnect(self, user_id: str):
-        if user_id in self.active_connections:
-            del self.active_connections[user_id]
-        
+    def __init__(self, max_queue: int = SEND_QUEUE_SIZE, slow_consumer_policy: str = SLOW_CONSUMER_POLICY,
+                 backplane: Optional[Backplane] = None, max_connections_per_user: int = MAX_CONNECTIONS_PER_USER):
+        self.max_queue = max_queue
+        self.slow_consumer_policy = slow_consumer_policy
+        self.max_connections_per_user = max_connections_per_user
+        # Store active connections by user_id, then connection_id (insertion
+        # order = connection age); a user may be connected from several devices
+        self.active_connections: Dict[str, Dict[str, ClientConnection]] = {}
+        # Ride rooms: ride_id -> subscribed user_ids
+        self.ride_connections: Dict[str, Set[str]] = {}
+        # Reverse index: user_id -> ride_ids the user is subscribed to, so that
+        # leaving touches only the user's own rooms
+        self.user_rides: Dict[str, Set[str]] = {}
+        # Rooms opened by RideService: ride_id -> rider and driver, who are
+        # subscribed whenever they connect until the room is closed
+        self.room_participants: Dict[str, Set[str]] = {}
+        self.participant_rooms: Dict[str, Set[str]] = {}
+        self.rooms_opened = 0
+        self.rooms_closed = 0
+        self.orphan_rooms_swept = 0
+        self._ride_repo: Optional[RideRepository] = None
+        self.frames_dropped = 0
+        self.slow_consumers_closed = 0
+        self.superseded_closed = 0
+        self.send_failures = 0
+        # Carries messages for sockets held by other workers
+        self.backplane = backplane or create_backplane()
+        # Which worker holds each user's sockets, sharded across workers
+        self.directory = ClusterDirectory(self.backplane, self._deliver_routed, self.active_connections.keys)
+        # Connected drivers and their availability, across all workers
+        self.presence = DriverPresence(self.backplane, self.active_connections.__contains__)
+        self.directory.on_worker_joined.append(self.presence.worker_joined)
+        self.directory.on_worker_left.append(self.presence.worker_left)
+        # Recent personal messages of the users this worker owns in the directory
+        self.replay = ReplayStore()
+        # A membership change moves users between owners, and their history with them
+        self.directory.on_worker_joined.append(lambda worker: self.replay.ownership_changed())
+        self.directory.on_worker_left.append(lambda worker: self.replay.ownership_changed())
+        self.resumes = 0
+        self.resyncs = 0
+        self.frames_replayed = 0
+        # Caches each worker keeps of shared data: name -> cache
+        self.shared_caches: Dict[str, TTLCache] = {}
+        self._maintenance: Optional[asyncio.Task] = None
+
+    async def start(self, supabase_client=None):
+        if supabase_client is not None:
+            self.presence.bind(driver_lookup(supabase_client))
+            self._ride_repo = RideRepository(supabase_client)
+        await self.backplane.start(self._on_backplane_envelope)
+        await self.directory.start()
+        if self._maintenance is None:
+            self._maintenance = asyncio.create_task(self._maintain())
+
+    async def stop(self):
+        if self._maintenance is not None:
+            self._maintenance.cancel()
+            try:
+                await self._maintenance
+            except asyncio.CancelledError:
+                pass
+            self._maintenance = None
+        await self.directory.stop()
+        await self.backplane.stop()
+
+    async def _maintain(self):
+        swept_at = time.monotonic()
+        while True:
+            await asyncio.sleep(MAINTENANCE_INTERVAL_SECONDS)
+            self.replay.expire()
+            if time.monotonic() - swept_at >= ROOM_SWEEP_INTERVAL_SECONDS:
+                swept_at = time.monotonic()
+                try:
+                    await self.sweep_orphan_rooms()
+                except Exception as e:
+                    print(f"Error sweeping orphaned ride rooms: {str(e)}")
+
+    async def connect(self, websocket: WebSocket, user_id: str, device_id: Optional[str] = None,
+                      subprotocol: Optional[str] = None) -> str:
+        """Accept a socket for the user, with the negotiated subprotocol if any,
+        and return its connection id"""
+        await websocket.accept(subprotocol=subprotocol)
+        connections = self.active_connections.get(user_id)
+        first = not connections
+        if connections is None:
+            connections = self.active_connections[user_id] = {}
+
+        connection = ClientConnection(user_id, websocket, device_id, subprotocol)
+        connection.writer = asyncio.create_task(self._write_loop(connection))
+        connections[connection.connection_id] = connection
+        if first:
+            self.directory.user_connected(user_id)
+            self.presence.user_connected(user_id)
+            # Back into the rooms of the user's rides in progress
+            for ride_id in self.participant_rooms.get(user_id, ()):
+                self.subscribe_to_ride(user_id, ride_id)
+
+        # A reconnect from the same device supersedes its previous socket (the
+        # new one is registered first, so the user keeps their rooms)
+        if device_id is not None:
+            for previous in [c for c in connections.values() if c.device_id == device_id and c is not connection]:
+                self._supersede(previous)
+        while len(connections) > self.max_connections_per_user:
+            self._supersede(next(iter(connections.values())))
+        return connection.connection_id
+
+    def disconnect(self, user_id: str, connection_id: Optional[str] = None):
+        """Forget one of the user's connections, or all of them without
+        `connection_id`; the user leaves their rooms with the last one"""
+        connections = self.active_connections.get(user_id)
+        if connections is None:
+            return
+
+        if connection_id is None:
+            removed = list(connections.values())
+            connections.clear()
+        else:
+            connection = connections.pop(connection_id, None)
+            removed = [connection] if connection is not None else []
+        for connection in removed:
+            self._stop_writer(connection)
+        if connections:
+            return
+
+        del self.active_connections[user_id]
+        self.directory.user_disconnected(user_id)
+        self.presence.user_disconnected(user_id)
         # Remove from ride connections
-        for ride_id, users in self.ride_connections.items():
-            if user_id in users:
-                users.remove(user_id)
-    
+        for ride_id in self.user_rides.pop(user_id, ()):
+            self._leave_room(ride_id, user_id)
+
     def subscribe_to_ride(self, user_id: str, ride_id: str):
-        if ride_id not in self.ride_connections:
-            self.ride_connections[ride_id] = []
-        if user_id not in self.ride_connections[ride_id]:
-            self.ride_connections[ride_id].append(user_id)
-    
-    async def send_personal_message(self, message: dict, user_id: str):
-        if user_id in self.active_connections:
-            websocket = self.active_connections[user_id]
-            await websocket.send_text(json.dumps({
-                **message,
-                "timestamp": datetime.now().isoformat()
+        self.ride_connections.setdefault(ride_id, set()).add(user_id)
+        self.user_rides.setdefault(user_id, set()).add(ride_id)
+
+    def unsubscribe_from_ride(self, user_id: str, ride_id: str):
+        rides = self.user_rides.get(user_id)
+        if rides is not None:
+            rides.discard(ride_id)
+            if not rides:
+                del self.user_rides[user_id]
+        self._leave_room(ride_id, user_id)
+
+    def share_cache(self, name: str, cache: TTLCache):
+        """Invalidate keys of the worker's `cache` on every other worker too.
+        An invalidation the backplane drops is only as stale as the TTL."""
+        self.shared_caches[name] = cache
+        cache.on_invalidate.append(
+            lambda key: self.backplane.publish({"kind": "cache_invalidate", "cache": name, "key": key})
+        )
+
+    # Ride room lifecycle, driven by RideService
+
+    def open_ride_room(self, ride_id: str, participant_ids: Iterable[str]):
+        """Open the room of a confirmed ride and subscribe its participants,
+        now and whenever they reconnect, on every worker"""
+        participant_ids = list(participant_ids)
+        self._open_room(ride_id, participant_ids)
+        self.backplane.publish({"kind": "room_open", "ride_id": ride_id, "participants": participant_ids})
+
+    async def close_ride_room(self, ride_id: str, message: Optional[dict] = None):
+        """Send the room its final message, if any, then close it everywhere"""
+        envelope = {"kind": "room_close", "ride_id": ride_id}
+        if message is not None:
+            # Carried by the close itself: every worker delivers it to its own
+            # subscribers, including ones that joined before the room opened
+            envelope["frame"] = self.encode_frame(message)
+            self._send_to_room(ride_id, envelope["frame"])
+        self._close_room(ride_id)
+        self.backplane.publish(envelope)
+
+    def _open_room(self, ride_id: str, participant_ids: List[str]):
+        self.rooms_opened += 1
+        self.room_participants[ride_id] = set(participant_ids)
+        for user_id in participant_ids:
+            self.participant_rooms.setdefault(user_id, set()).add(ride_id)
+            if user_id in self.active_connections:
+                self.subscribe_to_ride(user_id, ride_id)
+
+    def _close_room(self, ride_id: str) -> bool:
+        participants = self.room_participants.pop(ride_id, ())
+        for user_id in participants:
+            rooms = self.participant_rooms.get(user_id)
+            if rooms is not None:
+                rooms.discard(ride_id)
+                if not rooms:
+                    del self.participant_rooms[user_id]
+        subscribers = self.ride_connections.pop(ride_id, ())
+        for user_id in subscribers:
+            rides = self.user_rides.get(user_id)
+            if rides is not None:
+                rides.discard(ride_id)
+                if not rides:
+                    del self.user_rides[user_id]
+        if participants or subscribers:
+            self.rooms_closed += 1
+            return True
+        return False
+
+    async def sweep_orphan_rooms(self, batch_size: int = 500) -> int:
+        """Close the rooms here whose ride is no longer live: rooms a client
+        subscribed to on its own, or whose close this worker missed"""
+        if self._ride_repo is None:
+            return 0
+        ride_ids = list(set(self.ride_connections) | set(self.room_participants))
+        swept = 0
+        for start in range(0, len(ride_ids), batch_size):
+            batch = ride_ids[start:start + batch_size]
+            # Database calls are blocking; keep them off the event loop
+            live = set(await asyncio.to_thread(self._ride_repo.get_ride_ids_in_status, batch, LIVE_RIDE_STATUSES))
+            for ride_id in batch:
+                if ride_id not in live and self._close_room(ride_id):
+                    swept += 1
+        self.orphan_rooms_swept += swept
+        return swept
+
+    def _leave_room(self, ride_id: str, user_id: str):
+        room = self.ride_connections.get(ride_id)
+        if room is None:
+            return
+        room.discard(user_id)
+        # Garbage-collect empty rooms
+        if not room:
+            del self.ride_connections[ride_id]
+
+    def _send_to_room(self, ride_id: str, frame: str, binary_frame: Optional[bytes] = None,
+                      coalescible: bool = False):
+        # Snapshot: the slow-consumer policy may change the room while we enqueue
+        for user_id in tuple(self.ride_connections.get(ride_id, ())):
+            self._enqueue(user_id, frame, binary_frame, coalescible)
+
+    def _deliver_routed(self, user_id: str, frame: str, room: Optional[Dict] = None) -> bool:
+        """Deliver a frame routed here by the directory; a room frame only to
+        a user subscribed to the room. False if the user has no socket here"""
+        if room is None:
+            return self._enqueue(user_id, frame)
+        if user_id not in self.active_connections:
+            return False
+        if room["ride_id"] in self.user_rides.get(user_id, ()):
+            binary_frame = base64.b64decode(room["binary"]) if "binary" in room else None
+            self._enqueue(user_id, frame, binary_frame, room.get("coalescible", False))
+        return True
+
+    def _enqueue(self, user_id: str, frame: str, binary_frame: Optional[bytes] = None,
+                 coalescible: bool = False) -> bool:
+        """Queue a frame on every socket of the user without awaiting I/O;
+        sockets on the binary subprotocol get `binary_frame` when there is one.
+        False if the user has no socket here"""
+        connections = self.active_connections.get(user_id)
+        if not connections:
+            return False
+
+        for connection in tuple(connections.values()):
+            self._put(connection, binary_frame if binary_frame is not None and connection.binary else frame,
+                      coalescible)
+        return True
+
+    def _put(self, connection: ClientConnection, frame: Frame, coalescible: bool = False):
+        queue = connection.queue
+        if len(queue) >= self.max_queue:
+            # Only frames a newer one supersedes may be dropped: the newest
+            # location is the most useful one, while a lost personal message or
+            # room event would leave the client out of sync
+            dropping = self.slow_consumer_policy == "drop"
+            oldest = None
+            if dropping:
+                oldest = next((index for index, (_, superseded) in enumerate(queue) if superseded), None)
+            if oldest is None and not (dropping and coalescible):
+                # The client reconnects, then resumes from its last seq
+                self.slow_consumers_closed += 1
+                self._close_connection(connection, SLOW_CONSUMER_CLOSE_CODE)
+                return
+            connection.dropped += 1
+            self.frames_dropped += 1
+            if oldest is None:
+                return
+            del queue[oldest]
+        queue.append((frame, coalescible))
+        connection.ready.set()
+
+    async def _write_loop(self, connection: ClientConnection):
+        queue = connection.queue
+        try:
+            while True:
+                if not queue:
+                    connection.ready.clear()
+                    await connection.ready.wait()
+                    continue
+                frame, _ = queue.popleft()
+                if isinstance(frame, bytes):
+                    await connection.websocket.send_bytes(frame)
+                else:
+                    await connection.websocket.send_text(frame)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            self.send_failures += 1
+            print(f"Error sending to websocket of user {connection.user_id}: {str(e)}")
+            connection.writer = None
+            self.disconnect(connection.user_id, connection.connection_id)
+
+    def _stop_writer(self, connection: ClientConnection):
+        if connection.writer is not None and connection.writer is not asyncio.current_task():
+            connection.writer.cancel()
+        connection.writer = None
+
+    def _supersede(self, connection: ClientConnection):
+        self.superseded_closed += 1
+        self._close_connection(connection, SUPERSEDED_CLOSE_CODE)
+
+    def _close_connection(self, connection: ClientConnection, code: int):
+        """Drop the connection now and close its socket in the background"""
+        self.disconnect(connection.user_id, connection.connection_id)
+
+        async def close():
+            try:
+                await connection.websocket.close(code=code)
+            except Exception:
+                pass
+
+        asyncio.create_task(close())
+
+    @staticmethod
+    def encode_frame(message: dict) -> str:
+        """Serialize a message once; the frame is shared by every recipient"""
+        return dumps({
+            **message,
+            "timestamp": datetime.now().isoformat()
+        }).decode("utf-8")
+
+    async def send_personal_message(self, message: dict, user_id: str, replay: bool = True):
+        """Send to every socket of the user, on any worker. With `replay`, the
+        message gets a sequence number and stays replayable after a reconnect;
+        replies to the user's own requests are sent without"""
+        if not replay:
+            frame = self.encode_frame(message)
+            if not self._enqueue(user_id, frame):
+                # Not connected here: another worker may hold the socket
+                self.directory.route([user_id], frame)
+            return
+
+        # Sequenced by the user's directory owner, which keeps the buffer
+        owner = self.directory.ring.owner(user_id)
+        if owner == self.directory.worker_id:
+            self._send_sequenced(user_id, message)
+        else:
+            # `frame` (unsequenced) is what gets delivered if the owner is gone
+            self.backplane.publish({
+                "kind": "personal", "user": user_id, "message": message, "frame": self.encode_frame(message)
+            }, to=owner)
+
+    def _send_sequenced(self, user_id: str, message: dict):
+        frame = self.replay.record(user_id, lambda seq: self.encode_frame({**message, "seq": seq}))
+        if not self._enqueue(user_id, frame):
+            self.directory.route([user_id], frame)
+
+    async def resume(self, user_id: str, connection_id: str, last_seq: int):
+        """Replay to one of the user's sockets the personal messages after
+        `last_seq`, then tell it whether anything could not be replayed"""
+        self.resumes += 1
+        owner = self.directory.ring.owner(user_id)
+        if owner == self.directory.worker_id:
+            self._deliver_replay(user_id, connection_id, self.replay.since(user_id, last_seq))
+        else:
+            self.backplane.publish({
+                "kind": "resume", "user": user_id, "connection": connection_id,
+                "last_seq": last_seq, "holder": self.directory.worker_id
+            }, to=owner)
+
+    def _deliver_replay(self, user_id: str, connection_id: str, frames: Optional[List[str]]):
+        connection = self.active_connections.get(user_id, {}).get(connection_id)
+        if connection is None:
+            return
+        if frames is None:
+            self.resyncs += 1
+            self._put(connection, self.encode_frame({
+                "type": "resync_required",
+                "message": "Some messages could not be replayed; fetch the current state"
             }))
-    
-    async def send_ride_update(self, ride_id: str, message: dict):
-        if ride_id in self.ride_connections:
-            for user_id in self.ride_connections[ride_id]:
-                await self.send_personal_message(message, user_id)
-    
+            return
+        for frame in frames:
+            self._put(connection, frame)
+        self.frames_replayed += len(frames)
+        self._put(connection, self.encode_frame({"type": "resumed", "data": {"replayed": len(frames)}}))
+
+    async def send_ride_update(self, ride_id: str, message: dict, binary_frame: Optional[bytes] = None,
+                               coalescible: bool = False):
+        """Send to the ride room's subscribers, here and on the workers holding
+        its participants; `binary_frame` is the same update for sockets on the
+        binary subprotocol. A `coalescible` update is superseded by the next
+        one, so a slow consumer's queue may drop it."""
+        frame = self.encode_frame(message)
+        self._send_to_room(ride_id, frame, binary_frame, coalescible)
+        # Participants connected elsewhere are routed to through their
+        # directory owner, like personal messages, not broadcast to every worker
+        remote = [user_id for user_id in self.room_participants.get(ride_id, ())
+                  if user_id not in self.active_connections]
+        if remote:
+            room = {"ride_id": ride_id}
+            if binary_frame is not None:
+                room["binary"] = base64.b64encode(binary_frame).decode("ascii")
+            if coalescible:
+                room["coalescible"] = True
+            self.directory.route(remote, frame, room)
+
     async def broadcast_to_drivers(self, message: dict, driver_ids: List[str]):
-        for driver_id in driver_ids:
-            await self.send_personal_message(message, driver_id)
+        if not driver_ids:
+            return
+        frame = self.encode_frame(message)
+        remote = [driver_id for driver_id in driver_ids if not self._enqueue(driver_id, frame)]
+        if remote:
+            self.directory.route(remote, frame)
+
+    def _on_backplane_envelope(self, envelope: Dict):
+        """Deliver an envelope from another worker to the sockets held here"""
+        kind = envelope["kind"]
+        if kind == "users":
+            frame, room = envelope["frame"], envelope.get("room")
+            for user_id in envelope["targets"]:
+                self._deliver_routed(user_id, frame, room)
+        elif kind == "driver":
+            self.presence.handle(envelope)
+        elif kind == "room_open":
+            self._open_room(envelope["ride_id"], envelope["participants"])
+        elif kind == "room_close":
+            if "frame" in envelope:
+                self._send_to_room(envelope["ride_id"], envelope["frame"])
+            self._close_room(envelope["ride_id"])
+        elif kind == "personal":
+            self._send_sequenced(envelope["user"], envelope["message"])
+        elif kind == "resume":
+            # We own the user: answer the holder with what they missed
+            self.backplane.publish({
+                "kind": "replay", "user": envelope["user"], "connection": envelope["connection"],
+                "frames": self.replay.since(envelope["user"], envelope["last_seq"])
+            }, to=envelope["holder"])
+        elif kind == "replay":
+            self._deliver_replay(envelope["user"], envelope["connection"], envelope["frames"])
+        elif kind == "cache_invalidate":
+            cache = self.shared_caches.get(envelope["cache"])
+            if cache is not None:
+                key = envelope["key"]
+                # Tuple keys arrive as JSON arrays
+                cache.invalidate_local(tuple(key) if isinstance(key, list) else key)
+        else:
+            self.directory.handle(envelope)
+
+    def room_stats(self) -> Dict:
+        """Ride room counts and the approximate memory held by their indexes"""
+        containers = (self.ride_connections, self.user_rides, self.room_participants, self.participant_rooms)
+        approx_bytes = sum(
+            sys.getsizeof(index) + sum(sys.getsizeof(members) for members in index.values())
+            for index in containers
+        )
+        return {
+            "rooms": len(self.ride_connections),
+            "open_rooms": len(self.room_participants),
+            "subscriptions": sum(len(rides) for rides in self.user_rides.values()),
+            "rooms_opened": self.rooms_opened,
+            "rooms_closed": self.rooms_closed,
+            "orphan_rooms_swept": self.orphan_rooms_swept,
+            "approx_bytes": approx_bytes
+        }
+
+    def stats(self) -> Dict:
+        connections = [
+            connection
+            for user_connections in self.active_connections.values()
+            for connection in user_connections.values()
+        ]
+        depths = [len(connection.queue) for connection in connections]
+        return {
+            "users": len(self.active_connections),
+            "connections": len(connections),
+            "binary_connections": sum(1 for connection in connections if connection.binary),
+            "ride_rooms": len(self.ride_connections),
+            "subscriptions": sum(len(rides) for rides in self.user_rides.values()),
+            "send_queue_capacity": self.max_queue,
+            "queued_frames": sum(depths),
+            "max_queue_depth": max(depths, default=0),
+            "slow_consumer_policy": self.slow_consumer_policy,
+            "frames_dropped": self.frames_dropped,
+            "slow_consumers_closed": self.slow_consumers_closed,
+            "superseded_closed": self.superseded_closed,
+            "send_failures": self.send_failures,
+            "backplane": self.backplane.stats(),
+            "cluster": self.directory.stats(),
+            "drivers": self.presence.stats(),
+            "replay": {
+                **self.replay.stats(),
+                "resumes": self.resumes,
+                "resyncs": self.resyncs,
+                "frames_replayed": self.frames_replayed
+            }
+        }
 
 # Global connection manager instance
-connection_manager = ConnectionManager()
\ No newline at end of file
+connection_manager = ConnectionManager()
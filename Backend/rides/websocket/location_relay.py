@@ -0,0 +1,161 @@
+from typing import Dict, Optional, Tuple
+import asyncio
+import os
+import time
+
+from ..repositories.ride_repository import RideRepository
+from .connection_manager import connection_manager
+from .protocol import encode_driver_location
+
+LOCATION_RELAY_INTERVAL_SECONDS = float(os.getenv("WS_LOCATION_RELAY_INTERVAL_SECONDS", "2"))
+# How long a worker trusts what it read about an ongoing ride before re-reading it
+LOCATION_AUTH_TTL_SECONDS = float(os.getenv("WS_LOCATION_AUTH_TTL_SECONDS", "60"))
+# Same for rides in any other state, which are about to change or never will
+LOCATION_AUTH_DENIED_TTL_SECONDS = 5.0
+# Ride rooms may be joined by the ride's rider and driver while it is in progress
+SUBSCRIBABLE_STATUSES = ("pending", "confirmed", "ongoing")
+
+# Rider, driver and status of a ride as last read
+RideParties = Tuple[Optional[str], Optional[str], Optional[str]]
+
+class LocationRelay:
+    """Relays drivers' location pings to their ride room, coalesced per interval.
+
+    A ping only overwrites the latest pending position for its (ride, driver);
+    every `interval_seconds` the pending positions are sent to the ride rooms
+    and cleared. Outbound traffic is therefore at most one update per driver
+    per interval, however often drivers ping. Pings are accepted only from the
+    driver of an ongoing ride, and only the ride's rider and driver may join
+    its room to receive them; what those checks need is cached per ride so
+    steady pinging costs a dictionary lookup, not a query.
+    """
+
+    def __init__(self, interval_seconds: float = LOCATION_RELAY_INTERVAL_SECONDS,
+                 authorization_ttl_seconds: float = LOCATION_AUTH_TTL_SECONDS):
+        self.interval_seconds = interval_seconds
+        self.authorization_ttl_seconds = authorization_ttl_seconds
+        self.ride_repo: Optional[RideRepository] = None
+        # (ride_id, driver_id) -> latest position not yet relayed
+        self._latest: Dict[Tuple[str, str], Dict] = {}
+        # ride_id -> (rider, driver, status, expiry on the monotonic clock)
+        self._authorized: Dict[str, Tuple[Optional[str], Optional[str], Optional[str], float]] = {}
+        self._task: Optional[asyncio.Task] = None
+        self.pings_received = 0
+        self.pings_coalesced = 0
+        self.pings_rejected = 0
+        self.updates_sent = 0
+
+    def start(self, supabase_client):
+        self.ride_repo = RideRepository(supabase_client)
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    async def submit(self, driver_id: str, data: Dict) -> bool:
+        """Record a driver's ping; False if it was rejected"""
+        self.pings_received += 1
+        try:
+            ride_id = str(data["ride_id"])
+            position = {
+                "ride_id": ride_id,
+                "driver_id": driver_id,
+                "latitude": float(data["latitude"]),
+                "longitude": float(data["longitude"])
+            }
+        except (KeyError, TypeError, ValueError):
+            self.pings_rejected += 1
+            return False
+        for optional in ("heading", "speed", "recorded_at"):
+            if data.get(optional) is not None:
+                position[optional] = data[optional]
+
+        if not await self._authorize(ride_id, driver_id):
+            self.pings_rejected += 1
+            return False
+
+        key = (ride_id, driver_id)
+        if key in self._latest:
+            self.pings_coalesced += 1
+        # Overwrite in place: only the newest position is ever relayed
+        self._latest[key] = position
+        return True
+
+    def end_ride(self, ride_id: str):
+        """Stop relaying for a ride that completed or was cancelled"""
+        self._authorized.pop(ride_id, None)
+        for key in [key for key in self._latest if key[0] == ride_id]:
+            del self._latest[key]
+
+    async def may_subscribe(self, ride_id: str, user_id: str) -> bool:
+        """Whether `user_id` may join the room of `ride_id`: its rider or driver,
+        while the ride is in progress"""
+        rider_id, driver_id, status = await self._ride_parties(str(ride_id))
+        return status in SUBSCRIBABLE_STATUSES and user_id in (rider_id, driver_id)
+
+    async def _authorize(self, ride_id: str, driver_id: str) -> bool:
+        _, ride_driver_id, status = await self._ride_parties(ride_id)
+        return status == "ongoing" and ride_driver_id == driver_id
+
+    async def _ride_parties(self, ride_id: str) -> RideParties:
+        now = time.monotonic()
+        cached = self._authorized.get(ride_id)
+        if cached is not None and cached[3] > now:
+            return cached[:3]
+        if self.ride_repo is None:
+            return (None, None, None)
+
+        try:
+            ride = await asyncio.to_thread(self.ride_repo.get_ride_by_id, ride_id)
+        except Exception as e:
+            print(f"Error checking ride {ride_id} for location relay: {str(e)}")
+            return (None, None, None)
+
+        if ride is None:
+            parties: RideParties = (None, None, None)
+        else:
+            parties = (ride.user_id, ride.driver_id, ride.status)
+        ttl = self.authorization_ttl_seconds if parties[2] == "ongoing" else LOCATION_AUTH_DENIED_TTL_SECONDS
+        self._authorized[ride_id] = (*parties, now + ttl)
+        return parties
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval_seconds)
+            # Forget expired ride checks, including those made for subscriptions
+            # while nobody pings, so finished rides do not accumulate
+            now = time.monotonic()
+            for ride_id in [ride_id for ride_id, (*_, expires) in self._authorized.items() if expires <= now]:
+                del self._authorized[ride_id]
+
+            if not self._latest:
+                continue
+            pending, self._latest = self._latest, {}
+            for (ride_id, _), position in pending.items():
+                await connection_manager.send_ride_update(ride_id, {
+                    "type": "driver_location",
+                    "data": position
+                }, encode_driver_location(position), coalescible=True)
+            self.updates_sent += len(pending)
+
+    def stats(self) -> Dict:
+        return {
+            "interval_seconds": self.interval_seconds,
+            "pending_positions": len(self._latest),
+            "tracked_rides": len(self._authorized),
+            "pings_received": self.pings_received,
+            "pings_coalesced": self.pings_coalesced,
+            "pings_rejected": self.pings_rejected,
+            "updates_sent": self.updates_sent
+        }
+
+# Global relay; started from the application's startup hook
+location_relay = LocationRelay()
@@ -0,0 +1,208 @@
+from typing import Callable, Dict, Iterator, Optional, Set
+import asyncio
+import os
+import time
+
+from shared.grid_index import Cell, GridIndex
+from users.service import UserService
+from ..repositories.ride_repository import RideRepository
+from .backplane import Backplane
+
+ONLINE = "online"
+BUSY = "busy"
+OFFLINE = "offline"
+
+# Side of a driver location grid cell; ~1.1 km north-south at the default
+DRIVER_GRID_CELL_DEGREES = float(os.getenv("DRIVER_GRID_CELL_DEGREES", "0.01"))
+
+def driver_lookup(supabase_client) -> Callable[[str], Optional[bool]]:
+    """Lookup for DriverPresence.bind: None for users who are not drivers,
+    else whether the driver has an active ride"""
+    user_service = UserService(supabase_client)
+    ride_repo = RideRepository(supabase_client)
+
+    def lookup(user_id: str) -> Optional[bool]:
+        if not user_service.verify_user_role(user_id, "driver"):
+            return None
+        return ride_repo.driver_has_active_ride(user_id)
+
+    return lookup
+
+class DriverPresence:
+    """Which drivers are connected and whether they are on a ride, kept in
+    memory on every worker so "available drivers" is a set lookup.
+
+    A user's role (and whether a driver already has an active ride) is read
+    once, when their first socket connects to a worker; after that, ride state
+    changes mark drivers busy or free. Changes are published on the backplane
+    and applied by every worker, and a joining worker is sent the drivers the
+    others hold, so each worker sees the drivers of the whole cluster. Busy
+    states carry the time they were true as of, so a lookup that read the
+    database before a ride ended cannot undo the change that followed it.
+
+    Connected drivers' last reported positions are kept in a grid index at
+    cell granularity; a move is only published when it crosses into another
+    cell, not on every ping.
+    """
+
+    def __init__(self, backplane: Backplane, is_connected: Callable[[str], bool],
+                 cell_degrees: float = DRIVER_GRID_CELL_DEGREES, clock: Callable[[], float] = time.time):
+        self.backplane = backplane
+        self.worker_id = backplane.worker_id
+        self.is_connected = is_connected
+        # Wall clock shared by the workers, for the as_of of busy states
+        self._clock = clock
+        # Connected driver -> workers holding one of their sockets
+        self.holders: Dict[str, Set[str]] = {}
+        # Drivers with a confirmed or ongoing ride, connected or not
+        self.busy: Set[str] = set()
+        # Driver -> wall-clock time of the busy state last applied
+        self._busy_as_of: Dict[str, float] = {}
+        # Connected and not busy: the recipients of new ride requests
+        self.available: Set[str] = set()
+        # Connected drivers that reported a position -> grid cell
+        self.cells = GridIndex(cell_degrees)
+        # (user_id) -> None for non-drivers, else whether the driver is on a ride
+        self._lookup: Optional[Callable[[str], Optional[bool]]] = None
+        self._pending: Dict[str, asyncio.Task] = {}
+        self.lookups = 0
+
+    def bind(self, lookup: Callable[[str], Optional[bool]]):
+        self._lookup = lookup
+
+    def status(self, driver_id: str) -> str:
+        if driver_id not in self.holders:
+            return OFFLINE
+        return BUSY if driver_id in self.busy else ONLINE
+
+    def available_within(self, center: Cell, rows: int, columns: int) -> Iterator[str]:
+        """Available drivers within `rows` x `columns` grid cells of `center`, nearest first"""
+        return (driver_id for driver_id in self.cells.within(center, rows, columns) if driver_id in self.available)
+
+    # Local sockets
+
+    def user_connected(self, user_id: str):
+        """Called on a user's first socket here; drivers are registered once
+        their role has been looked up"""
+        if self._lookup is not None and user_id not in self._pending:
+            self._pending[user_id] = asyncio.create_task(self._identify(user_id))
+
+    def user_disconnected(self, user_id: str):
+        """Called when a user's last socket here closes"""
+        task = self._pending.pop(user_id, None)
+        if task is not None:
+            task.cancel()
+        if self.worker_id in self.holders.get(user_id, ()):
+            self._down(user_id, self.worker_id)
+            self.backplane.publish({"kind": "driver", "op": "down", "driver": user_id, "holder": self.worker_id})
+
+    async def _identify(self, user_id: str):
+        # The lookup reflects the database no later than when it started
+        as_of = self._clock()
+        try:
+            self.lookups += 1
+            busy = await asyncio.to_thread(self._lookup, user_id)
+        except Exception as e:
+            print(f"Error looking up websocket user {user_id} for driver presence: {str(e)}")
+            return
+        finally:
+            if self._pending.get(user_id) is asyncio.current_task():
+                del self._pending[user_id]
+
+        # Not a driver, or gone while we were looking
+        if busy is None or not self.is_connected(user_id):
+            return
+        self._up(user_id, self.worker_id, busy, as_of)
+        self.backplane.publish({
+            "kind": "driver", "op": "up", "driver": user_id, "holder": self.worker_id,
+            "busy": busy, "as_of": as_of
+        })
+
+    def update_position(self, driver_id: str, latitude: float, longitude: float):
+        """Record a position reported by a driver connected to this worker"""
+        if self.worker_id not in self.holders.get(driver_id, ()):
+            return
+        cell = self.cells.cell_of(latitude, longitude)
+        if self.cells.place(driver_id, cell):
+            self.backplane.publish({"kind": "driver", "op": "cell", "driver": driver_id, "cell": list(cell)})
+
+    # Ride state changes, from any worker
+
+    def set_busy(self, driver_id: str, busy: bool):
+        as_of = self._clock()
+        self._set_busy(driver_id, busy, as_of)
+        self.backplane.publish({"kind": "driver", "op": "busy", "driver": driver_id, "busy": busy, "as_of": as_of})
+
+    # Envelopes from other workers
+
+    def handle(self, envelope: Dict):
+        driver_id, op = envelope["driver"], envelope["op"]
+        if op == "up":
+            self._up(driver_id, envelope["holder"], envelope["busy"], envelope.get("as_of", 0.0))
+            if envelope.get("cell") is not None:
+                self.cells.place(driver_id, tuple(envelope["cell"]))
+        elif op == "down":
+            self._down(driver_id, envelope["holder"])
+        elif op == "busy":
+            self._set_busy(driver_id, envelope["busy"], envelope.get("as_of", 0.0))
+        elif op == "cell":
+            if driver_id in self.holders:
+                self.cells.place(driver_id, tuple(envelope["cell"]))
+
+    def worker_joined(self, worker: str):
+        """Send a new worker the drivers connected here"""
+        for driver_id, holders in self.holders.items():
+            if self.worker_id in holders:
+                cell = self.cells.cell(driver_id)
+                self.backplane.publish({
+                    "kind": "driver", "op": "up", "driver": driver_id, "holder": self.worker_id,
+                    "busy": driver_id in self.busy, "as_of": self._busy_as_of.get(driver_id, 0.0),
+                    "cell": list(cell) if cell is not None else None
+                }, to=worker)
+
+    def worker_left(self, worker: str):
+        for driver_id in [driver_id for driver_id, holders in self.holders.items() if worker in holders]:
+            self._down(driver_id, worker)
+
+    # State
+
+    def _up(self, driver_id: str, holder: str, busy: bool, as_of: float):
+        self.holders.setdefault(driver_id, set()).add(holder)
+        self._set_busy(driver_id, busy, as_of)
+
+    def _down(self, driver_id: str, holder: str):
+        holders = self.holders.get(driver_id)
+        if holders is None:
+            return
+        holders.discard(holder)
+        if not holders:
+            del self.holders[driver_id]
+            self.cells.remove(driver_id)
+        self._refresh(driver_id)
+
+    def _set_busy(self, driver_id: str, busy: bool, as_of: float):
+        # A state older than the one applied (a lookup that read the database
+        # before a ride state change) is stale
+        if as_of >= self._busy_as_of.get(driver_id, 0.0):
+            self._busy_as_of[driver_id] = as_of
+            if busy:
+                self.busy.add(driver_id)
+            else:
+                self.busy.discard(driver_id)
+        self._refresh(driver_id)
+
+    def _refresh(self, driver_id: str):
+        if driver_id in self.holders and driver_id not in self.busy:
+            self.available.add(driver_id)
+        else:
+            self.available.discard(driver_id)
+
+    def stats(self) -> Dict:
+        return {
+            "drivers_connected": len(self.holders),
+            "drivers_available": len(self.available),
+            "drivers_busy": len(self.busy),
+            "pending_lookups": len(self._pending),
+            "lookups": self.lookups,
+            "location_grid": self.cells.stats()
+        }
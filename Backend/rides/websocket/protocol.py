@@ -0,0 +1,85 @@
+from functools import lru_cache
+from typing import Dict, List, Optional
+import math
+import struct
+import uuid
+
+# Opt-in binary subprotocol, requested in the handshake's Sec-WebSocket-Protocol
+# header. Without it (the default) every frame is JSON text. With it, location
+# frames travel as the fixed-layout binary frames below; everything else stays
+# JSON text on the same socket.
+BINARY_SUBPROTOCOL = "bhaijaben.binary.v1"
+
+# Binary frames start with a one-byte message type; numbers are big-endian,
+# ids are raw 16-byte UUIDs, a NaN heading/speed means "not reported" and
+# recorded_at is Unix epoch milliseconds (0 when not reported). A location
+# update with an all-zero ride_id is a waiting driver's position, not a ride's
+MSG_LOCATION_UPDATE = 1  # client -> server
+MSG_DRIVER_LOCATION = 2  # server -> ride room
+
+# type, ride_id, latitude, longitude, heading, speed, recorded_at
+_LOCATION_UPDATE = struct.Struct(">B16sddffQ")
+# type, ride_id, driver_id, latitude, longitude, heading, speed, recorded_at
+_DRIVER_LOCATION = struct.Struct(">B16s16sddffQ")
+
+_NAN = float("nan")
+_NO_RIDE = bytes(16)
+
+# A driver pings about one ride for its whole duration: formatting the same
+# 16 bytes as a UUID string every second would dominate decoding
+@lru_cache(maxsize=4096)
+def _uuid_str(raw: bytes) -> str:
+    return str(uuid.UUID(bytes=raw))
+
+@lru_cache(maxsize=4096)
+def _uuid_bytes(value: str) -> bytes:
+    return uuid.UUID(value).bytes
+
+def negotiate_subprotocol(requested: List[str]) -> Optional[str]:
+    """The subprotocol to accept the handshake with, or None for JSON"""
+    return BINARY_SUBPROTOCOL if BINARY_SUBPROTOCOL in requested else None
+
+def decode_binary_message(frame: bytes) -> Dict:
+    """Decode a client's binary frame into the same message dict as its JSON
+    form, so both protocols share one dispatch; ValueError if malformed"""
+    if not frame or frame[0] != MSG_LOCATION_UPDATE or len(frame) != _LOCATION_UPDATE.size:
+        raise ValueError("Unsupported binary websocket frame")
+    _, ride_id, latitude, longitude, heading, speed, recorded_at = _LOCATION_UPDATE.unpack(frame)
+    data = {
+        "ride_id": _uuid_str(ride_id) if ride_id != _NO_RIDE else None,
+        "latitude": latitude,
+        "longitude": longitude
+    }
+    if not math.isnan(heading):
+        data["heading"] = heading
+    if not math.isnan(speed):
+        data["speed"] = speed
+    if recorded_at:
+        data["recorded_at"] = recorded_at
+    return {"type": "location_update", "data": data}
+
+def encode_location_update(ride_id: Optional[str], latitude: float, longitude: float, heading: Optional[float] = None,
+                           speed: Optional[float] = None, recorded_at: int = 0) -> bytes:
+    """Client-side encoding of a location ping (used by tools and benchmarks)"""
+    return _LOCATION_UPDATE.pack(
+        MSG_LOCATION_UPDATE, _uuid_bytes(ride_id) if ride_id else _NO_RIDE, latitude, longitude,
+        _NAN if heading is None else heading, _NAN if speed is None else speed, recorded_at
+    )
+
+def encode_driver_location(position: Dict) -> Optional[bytes]:
+    """Binary form of a relayed driver position, or None when it cannot be
+    represented (non-UUID ids, non-numeric fields): those are sent as JSON"""
+    try:
+        recorded_at = position.get("recorded_at") or 0
+        return _DRIVER_LOCATION.pack(
+            MSG_DRIVER_LOCATION,
+            _uuid_bytes(position["ride_id"]),
+            _uuid_bytes(position["driver_id"]),
+            position["latitude"],
+            position["longitude"],
+            float(position.get("heading", _NAN)),
+            float(position.get("speed", _NAN)),
+            int(recorded_at)
+        )
+    except (KeyError, TypeError, ValueError, struct.error):
+        return None
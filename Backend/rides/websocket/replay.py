@@ -0,0 +1,98 @@
+from collections import deque
+from typing import Callable, Deque, Dict, List, Optional, Tuple
+import os
+import time
+
+# Personal messages kept per user for replay after a reconnect
+REPLAY_BUFFER_SIZE = int(os.getenv("WS_REPLAY_BUFFER_SIZE", "64"))
+# How long a message stays replayable
+REPLAY_TTL_SECONDS = float(os.getenv("WS_REPLAY_TTL_SECONDS", "300"))
+
+class _Buffer:
+    __slots__ = ("frames", "last_seq", "dropped_through")
+
+    def __init__(self, size: int, dropped_through: int):
+        self.frames: Deque[Tuple[int, str]] = deque(maxlen=size)
+        self.last_seq = 0
+        # Highest sequence number no longer replayable from this buffer
+        self.dropped_through = dropped_through
+
+class ReplayStore:
+    """Bounded per-user ring buffers of recent personal messages.
+
+    Sequence numbers increase per user and are Unix epoch milliseconds (bumped
+    by one when two messages share a millisecond), so they stay monotonic when
+    a buffer is recreated after expiring and tell how old a client's last
+    message is. A client resuming after `last_seq` gets the frames it missed,
+    or None when some may have been dropped (buffer overflow or expiry) or
+    sequenced by another store (before this one started, or before the last
+    change of which worker owns which users), in which case it must fetch
+    the current state instead.
+    """
+
+    def __init__(self, size: int = REPLAY_BUFFER_SIZE, ttl_seconds: float = REPLAY_TTL_SECONDS,
+                 clock: Callable[[], float] = time.time):
+        self.size = size
+        self.ttl_ms = int(ttl_seconds * 1000)
+        self._clock = clock
+        self._buffers: Dict[str, _Buffer] = {}
+        # Messages sequenced before this may have been recorded by another worker
+        self.owned_since_ms = self._now_ms()
+
+    def _now_ms(self) -> int:
+        return int(self._clock() * 1000)
+
+    def record(self, user_id: str, encode: Callable[[int], str]) -> str:
+        """Assign the user's next sequence number, encode the frame with it and
+        keep it for replay"""
+        now = self._now_ms()
+        buffer = self._buffers.get(user_id)
+        if buffer is None:
+            # Anything this user was sent before is older than the TTL
+            buffer = self._buffers[user_id] = _Buffer(self.size, now - self.ttl_ms)
+        seq = max(now, buffer.last_seq + 1)
+        frame = encode(seq)
+        if len(buffer.frames) == buffer.frames.maxlen:
+            buffer.dropped_through = buffer.frames[0][0]
+        buffer.frames.append((seq, frame))
+        buffer.last_seq = seq
+        return frame
+
+    def ownership_changed(self):
+        """Users may have moved here from another worker's store: only what is
+        sequenced from now on is known to be complete"""
+        self.owned_since_ms = self._now_ms()
+
+    def since(self, user_id: str, last_seq: int) -> Optional[List[str]]:
+        """Frames after `last_seq`, oldest first; None if some were dropped"""
+        if last_seq < self.owned_since_ms:
+            return None
+        buffer = self._buffers.get(user_id)
+        if buffer is None:
+            # Nothing sent within the TTL: a client that saw anything since then
+            # missed nothing
+            return [] if last_seq >= self._now_ms() - self.ttl_ms else None
+        if last_seq < buffer.dropped_through:
+            return None
+        return [frame for seq, frame in buffer.frames if seq > last_seq]
+
+    def expire(self):
+        """Drop messages older than the TTL, and buffers left empty"""
+        cutoff = self._now_ms() - self.ttl_ms
+        for user_id in list(self._buffers):
+            buffer = self._buffers[user_id]
+            frames = buffer.frames
+            while frames and frames[0][0] < cutoff:
+                buffer.dropped_through = frames.popleft()[0]
+            if not frames:
+                del self._buffers[user_id]
+
+    def stats(self) -> Dict:
+        frames = [frame for buffer in self._buffers.values() for _, frame in buffer.frames]
+        return {
+            "buffers": len(self._buffers),
+            "buffered_frames": len(frames),
+            "buffered_bytes": sum(len(frame) for frame in frames),
+            "buffer_size": self.size,
+            "ttl_seconds": self.ttl_ms / 1000
+        }
@@ -1,33 +1,92 @@
 from fastapi import APIRouter, WebSocket, WebSocketDisconnect, Depends
 from .connection_manager import connection_manager
+from .location_relay import location_relay
+from .protocol import decode_binary_message, negotiate_subprotocol
 from auth.services.login_service import LoginService
 import json
+from typing import Optional
 
 router = APIRouter()
 
+def parse_frame(frame: dict) -> Optional[dict]:
+    """Message from a received frame: JSON text, or a binary location frame on
+    the binary subprotocol; None for a malformed binary frame"""
+    if frame.get("bytes") is not None:
+        try:
+            return decode_binary_message(frame["bytes"])
+        except ValueError:
+            return None
+    return json.loads(frame["text"])
+
+async def handle_message(user_id: str, message: dict, connection_id: Optional[str] = None):
+    # Handle different message types
+    if message["type"] == "resume":
+        # Sent after reconnecting: replay what was missed after the last seq seen
+        await connection_manager.resume(user_id, connection_id, int(message["data"]["last_seq"]))
+    
+    elif message["type"] == "subscribe_ride":
+        ride_id = message["data"]["ride_id"]
+        # Rooms carry the driver's live location: only the ride's own rider and driver may join
+        if not await location_relay.may_subscribe(ride_id, user_id):
+            await connection_manager.send_personal_message({
+                "type": "subscribe_rejected",
+                "message": f"Not a participant of ride {ride_id}"
+            }, user_id, replay=False)
+            return
+        connection_manager.subscribe_to_ride(user_id, ride_id)
+        await connection_manager.send_personal_message({
+            "type": "subscribed",
+            "message": f"Subscribed to ride {ride_id}"
+        }, user_id, replay=False)
+    
+    elif message["type"] == "unsubscribe_ride":
+        ride_id = message["data"]["ride_id"]
+        connection_manager.unsubscribe_from_ride(user_id, ride_id)
+        await connection_manager.send_personal_message({
+            "type": "unsubscribed",
+            "message": f"Unsubscribed from ride {ride_id}"
+        }, user_id, replay=False)
+    
+    elif message["type"] == "location_update":
+        data = message["data"]
+        if data.get("ride_id") is None:
+            # Drivers waiting for a ride report where they are, for ride request targeting
+            try:
+                connection_manager.presence.update_position(user_id, float(data["latitude"]), float(data["longitude"]))
+            except (KeyError, TypeError, ValueError):
+                pass
+        # Relayed to the ride room, coalesced to the latest position per interval
+        elif not await location_relay.submit(user_id, data):
+            await connection_manager.send_personal_message({
+                "type": "location_rejected",
+                "message": "Location updates are accepted only for your ongoing ride"
+            }, user_id, replay=False)
+
 @router.websocket("/ws/{user_id}")
 async def websocket_endpoint(websocket: WebSocket, user_id: str):
-    await connection_manager.connect(websocket, user_id)
+    # Clients send a stable device_id so a reconnect replaces its own stale socket
+    connection_id = await connection_manager.connect(
+        websocket, user_id, websocket.query_params.get("device_id"),
+        negotiate_subprotocol(websocket.scope.get("subprotocols", []))
+    )
     try:
         while True:
-            data = await websocket.receive_text()
-            message = json.loads(data)
-            
-            # Handle different message types
-            if message["type"] == "subscribe_ride":
-                ride_id = message["data"]["ride_id"]
-                connection_manager.subscribe_to_ride(user_id, ride_id)
-                await websocket.send_text(json.dumps({
-                    "type": "subscribed",
-                    "message": f"Subscribed to ride {ride_id}"
-                }))
-            
-            elif message["type"] == "location_update":
-                # Handle driver location updates
+            frame = await websocket.receive()
+            if frame["type"] == "websocket.disconnect":
+                raise WebSocketDisconnect(frame.get("code", 1000))
+            try:
+                message = parse_frame(frame)
+                if message is not None:
+                    await handle_message(user_id, message, connection_id)
+            except (KeyError, TypeError, ValueError):
+                # A malformed message is answered, not a reason to drop the socket
                 await connection_manager.send_personal_message({
-                    "type": "driver_location",
-                    "data": message["data"]
-                }, user_id)
+                    "type": "error",
+                    "message": "Malformed message"
+                }, user_id, replay=False)
                 
     except WebSocketDisconnect:
-        connection_manager.disconnect(user_id)
\ No newline at end of file
+        pass
+    finally:
+        # Whatever ends the loop, the connection's writer and entries go with it
+        connection_manager.disconnect(user_id, connection_id)
\ No newline at end of file
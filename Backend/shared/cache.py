@@ -0,0 +1,117 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, List, Optional
+
+class TTLCache:
+    """Thread-safe LRU cache whose entries also expire after `ttl_seconds`.
+
+    A read-through load that an invalidation overtakes is returned but not
+    stored: each key being loaded has a generation, bumped by `invalidate`,
+    and a load stores its value only if the generation it started with is
+    still current. `on_invalidate` listeners see every key invalidated here
+    (not those invalidated with `invalidate_local`), so they can invalidate it
+    in other processes too.
+
+    Counts hits, misses, evictions and invalidations so callers can expose
+    them as metrics.
+    """
+
+    def __init__(self, max_entries: int = 1024, ttl_seconds: float = 60.0,
+                 clock: Callable[[], float] = time.monotonic):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._clock = clock
+        self._entries: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        # Keys being loaded -> (generation, loads in flight)
+        self._loading: Dict[Hashable, List[int]] = {}
+        self.on_invalidate: List[Callable[[Hashable], None]] = []
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        now = self._clock()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            value, expires_at = entry
+            if expires_at <= now:
+                del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key: Hashable, value: Any):
+        with self._lock:
+            self._store(key, value)
+
+    def _store(self, key: Hashable, value: Any):
+        self._entries[key] = (value, self._clock() + self.ttl_seconds)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def get_or_load(self, key: Hashable, loader: Callable[[], Any]) -> Any:
+        """Read-through: return the cached value or load, store and return it"""
+        value = self.get(key)
+        if value is not None:
+            return value
+
+        with self._lock:
+            loading = self._loading.setdefault(key, [0, 0])
+            loading[1] += 1
+            generation = loading[0]
+        try:
+            value = loader()
+            with self._lock:
+                # Invalidated while loading: the value may predate the change
+                if loading[0] == generation:
+                    self._store(key, value)
+        finally:
+            with self._lock:
+                loading[1] -= 1
+                if not loading[1]:
+                    del self._loading[key]
+        return value
+
+    def invalidate(self, key: Hashable):
+        self.invalidate_local(key)
+        for listener in self.on_invalidate:
+            listener(key)
+
+    def invalidate_local(self, key: Hashable):
+        """Invalidate the key in this cache only"""
+        with self._lock:
+            loading = self._loading.get(key)
+            if loading is not None:
+                loading[0] += 1
+            if self._entries.pop(key, None) is not None:
+                self.invalidations += 1
+
+    def clear(self):
+        with self._lock:
+            for loading in self._loading.values():
+                loading[0] += 1
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl_seconds,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations
+            }
@@ -0,0 +1,102 @@
+import math
+from typing import Dict, Hashable, Iterator, Optional, Set, Tuple
+
+Cell = Tuple[int, int]
+
+KM_PER_DEGREE = 111.32
+
+class GridIndex:
+    """Uniform latitude/longitude grid mapping each cell to the keys in it.
+
+    Moving a key costs O(1), and a ring search visits the 8k cells at
+    Chebyshev distance k from a center cell, so the cost of a query depends on
+    the area searched rather than on how many keys are indexed. Cells are
+    `cell_degrees` on a side, so they are narrower east-west away from the
+    equator (a degree of longitude spans KM_PER_DEGREE * cos(latitude)); a
+    search therefore covers more columns than rows to reach the same distance.
+    """
+
+    def __init__(self, cell_degrees: float = 0.01):
+        self.cell_degrees = cell_degrees
+        self._cells: Dict[Cell, Set[Hashable]] = {}
+        self._positions: Dict[Hashable, Cell] = {}
+
+    def __len__(self) -> int:
+        return len(self._positions)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._positions
+
+    def cell_of(self, latitude: float, longitude: float) -> Cell:
+        return (math.floor(latitude / self.cell_degrees), math.floor(longitude / self.cell_degrees))
+
+    def rings_for(self, radius_km: float, center: Cell) -> Tuple[int, int]:
+        """Rows and columns around `center` that cover `radius_km` in every direction"""
+        cell_km = self.cell_degrees * KM_PER_DEGREE
+        rows = max(math.ceil(radius_km / cell_km), 0)
+        # Columns are narrowest at the searched row farthest from the equator
+        farthest = max(abs(center[0] - rows), abs(center[0] + rows + 1)) * self.cell_degrees
+        cos_latitude = math.cos(math.radians(min(farthest, 89.0)))
+        columns = max(math.ceil(radius_km / (cell_km * cos_latitude)), 0)
+        return rows, columns
+
+    def cell(self, key: Hashable) -> Optional[Cell]:
+        return self._positions.get(key)
+
+    def place(self, key: Hashable, cell: Cell) -> bool:
+        """Put `key` in `cell`; False if it was already there"""
+        previous = self._positions.get(key)
+        if previous == cell:
+            return False
+        if previous is not None:
+            self._discard(key, previous)
+        self._positions[key] = cell
+        self._cells.setdefault(cell, set()).add(key)
+        return True
+
+    def remove(self, key: Hashable):
+        cell = self._positions.pop(key, None)
+        if cell is not None:
+            self._discard(key, cell)
+
+    def _discard(self, key: Hashable, cell: Cell):
+        keys = self._cells[cell]
+        keys.discard(key)
+        if not keys:
+            del self._cells[cell]
+
+    def ring(self, center: Cell, k: int, rows: Optional[int] = None,
+             columns: Optional[int] = None) -> Iterator[Hashable]:
+        """Keys in the cells added by step `k` of a search growing one cell per
+        step, up to `rows` north-south and `columns` east-west (by default,
+        exactly `k` cells away from `center`)"""
+        row, column = center
+        if k == 0:
+            yield from self._cells.get(center, ())
+            return
+        rows = k if rows is None else rows
+        columns = k if columns is None else columns
+        height, width = min(k, rows), min(k, columns)
+        previous_height, previous_width = min(k - 1, rows), min(k - 1, columns)
+        if height > previous_height:
+            for dx in range(-width, width + 1):
+                yield from self._cells.get((row - height, column + dx), ())
+                yield from self._cells.get((row + height, column + dx), ())
+        if width > previous_width:
+            for dy in range(-previous_height, previous_height + 1):
+                yield from self._cells.get((row + dy, column - width), ())
+                yield from self._cells.get((row + dy, column + width), ())
+
+    def within(self, center: Cell, rows: int, columns: Optional[int] = None) -> Iterator[Hashable]:
+        """Keys within `rows` cells north-south and `columns` (default `rows`)
+        east-west of `center`, nearest rings first"""
+        columns = rows if columns is None else columns
+        for k in range(max(rows, columns) + 1):
+            yield from self.ring(center, k, rows, columns)
+
+    def stats(self) -> Dict:
+        return {
+            "indexed": len(self._positions),
+            "occupied_cells": len(self._cells),
+            "cell_degrees": self.cell_degrees
+        }
@@ -0,0 +1,197 @@
+import asyncio
+import hashlib
+import json
+import os
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+from fastapi import HTTPException, status
+
+from .serialization import dumps
+
+IDEMPOTENCY_TTL_SECONDS = int(os.getenv("IDEMPOTENCY_TTL_SECONDS", "86400"))
+# An in-flight key whose request has not finished by then is taken to belong to
+# a worker that died mid-request, and may be claimed again
+IDEMPOTENCY_IN_FLIGHT_TIMEOUT_SECONDS = int(os.getenv("IDEMPOTENCY_IN_FLIGHT_TIMEOUT_SECONDS", "300"))
+IDEMPOTENCY_KEY_MAX_LENGTH = 255
+# How often a worker deletes the expired keys of every user
+IDEMPOTENCY_PURGE_INTERVAL_SECONDS = float(os.getenv("IDEMPOTENCY_PURGE_INTERVAL_SECONDS", "300"))
+
+IN_FLIGHT = "in_flight"
+COMPLETED = "completed"
+
+KeyId = Tuple[str, str, str]
+
+class IdempotencyStore:
+    """Idempotency-Key -> response store kept in the `idempotency_keys` table,
+    so a retry is recognised whichever worker it reaches.
+
+    Keys are scoped by user and operation. The first request with a key claims
+    it with an insert that the table's primary key makes exclusive; a retry
+    with a completed key gets the stored response back without re-running the
+    operation, a retry that arrives while the first request is still running
+    gets 409, and reusing a key with a different payload gets 422. Failed
+    operations release their key, so the client can retry them with it.
+    Completed keys are kept for `ttl_seconds`; in-flight keys are never
+    dropped before `in_flight_timeout_seconds`. Expired keys are deleted when
+    reused, and all of them at most every `purge_interval_seconds`, so the
+    table stays bounded by the keys used within the TTL.
+    """
+
+    def __init__(self, supabase_client, ttl_seconds: int = IDEMPOTENCY_TTL_SECONDS,
+                 in_flight_timeout_seconds: int = IDEMPOTENCY_IN_FLIGHT_TIMEOUT_SECONDS,
+                 purge_interval_seconds: float = IDEMPOTENCY_PURGE_INTERVAL_SECONDS,
+                 clock: Callable[[], float] = time.monotonic):
+        self.supabase = supabase_client
+        self.ttl_seconds = ttl_seconds
+        self.in_flight_timeout_seconds = in_flight_timeout_seconds
+        self.purge_interval_seconds = purge_interval_seconds
+        self._clock = clock
+        self._purged_at: Optional[float] = None
+
+    @staticmethod
+    def fingerprint(payload: Any) -> str:
+        """Stable hash of the request payload a key was first used with"""
+        if hasattr(payload, "dict"):
+            payload = payload.dict()
+        encoded = json.dumps(payload, sort_keys=True, default=str).encode("utf-8")
+        return hashlib.sha256(encoded).hexdigest()
+
+    def run(self, user_id: str, scope: str, key: Optional[str], payload: Any, operation: Callable[[], Any]) -> Any:
+        if not key:
+            return operation()
+        key_id = (user_id, scope, key)
+        cached = self._begin(key_id, payload)
+        if cached is not None:
+            return cached
+        try:
+            response = operation()
+        except BaseException:
+            self._abort(key_id)
+            raise
+        self._complete(key_id, response)
+        return response
+
+    async def run_async(self, user_id: str, scope: str, key: Optional[str], payload: Any,
+                        operation: Callable[[], Awaitable[Any]]) -> Any:
+        if not key:
+            return await operation()
+        key_id = (user_id, scope, key)
+        # Database calls are blocking; keep them off the event loop
+        cached = await asyncio.to_thread(self._begin, key_id, payload)
+        if cached is not None:
+            return cached
+        try:
+            response = await operation()
+        except BaseException:
+            await asyncio.to_thread(self._abort, key_id)
+            raise
+        await asyncio.to_thread(self._complete, key_id, response)
+        return response
+
+    def _begin(self, key_id: KeyId, payload: Any) -> Any:
+        """Claim the key and return None, or return the response it completed with"""
+        if len(key_id[2]) > IDEMPOTENCY_KEY_MAX_LENGTH:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Idempotency-Key is too long"
+            )
+        fingerprint = self.fingerprint(payload)
+        self._purge_if_due()
+
+        if self._claim(key_id, fingerprint):
+            return None
+        entry = self._get(key_id)
+        if entry is None or self._expired(entry):
+            # Expired (or released meanwhile): clear it and claim it afresh
+            self._delete_expired(key_id)
+            if self._claim(key_id, fingerprint):
+                return None
+            entry = self._get(key_id)
+            if entry is None:
+                raise HTTPException(
+                    status_code=status.HTTP_409_CONFLICT,
+                    detail="A request with this Idempotency-Key is still being processed"
+                )
+
+        if entry["fingerprint"] != fingerprint:
+            raise HTTPException(
+                status_code=422,
+                detail="Idempotency-Key was already used with a different request"
+            )
+        if entry["status"] != COMPLETED:
+            raise HTTPException(
+                status_code=status.HTTP_409_CONFLICT,
+                detail="A request with this Idempotency-Key is still being processed"
+            )
+        return entry["response"]
+
+    def _claim(self, key_id: KeyId, fingerprint: str) -> bool:
+        """Insert the key as in flight; False if a row for it already exists"""
+        response = self.supabase.table('idempotency_keys')\
+            .upsert({
+                **self._match(key_id),
+                "fingerprint": fingerprint,
+                "status": IN_FLIGHT,
+                "response": None,
+                "expires_at": self._deadline(self.in_flight_timeout_seconds)
+            }, on_conflict="user_id,scope,idempotency_key", ignore_duplicates=True)\
+            .execute()
+        return bool(response.data)
+
+    def _get(self, key_id: KeyId) -> Optional[Dict]:
+        query = self.supabase.table('idempotency_keys').select("fingerprint, status, response, expires_at")
+        for column, value in self._match(key_id).items():
+            query = query.eq(column, value)
+        response = query.execute()
+        return response.data[0] if response.data else None
+
+    def _delete_expired(self, key_id: KeyId):
+        query = self.supabase.table('idempotency_keys').delete()
+        for column, value in self._match(key_id).items():
+            query = query.eq(column, value)
+        # Conditional, so a row another worker has just re-claimed is left alone
+        query.lt('expires_at', self._deadline(0)).execute()
+
+    def _purge_if_due(self):
+        now = self._clock()
+        if self._purged_at is not None and now - self._purged_at < self.purge_interval_seconds:
+            return
+        self._purged_at = now
+        try:
+            self.supabase.table('idempotency_keys').delete().lt('expires_at', self._deadline(0)).execute()
+        except Exception as e:
+            # Only housekeeping: the request itself can go ahead
+            print(f"Error purging expired idempotency keys: {str(e)}")
+
+    def _complete(self, key_id: KeyId, response: Any):
+        query = self.supabase.table('idempotency_keys').update({
+            "status": COMPLETED,
+            "response": json.loads(dumps(response)),
+            "expires_at": self._deadline(self.ttl_seconds)
+        })
+        for column, value in self._match(key_id).items():
+            query = query.eq(column, value)
+        query.execute()
+
+    def _abort(self, key_id: KeyId):
+        query = self.supabase.table('idempotency_keys').delete()
+        for column, value in self._match(key_id).items():
+            query = query.eq(column, value)
+        query.eq('status', IN_FLIGHT).execute()
+
+    @staticmethod
+    def _match(key_id: KeyId) -> Dict[str, str]:
+        user_id, scope, key = key_id
+        return {"user_id": user_id, "scope": scope, "idempotency_key": key}
+
+    @staticmethod
+    def _deadline(seconds: int) -> str:
+        return (datetime.now(timezone.utc) + timedelta(seconds=seconds)).isoformat()
+
+    @staticmethod
+    def _expired(entry: Dict) -> bool:
+        expires_at = datetime.fromisoformat(entry["expires_at"])
+        if expires_at.tzinfo is None:
+            expires_at = expires_at.replace(tzinfo=timezone.utc)
+        return expires_at <= datetime.now(timezone.utc)
@@ -0,0 +1,49 @@
+import json
+import os
+from datetime import date, datetime
+from decimal import Decimal
+from typing import Any
+
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel
+
+try:
+    import orjson
+except ImportError:  # optional dependency; fall back to the standard encoder
+    orjson = None
+
+# Opt-in: when disabled, list routes return their payload and FastAPI validates it
+# against the route's response_model as usual
+FAST_JSON_RESPONSES = os.getenv("FAST_JSON_RESPONSES", "false").lower() in ("1", "true", "yes")
+
+def _default(value: Any):
+    if isinstance(value, BaseModel):
+        return value.model_dump(mode="json")
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+def dumps(content: Any) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(content, default=_default, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(content, default=_default, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+class FastJSONResponse(JSONResponse):
+    """JSONResponse rendered with orjson when it is installed"""
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
+def trusted_json_response(content: Any):
+    """Return `content` for a route whose payload was built entirely from rows of
+    our own database, already in the response_model's shape.
+
+    With FAST_JSON_RESPONSES enabled the payload is encoded directly, skipping
+    FastAPI's response_model validation; otherwise it is returned unchanged and
+    validated as usual.
+    """
+    if not FAST_JSON_RESPONSES:
+        return content
+    return FastJSONResponse(content)
@@ -0,0 +1,115 @@
+import math
+import time
+from typing import Callable, Dict, Hashable, List, Optional, Set
+
+class _Timer:
+    __slots__ = ("key", "deadline_tick", "slot")
+
+    def __init__(self, key: Hashable, deadline_tick: int):
+        self.key = key
+        self.deadline_tick = deadline_tick
+        self.slot: Optional[Set["_Timer"]] = None
+
+class TimerWheel:
+    """Hierarchical timing wheel keyed by an arbitrary hashable id.
+
+    Level 0 has one slot per tick; each higher level covers `slots_per_level`
+    slots of the level below. A timer is placed in the lowest level whose range
+    contains its deadline and cascades down as time approaches it, so arming and
+    cancelling are O(1) and advancing costs O(ticks + timers fired). Deadlines
+    beyond the top level's range park in its farthest slot and are re-placed
+    when that slot cascades. Not thread-safe; drive it from one event loop.
+    """
+
+    def __init__(self, tick_seconds: float = 1.0, slots_per_level: int = 64, levels: int = 4,
+                 clock: Callable[[], float] = time.monotonic):
+        self.tick_seconds = tick_seconds
+        self.slots_per_level = slots_per_level
+        self.levels = levels
+        self._clock = clock
+        self._origin = clock()
+        self._current_tick = 0
+        self._spans = [slots_per_level ** level for level in range(levels + 1)]
+        self._wheels = [[set() for _ in range(slots_per_level)] for _ in range(levels)]
+        self._timers: Dict[Hashable, _Timer] = {}
+
+    def __len__(self) -> int:
+        return len(self._timers)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._timers
+
+    def schedule(self, key: Hashable, delay_seconds: float):
+        """Arm (or re-arm) the timer for `key` to fire after `delay_seconds`"""
+        self.cancel(key)
+        elapsed = self._clock() - self._origin + max(delay_seconds, 0.0)
+        deadline_tick = max(math.ceil(elapsed / self.tick_seconds), self._current_tick + 1)
+        timer = _Timer(key, deadline_tick)
+        self._timers[key] = timer
+        self._place(timer)
+
+    def cancel(self, key: Hashable) -> bool:
+        timer = self._timers.pop(key, None)
+        if timer is None:
+            return False
+        timer.slot.discard(timer)
+        timer.slot = None
+        return True
+
+    def advance(self) -> List[Hashable]:
+        """Move the wheel up to the current time and return the keys that fired"""
+        target_tick = int((self._clock() - self._origin) / self.tick_seconds)
+        fired: List[Hashable] = []
+
+        while self._current_tick < target_tick:
+            self._current_tick += 1
+            tick = self._current_tick
+
+            # Cascade higher levels whose slot boundary we just crossed, top first
+            for level in range(self.levels - 1, 0, -1):
+                if tick % self._spans[level] == 0:
+                    self._cascade(level, (tick // self._spans[level]) % self.slots_per_level)
+
+            wheel = self._wheels[0]
+            index = tick % self.slots_per_level
+            slot = wheel[index]
+            if not slot:
+                continue
+            wheel[index] = set()
+            for timer in slot:
+                if timer.deadline_tick <= tick:
+                    timer.slot = None
+                    del self._timers[timer.key]
+                    fired.append(timer.key)
+                else:
+                    self._place(timer)
+
+        return fired
+
+    def _cascade(self, level: int, index: int):
+        wheel = self._wheels[level]
+        slot = wheel[index]
+        if not slot:
+            return
+        wheel[index] = set()
+        for timer in slot:
+            self._place(timer)
+
+    def _place(self, timer: _Timer):
+        delta = timer.deadline_tick - self._current_tick
+        for level in range(self.levels):
+            if delta < self._spans[level + 1]:
+                break
+        else:
+            # Beyond the wheel's range: park in the farthest top-level slot
+            level = self.levels - 1
+            top_span = self._spans[level]
+            slot_tick = self._current_tick + (self.slots_per_level - 1) * top_span
+            slot = self._wheels[level][(slot_tick // top_span) % self.slots_per_level]
+            slot.add(timer)
+            timer.slot = slot
+            return
+
+        slot = self._wheels[level][(timer.deadline_tick // self._spans[level]) % self.slots_per_level]
+        slot.add(timer)
+        timer.slot = slot
@@ -0,0 +1,28 @@
+from typing import Optional, Tuple
+from datetime import datetime
+import base64
+import uuid
+
+
+def encode_cursor(sort_value: str, row_id: str) -> str:
+    """Encode a keyset position (sort column value, tie-breaking id) as an opaque cursor"""
+    raw = f"{sort_value}|{row_id}".encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii")
+
+
+def decode_cursor(cursor: Optional[str]) -> Optional[Tuple[str, str]]:
+    """Decode a cursor produced by encode_cursor, raising ValueError if malformed.
+
+    Cursors come from clients and end up in query filters, so the position is
+    parsed as an ISO timestamp and a UUID and returned in canonical form."""
+    if not cursor:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(cursor.encode("ascii")).decode("utf-8")
+        sort_value, row_id = raw.rsplit("|", 1)
+    except Exception:
+        raise ValueError("Invalid cursor")
+    try:
+        return datetime.fromisoformat(sort_value).isoformat(), str(uuid.UUID(row_id))
+    except (TypeError, ValueError):
+        raise ValueError("Invalid cursor")
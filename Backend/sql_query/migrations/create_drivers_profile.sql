@@ -5,3 +5,6 @@ CREATE TABLE driver_profiles (
   vehicle_info TEXT,
   is_approved BOOLEAN DEFAULT FALSE
 );
+
+
+CREATE INDEX idx_driver_profiles_user_id ON driver_profiles(user_id);
@@ -0,0 +1,19 @@
+-- Idempotency-Key claims and stored responses, shared by every worker. The
+-- primary key makes claiming a key exclusive: a retry reaching another worker
+-- finds the row instead of running the operation again.
+CREATE TABLE idempotency_keys (
+    user_id UUID NOT NULL,
+    scope TEXT NOT NULL,
+    idempotency_key TEXT NOT NULL,
+    fingerprint TEXT NOT NULL,
+    status TEXT CHECK (status IN ('in_flight', 'completed')) NOT NULL,
+    response JSONB,
+    -- In flight: when the claim is considered abandoned; completed: end of retention
+    expires_at TIMESTAMPTZ NOT NULL,
+    created_at TIMESTAMPTZ DEFAULT NOW(),
+    PRIMARY KEY (user_id, scope, idempotency_key)
+);
+
+-- Expired rows are deleted when their key is reused, and all of them by each
+-- worker every IDEMPOTENCY_PURGE_INTERVAL_SECONDS (range scan on this index)
+CREATE INDEX idx_idempotency_keys_expires_at ON idempotency_keys (expires_at);
@@ -0,0 +1,100 @@
+-- Per-user rating aggregates, maintained by trigger in the same transaction as
+-- every insert/update/delete on ride_ratings.
+-- rater_type = 'user'   -> ratings received as a driver
+-- rater_type = 'driver' -> ratings received as a rider
+--
+-- Runs as one transaction holding ride_ratings in SHARE ROW EXCLUSIVE mode, so
+-- no rating can be written between creating the trigger and the backfill.
+BEGIN;
+
+LOCK TABLE ride_ratings IN SHARE ROW EXCLUSIVE MODE;
+
+CREATE TABLE rating_aggregates (
+    rated_user_id UUID NOT NULL,
+    rater_type TEXT CHECK (rater_type IN ('user', 'driver')) NOT NULL,
+    rating_count INTEGER NOT NULL DEFAULT 0,
+    rating_sum INTEGER NOT NULL DEFAULT 0,
+    stars_1 INTEGER NOT NULL DEFAULT 0,
+    stars_2 INTEGER NOT NULL DEFAULT 0,
+    stars_3 INTEGER NOT NULL DEFAULT 0,
+    stars_4 INTEGER NOT NULL DEFAULT 0,
+    stars_5 INTEGER NOT NULL DEFAULT 0,
+    updated_at TIMESTAMP DEFAULT NOW(),
+    PRIMARY KEY (rated_user_id, rater_type)
+);
+
+CREATE OR REPLACE FUNCTION apply_rating_delta(
+    p_rated_user_id UUID, p_rater_type TEXT, p_rating INTEGER, p_sign INTEGER
+) RETURNS VOID AS $$
+BEGIN
+    INSERT INTO rating_aggregates AS agg (
+        rated_user_id, rater_type, rating_count, rating_sum,
+        stars_1, stars_2, stars_3, stars_4, stars_5, updated_at
+    )
+    VALUES (
+        p_rated_user_id, p_rater_type, p_sign, p_sign * p_rating,
+        CASE WHEN p_rating = 1 THEN p_sign ELSE 0 END,
+        CASE WHEN p_rating = 2 THEN p_sign ELSE 0 END,
+        CASE WHEN p_rating = 3 THEN p_sign ELSE 0 END,
+        CASE WHEN p_rating = 4 THEN p_sign ELSE 0 END,
+        CASE WHEN p_rating = 5 THEN p_sign ELSE 0 END,
+        NOW()
+    )
+    ON CONFLICT (rated_user_id, rater_type) DO UPDATE SET
+        rating_count = agg.rating_count + EXCLUDED.rating_count,
+        rating_sum = agg.rating_sum + EXCLUDED.rating_sum,
+        stars_1 = agg.stars_1 + EXCLUDED.stars_1,
+        stars_2 = agg.stars_2 + EXCLUDED.stars_2,
+        stars_3 = agg.stars_3 + EXCLUDED.stars_3,
+        stars_4 = agg.stars_4 + EXCLUDED.stars_4,
+        stars_5 = agg.stars_5 + EXCLUDED.stars_5,
+        updated_at = NOW();
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION maintain_rating_aggregates() RETURNS TRIGGER AS $$
+BEGIN
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        PERFORM apply_rating_delta(OLD.rated_user_id, OLD.rater_type, OLD.rating, -1);
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        PERFORM apply_rating_delta(NEW.rated_user_id, NEW.rater_type, NEW.rating, 1);
+        RETURN NEW;
+    END IF;
+    RETURN OLD;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER trg_ride_ratings_aggregates
+AFTER INSERT OR DELETE OR UPDATE OF rated_user_id, rater_type, rating ON ride_ratings
+FOR EACH ROW EXECUTE FUNCTION maintain_rating_aggregates();
+
+-- Backfill from existing ratings; the counts read under the lock are the
+-- complete ones, so they replace any row already present
+INSERT INTO rating_aggregates (
+    rated_user_id, rater_type, rating_count, rating_sum,
+    stars_1, stars_2, stars_3, stars_4, stars_5
+)
+SELECT
+    rated_user_id,
+    rater_type,
+    COUNT(*),
+    SUM(rating),
+    COUNT(*) FILTER (WHERE rating = 1),
+    COUNT(*) FILTER (WHERE rating = 2),
+    COUNT(*) FILTER (WHERE rating = 3),
+    COUNT(*) FILTER (WHERE rating = 4),
+    COUNT(*) FILTER (WHERE rating = 5)
+FROM ride_ratings
+GROUP BY rated_user_id, rater_type
+ON CONFLICT (rated_user_id, rater_type) DO UPDATE SET
+    rating_count = EXCLUDED.rating_count,
+    rating_sum = EXCLUDED.rating_sum,
+    stars_1 = EXCLUDED.stars_1,
+    stars_2 = EXCLUDED.stars_2,
+    stars_3 = EXCLUDED.stars_3,
+    stars_4 = EXCLUDED.stars_4,
+    stars_5 = EXCLUDED.stars_5,
+    updated_at = NOW();
+
+COMMIT;
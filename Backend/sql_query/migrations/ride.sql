@@ -23,7 +23,7 @@ CREATE TABLE ride_applications (
     application_id UUID PRIMARY KEY DEFAULT gen_random_uuid(),
     ride_id UUID REFERENCES rides(ride_id) ON DELETE CASCADE,
     driver_id UUID REFERENCES users(id) NOT NULL,
-    locations TEXT, -- JSON string containing driver's current location
+    locations TEXT, -- legacy JSON location, superseded by driver_* columns (structured_locations.sql)
     applied_at TIMESTAMP DEFAULT NOW(),
     UNIQUE(ride_id, driver_id)
 );
@@ -34,6 +34,9 @@ CREATE INDEX idx_rides_user_id ON rides(user_id);
 CREATE INDEX idx_rides_driver_id ON rides(driver_id);
 CREATE INDEX idx_ride_applications_ride_id ON ride_applications(ride_id);
 CREATE INDEX idx_ride_applications_driver_id ON ride_applications(driver_id);
+-- Keyset pagination of completed rides per rider / driver
+CREATE INDEX idx_rides_user_status_created ON rides(user_id, status, created_at DESC, ride_id DESC);
+CREATE INDEX idx_rides_driver_status_created ON rides(driver_id, status, created_at DESC, ride_id DESC);
 
 
 CREATE TABLE ride_ratings (
@@ -47,3 +50,20 @@ CREATE TABLE ride_ratings (
     created_at TIMESTAMP DEFAULT NOW(),
     updated_at TIMESTAMP DEFAULT NOW()
 );
+
+CREATE INDEX idx_ride_ratings_ride_id ON ride_ratings(ride_id);
+
+-- Completion timestamp written by complete_ride and included in exports
+ALTER TABLE rides ADD COLUMN IF NOT EXISTS completed_at TIMESTAMP;
+
+-- Append-only ride event log; seq orders events for timeline reads and tailing
+CREATE TABLE ride_events (
+    seq BIGINT GENERATED ALWAYS AS IDENTITY PRIMARY KEY,
+    ride_id UUID REFERENCES rides(ride_id) ON DELETE CASCADE NOT NULL,
+    event_type TEXT CHECK (event_type IN ('created', 'applied', 'confirmed', 'started', 'completed', 'cancelled', 'rated', 'paid')) NOT NULL,
+    actor_id UUID,
+    data JSONB NOT NULL DEFAULT '{}'::jsonb,
+    created_at TIMESTAMP DEFAULT NOW()
+);
+
+CREATE INDEX idx_ride_events_ride_id_seq ON ride_events(ride_id, seq);
@@ -0,0 +1,27 @@
+-- Number each ride's events in commit order, so tailing with after_seq cannot
+-- skip an event. An identity value is taken at insert time: an event whose
+-- transaction commits after one with a higher seq of the same ride would be
+-- invisible to a reader that had already moved past it. Inserts for a ride are
+-- now serialized by a transaction-scoped advisory lock, and seq is taken only
+-- once the lock is held, i.e. after the ride's previous event has committed.
+BEGIN;
+
+ALTER TABLE ride_events ALTER COLUMN seq DROP IDENTITY IF EXISTS;
+
+CREATE SEQUENCE ride_events_commit_seq OWNED BY ride_events.seq;
+SELECT setval('ride_events_commit_seq', COALESCE((SELECT MAX(seq) FROM ride_events), 0) + 1, false);
+
+CREATE OR REPLACE FUNCTION assign_ride_event_seq() RETURNS TRIGGER AS $$
+BEGIN
+    -- Held until commit: the ride's next event waits here, then takes a higher seq
+    PERFORM pg_advisory_xact_lock(hashtextextended(NEW.ride_id::text, 0));
+    NEW.seq := nextval('ride_events_commit_seq');
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER trg_ride_events_seq
+BEFORE INSERT ON ride_events
+FOR EACH ROW EXECUTE FUNCTION assign_ride_event_seq();
+
+COMMIT;
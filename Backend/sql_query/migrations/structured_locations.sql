@@ -0,0 +1,32 @@
+-- Store coordinates as numeric columns instead of JSON strings.
+-- ride_applications.locations held '{"latitude": .., "longitude": .., "address": ..}'
+-- as TEXT and was parsed on every read; rides only kept pickup/drop as free text.
+
+ALTER TABLE rides
+    ADD COLUMN IF NOT EXISTS pickup_latitude DOUBLE PRECISION,
+    ADD COLUMN IF NOT EXISTS pickup_longitude DOUBLE PRECISION,
+    ADD COLUMN IF NOT EXISTS drop_latitude DOUBLE PRECISION,
+    ADD COLUMN IF NOT EXISTS drop_longitude DOUBLE PRECISION;
+
+ALTER TABLE ride_applications
+    ADD COLUMN IF NOT EXISTS driver_latitude DOUBLE PRECISION,
+    ADD COLUMN IF NOT EXISTS driver_longitude DOUBLE PRECISION,
+    ADD COLUMN IF NOT EXISTS driver_address TEXT;
+
+-- Backfill applications from the legacy JSON column
+UPDATE ride_applications
+SET driver_latitude = (locations::jsonb ->> 'latitude')::DOUBLE PRECISION,
+    driver_longitude = (locations::jsonb ->> 'longitude')::DOUBLE PRECISION,
+    driver_address = locations::jsonb ->> 'address'
+WHERE locations IS NOT NULL
+  AND locations LIKE '{%'
+  AND driver_latitude IS NULL;
+
+-- The application no longer writes locations; drop it once every deployment
+-- reads the driver_* columns:
+-- ALTER TABLE ride_applications DROP COLUMN locations;
+
+-- Bounding-box lookups of pending rides near a point
+CREATE INDEX IF NOT EXISTS idx_rides_pending_pickup_coords
+    ON rides(pickup_latitude, pickup_longitude)
+    WHERE status = 'pending';
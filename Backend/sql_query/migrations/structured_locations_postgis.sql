@@ -0,0 +1,24 @@
+-- Optional, requires PostGIS: geography points derived from the numeric
+-- coordinate columns (structured_locations.sql) for indexed radius queries,
+-- e.g. ST_DWithin(pickup_point, ST_MakePoint(lng, lat)::geography, 3000).
+
+CREATE EXTENSION IF NOT EXISTS postgis;
+
+ALTER TABLE rides
+    ADD COLUMN IF NOT EXISTS pickup_point GEOGRAPHY(POINT, 4326)
+    GENERATED ALWAYS AS (
+        CASE WHEN pickup_latitude IS NOT NULL AND pickup_longitude IS NOT NULL
+             THEN ST_SetSRID(ST_MakePoint(pickup_longitude, pickup_latitude), 4326)::geography
+        END
+    ) STORED;
+
+ALTER TABLE ride_applications
+    ADD COLUMN IF NOT EXISTS driver_point GEOGRAPHY(POINT, 4326)
+    GENERATED ALWAYS AS (
+        CASE WHEN driver_latitude IS NOT NULL AND driver_longitude IS NOT NULL
+             THEN ST_SetSRID(ST_MakePoint(driver_longitude, driver_latitude), 4326)::geography
+        END
+    ) STORED;
+
+CREATE INDEX IF NOT EXISTS idx_rides_pickup_point ON rides USING GIST (pickup_point);
+CREATE INDEX IF NOT EXISTS idx_ride_applications_driver_point ON ride_applications USING GIST (driver_point);
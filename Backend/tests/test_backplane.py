@@ -0,0 +1,84 @@
+import asyncio
+
+from rides.websocket.backplane import InProcessBackplane, UnixSocketBackplane, _pack, _unpack, undeliverable_fallback
+
+def test_packets_round_trip():
+    packet = _pack("worker-b", b'{"kind":"users"}')
+    assert int.from_bytes(packet[:4], "big") == len(packet) - 4
+    assert _unpack(packet) == ("worker-b", b'{"kind":"users"}')
+    assert _unpack(_pack("", b"x")) == ("", b"x")
+
+def test_undeliverable_route_falls_back_to_a_fanout():
+    route = {"kind": "route", "targets": ["u1"], "frame": "f"}
+    assert undeliverable_fallback(route) == {"kind": "users", "targets": ["u1"], "frame": "f"}
+    personal = {"kind": "personal", "user": "u1", "message": {}, "frame": "f"}
+    assert undeliverable_fallback(personal) == {"kind": "users", "targets": ["u1"], "frame": "f"}
+    room = {**route, "room": {"ride_id": "r1"}}
+    assert undeliverable_fallback(room) == {"kind": "users", "targets": ["u1"], "frame": "f", "room": {"ride_id": "r1"}}
+    assert undeliverable_fallback({"kind": "presence"}) is None
+
+async def _start(hub, worker_id):
+    received = []
+    backplane = InProcessBackplane(hub, worker_id)
+    await backplane.start(received.append)
+    return backplane, received
+
+def test_in_process_publish_reaches_every_other_worker():
+    async def scenario():
+        hub = set()
+        a, a_received = await _start(hub, "a")
+        b, b_received = await _start(hub, "b")
+        c, c_received = await _start(hub, "c")
+        a.publish({"kind": "users", "targets": ["u1"], "frame": "f"})
+        b.publish({"kind": "heartbeat", "worker": "b"}, to="c")
+        await asyncio.sleep(0)
+        return a_received, b_received, c_received
+
+    a_received, b_received, c_received = asyncio.run(scenario())
+    assert a_received == []
+    assert b_received == [{"kind": "users", "targets": ["u1"], "frame": "f"}]
+    assert c_received == [{"kind": "users", "targets": ["u1"], "frame": "f"}, {"kind": "heartbeat", "worker": "b"}]
+
+def test_in_process_message_to_a_gone_worker_uses_the_fallback():
+    async def scenario():
+        hub = set()
+        a, _ = await _start(hub, "a")
+        b, b_received = await _start(hub, "b")
+        a.publish({"kind": "route", "targets": ["u1"], "frame": "f"}, to="gone")
+        a.publish({"kind": "presence", "op": "up", "user": "u1", "holder": "a"}, to="gone")
+        await a.stop()
+        await asyncio.sleep(0)
+        return b_received
+
+    assert asyncio.run(scenario()) == [
+        {"kind": "users", "targets": ["u1"], "frame": "f"},
+        {"kind": "leave", "worker": "a"}
+    ]
+
+def test_unix_socket_workers_share_one_broker(tmp_path):
+    path = str(tmp_path / "backplane.sock")
+
+    async def scenario():
+        received = {name: [] for name in ("a", "b", "c")}
+        workers = [UnixSocketBackplane(path=path, worker_id=name) for name in received]
+        for worker in workers:
+            await worker.start(received[worker.worker_id].append)
+        for _ in range(100):
+            if all(worker.stats()["connected"] for worker in workers):
+                break
+            await asyncio.sleep(0.01)
+
+        a, b, c = workers
+        a.publish({"kind": "users", "targets": ["u1"], "frame": "f"})
+        b.publish({"kind": "heartbeat", "worker": "b"}, to="c")
+        await asyncio.sleep(0.2)
+        hosts = sum(worker.stats()["hosting_broker"] for worker in workers)
+        for worker in reversed(workers):
+            await worker.stop()
+        return received, hosts
+
+    received, hosts = asyncio.run(scenario())
+    assert hosts == 1
+    assert received["a"] == []
+    assert received["b"] == [{"kind": "users", "targets": ["u1"], "frame": "f"}]
+    assert {"kind": "heartbeat", "worker": "b"} in received["c"]
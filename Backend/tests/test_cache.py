@@ -0,0 +1,133 @@
+import asyncio
+
+from rides.websocket.backplane import InProcessBackplane
+from rides.websocket.connection_manager import ConnectionManager
+from shared.cache import TTLCache
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+def test_entries_expire_after_the_ttl():
+    clock = FakeClock()
+    cache = TTLCache(ttl_seconds=60, clock=clock)
+    cache.set("k", "v")
+
+    clock.now = 59.9
+    assert cache.get("k") == "v"
+    clock.now = 60.0
+    assert cache.get("k") is None
+    assert cache.stats()["entries"] == 0
+
+def test_least_recently_used_entry_is_evicted():
+    cache = TTLCache(max_entries=2, clock=FakeClock())
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")  # "b" is now the least recently used
+    cache.set("c", 3)
+
+    assert cache.get("b") is None
+    assert cache.get("a") == 1
+    assert cache.get("c") == 3
+    assert cache.stats()["evictions"] == 1
+
+def test_set_refreshes_the_ttl():
+    clock = FakeClock()
+    cache = TTLCache(ttl_seconds=10, clock=clock)
+    cache.set("k", 1)
+    clock.now = 8
+    cache.set("k", 2)
+    clock.now = 15
+    assert cache.get("k") == 2
+
+def test_get_or_load_reads_through_once():
+    cache = TTLCache(clock=FakeClock())
+    loads = []
+
+    def loader():
+        loads.append(1)
+        return {"count": 3}
+
+    assert cache.get_or_load("k", loader) == {"count": 3}
+    assert cache.get_or_load("k", loader) == {"count": 3}
+    assert len(loads) == 1
+
+def test_invalidate_forces_a_reload():
+    cache = TTLCache(clock=FakeClock())
+    cache.set("k", "old")
+    cache.invalidate("k")
+    cache.invalidate("missing")
+
+    assert cache.get_or_load("k", lambda: "new") == "new"
+    assert cache.stats()["invalidations"] == 1
+
+def test_stats_count_hits_and_misses():
+    cache = TTLCache(clock=FakeClock())
+    cache.get("k")
+    cache.set("k", 1)
+    cache.get("k")
+    cache.get("k")
+
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["hit_ratio"]) == (2, 1, 0.6667)
+
+def test_load_overtaken_by_an_invalidation_is_not_stored():
+    cache = TTLCache(clock=FakeClock())
+
+    def loader():
+        # The value changes, and is invalidated, while this load reads the old one
+        cache.invalidate("k")
+        return "stale"
+
+    assert cache.get_or_load("k", loader) == "stale"
+    assert cache.get("k") is None
+    assert cache.get_or_load("k", lambda: "fresh") == "fresh"
+    assert cache.get("k") == "fresh"
+    assert cache._loading == {}
+
+def test_failed_load_stores_nothing():
+    cache = TTLCache(clock=FakeClock())
+
+    def loader():
+        raise RuntimeError("database unavailable")
+
+    try:
+        cache.get_or_load("k", loader)
+    except RuntimeError:
+        pass
+    assert cache.get("k") is None
+    assert cache._loading == {}
+
+def test_invalidate_notifies_listeners_but_invalidate_local_does_not():
+    cache = TTLCache(clock=FakeClock())
+    seen = []
+    cache.on_invalidate.append(seen.append)
+    cache.set("a", 1)
+    cache.set("b", 2)
+
+    cache.invalidate("a")
+    cache.invalidate_local("b")
+    assert seen == ["a"]
+    assert cache.get("a") is None and cache.get("b") is None
+
+def test_shared_cache_is_invalidated_on_other_workers():
+    async def scenario():
+        hub = set()
+        managers = [ConnectionManager(backplane=InProcessBackplane(hub, name)) for name in ("a", "b")]
+        caches = [TTLCache(clock=FakeClock()) for _ in managers]
+        for manager, cache in zip(managers, caches):
+            manager.share_cache("ratings", cache)
+            cache.set(("driver", "u1"), "summary")
+            await manager.backplane.start(manager._on_backplane_envelope)
+
+        caches[0].invalidate(("driver", "u1"))
+        await asyncio.sleep(0)
+        return [cache.get(("driver", "u1")) for cache in caches], managers[1].backplane.published
+
+    values, published_by_b = asyncio.run(scenario())
+    assert values == [None, None]
+    # Received invalidations are not published again
+    assert published_by_b == 0
@@ -0,0 +1,168 @@
+import asyncio
+
+from rides.websocket import cluster
+from rides.websocket.backplane import InProcessBackplane
+from rides.websocket.cluster import ClusterDirectory, HashRing
+
+USERS = [f"user-{n}" for n in range(2000)]
+
+def test_ring_is_deterministic_and_uses_every_node():
+    ring = HashRing(["a", "b", "c"])
+    owners = {user: ring.owner(user) for user in USERS}
+    reordered = HashRing(["c", "b", "a"])
+    assert owners == {user: reordered.owner(user) for user in USERS}
+    assert set(owners.values()) == {"a", "b", "c"}
+    assert HashRing().owner("user-1") is None
+
+def test_adding_a_node_only_moves_keys_to_it():
+    ring = HashRing(["a", "b", "c"])
+    before = {user: ring.owner(user) for user in USERS}
+    ring.add("d")
+    moved = [user for user in USERS if ring.owner(user) != before[user]]
+
+    assert all(ring.owner(user) == "d" for user in moved)
+    # Roughly the new node's share, not a reshuffle
+    assert len(USERS) * 0.15 < len(moved) < len(USERS) * 0.35
+
+def test_removing_a_node_only_moves_its_keys():
+    ring = HashRing(["a", "b", "c"])
+    before = {user: ring.owner(user) for user in USERS}
+    ring.remove("b")
+    for user in USERS:
+        if before[user] != "b":
+            assert ring.owner(user) == before[user]
+        else:
+            assert ring.owner(user) in ("a", "c")
+
+class Worker:
+    """A directory on an in-process backplane, with its local users and inbox"""
+
+    def __init__(self, hub, worker_id):
+        self.users = set()
+        self.delivered = []
+        self.rooms = []
+        self.backplane = InProcessBackplane(hub, worker_id)
+        self.directory = ClusterDirectory(self.backplane, self.deliver, lambda: list(self.users))
+
+    def deliver(self, user_id, frame, room=None):
+        if user_id not in self.users:
+            return False
+        self.delivered.append((user_id, frame))
+        self.rooms.append(room)
+        return True
+
+    async def start(self):
+        await self.backplane.start(self.on_envelope)
+        await self.directory.start()
+
+    def on_envelope(self, envelope):
+        if envelope["kind"] == "users":
+            for user_id in envelope["targets"]:
+                self.deliver(user_id, envelope["frame"], envelope.get("room"))
+        else:
+            self.directory.handle(envelope)
+
+    def connect(self, user_id):
+        self.users.add(user_id)
+        self.directory.user_connected(user_id)
+
+async def settle():
+    for _ in range(10):
+        await asyncio.sleep(0)
+
+def test_join_reannounces_users_to_their_new_owner_and_routes_point_to_point(monkeypatch):
+    async def scenario():
+        hub = set()
+        a, b = Worker(hub, "a"), Worker(hub, "b")
+        await a.start()
+        for user in USERS[:200]:
+            a.connect(user)
+        await b.start()
+        await settle()
+
+        # Every user held by a is known to its owner after the rebalance
+        for user in USERS[:200]:
+            owner = a if a.directory.ring.owner(user) == "a" else b
+            assert owner.directory.holders.get(user) == "a"
+
+        # Grace period over: b routes to a user held by a without a fan-out
+        monkeypatch.setattr(cluster, "REBALANCE_GRACE_SECONDS", 0)
+        target = next(user for user in USERS[:200] if a.directory.ring.owner(user) == "b")
+        b.directory.route([target], "frame")
+        await settle()
+        fallbacks = b.directory.fanout_fallbacks
+
+        await a.directory.stop()
+        await b.directory.stop()
+        return a.delivered, fallbacks
+
+    delivered, fallbacks = asyncio.run(scenario())
+    assert delivered[-1][1] == "frame"
+    assert fallbacks == 0
+
+def test_room_frames_keep_their_room_through_the_owner(monkeypatch):
+    async def scenario():
+        hub = set()
+        a, b, c = Worker(hub, "a"), Worker(hub, "b"), Worker(hub, "c")
+        for worker in (a, b, c):
+            await worker.start()
+        await settle()
+        # Held by a, owned by b, sent from c: sender -> owner -> holder
+        user = next(user for user in USERS if a.directory.ring.owner(user) == "b")
+        a.connect(user)
+        await settle()
+        monkeypatch.setattr(cluster, "REBALANCE_GRACE_SECONDS", 0)
+        c.directory.route([user], "update", {"ride_id": "ride-1"})
+        await settle()
+
+        for worker in (a, b, c):
+            await worker.directory.stop()
+        return a.delivered, a.rooms, b.delivered, c.delivered
+
+    held, rooms, owner, sender = asyncio.run(scenario())
+    assert held[-1][1] == "update" and rooms[-1] == {"ride_id": "ride-1"}
+    assert owner == [] and sender == []
+
+def test_unknown_user_fans_out_only_while_rebalancing(monkeypatch):
+    async def scenario():
+        hub = set()
+        a, b = Worker(hub, "a"), Worker(hub, "b")
+        await a.start()
+        await b.start()
+        await settle()
+        # Held by a, but its owner has not heard of it (not re-announced yet)
+        user = next(user for user in USERS if a.directory.ring.owner(user) == "b")
+        a.users.add(user)
+
+        b.directory.route([user], "during")
+        await settle()
+        monkeypatch.setattr(cluster, "REBALANCE_GRACE_SECONDS", 0)
+        b.directory.route([user], "after")
+        await settle()
+
+        await a.directory.stop()
+        await b.directory.stop()
+        return a.delivered
+
+    assert [frame for _, frame in asyncio.run(scenario())] == ["during"]
+
+def test_leaving_worker_drops_its_users_and_returns_its_share():
+    async def scenario():
+        hub = set()
+        a, b = Worker(hub, "a"), Worker(hub, "b")
+        await a.start()
+        await b.start()
+        await settle()
+        for user in USERS[:100]:
+            b.connect(user)
+        await settle()
+        await b.directory.stop()
+        await b.backplane.stop()
+        await settle()
+        ring_nodes, holders = set(a.directory.ring.nodes), dict(a.directory.holders)
+        await a.directory.stop()
+        return ring_nodes, holders
+
+    ring_nodes, holders = asyncio.run(scenario())
+    assert ring_nodes == {"a"}
+    assert "b" not in holders.values()
@@ -0,0 +1,310 @@
+import asyncio
+import json
+
+from rides.websocket.backplane import InProcessBackplane
+from rides.websocket.connection_manager import SLOW_CONSUMER_CLOSE_CODE, SUPERSEDED_CLOSE_CODE, ConnectionManager
+
+class FakeWebSocket:
+    """Records what the manager sends; `blocked` holds every send until released"""
+
+    def __init__(self):
+        self.sent = []
+        self.closed = None
+        self.blocked = None
+
+    async def accept(self, subprotocol=None):
+        pass
+
+    async def send_text(self, frame):
+        if self.blocked is not None:
+            await self.blocked.wait()
+        self.sent.append(json.loads(frame))
+
+    async def send_bytes(self, frame):
+        if self.blocked is not None:
+            await self.blocked.wait()
+        self.sent.append(frame)
+
+    async def close(self, code=1000):
+        self.closed = code
+
+def make_manager(hub=None, worker_id="a", **kwargs):
+    return ConnectionManager(backplane=InProcessBackplane(hub if hub is not None else set(), worker_id), **kwargs)
+
+async def settle():
+    for _ in range(10):
+        await asyncio.sleep(0)
+
+def types(websocket):
+    return [frame["type"] for frame in websocket.sent]
+
+def test_subscriptions_keep_both_indexes_in_step():
+    async def scenario():
+        manager = make_manager()
+        await manager.connect(FakeWebSocket(), "u1")
+        await manager.connect(FakeWebSocket(), "u2")
+        manager.subscribe_to_ride("u1", "r1")
+        manager.subscribe_to_ride("u1", "r2")
+        manager.subscribe_to_ride("u2", "r1")
+        assert manager.ride_connections == {"r1": {"u1", "u2"}, "r2": {"u1"}}
+        assert manager.user_rides == {"u1": {"r1", "r2"}, "u2": {"r1"}}
+
+        manager.unsubscribe_from_ride("u1", "r2")
+        manager.unsubscribe_from_ride("u1", "missing")
+        # Empty rooms and users without rooms are not kept around
+        assert manager.ride_connections == {"r1": {"u1", "u2"}}
+        assert manager.user_rides == {"u1": {"r1"}, "u2": {"r1"}}
+
+        manager.disconnect("u1")
+        assert manager.ride_connections == {"r1": {"u2"}}
+        assert manager.user_rides == {"u2": {"r1"}}
+        manager.disconnect("u2")
+        manager.disconnect("u2")
+        return manager.room_stats()
+
+    stats = asyncio.run(scenario())
+    assert (stats["rooms"], stats["subscriptions"]) == (0, 0)
+
+def test_ride_update_reaches_only_the_room():
+    async def scenario():
+        manager = make_manager()
+        sockets = {user_id: FakeWebSocket() for user_id in ("u1", "u2", "u3")}
+        for user_id, websocket in sockets.items():
+            await manager.connect(websocket, user_id)
+        manager.subscribe_to_ride("u1", "r1")
+        manager.subscribe_to_ride("u2", "r1")
+        manager.subscribe_to_ride("u3", "r2")
+        await manager.send_ride_update("r1", {"type": "driver_location"})
+        await settle()
+        return {user_id: types(websocket) for user_id, websocket in sockets.items()}
+
+    assert asyncio.run(scenario()) == {"u1": ["driver_location"], "u2": ["driver_location"], "u3": []}
+
+async def stalled_rider(manager):
+    """A rider in room r1 whose socket accepts nothing until released; the
+    writer holds the first frame, so the queue fills from the second"""
+    websocket = FakeWebSocket()
+    websocket.blocked = asyncio.Event()
+    await manager.connect(websocket, "rider")
+    manager.subscribe_to_ride("rider", "r1")
+    await manager.send_personal_message({"type": "first"}, "rider", replay=False)
+    await settle()
+    return websocket
+
+def test_drop_policy_discards_superseded_locations_first():
+    async def scenario():
+        manager = make_manager(max_queue=3, slow_consumer_policy="drop")
+        websocket = await stalled_rider(manager)
+        await manager.send_ride_update("r1", {"type": "location", "n": 1}, coalescible=True)
+        await manager.send_personal_message({"type": "ride_started"}, "rider")
+        await manager.send_ride_update("r1", {"type": "location", "n": 2}, coalescible=True)
+        # Full: the oldest location makes room for the newest
+        await manager.send_ride_update("r1", {"type": "location", "n": 3}, coalescible=True)
+        websocket.blocked.set()
+        await settle()
+        return websocket, manager
+
+    websocket, manager = asyncio.run(scenario())
+    assert [(frame["type"], frame.get("n")) for frame in websocket.sent] == [
+        ("first", None), ("ride_started", None), ("location", 2), ("location", 3)
+    ]
+    assert websocket.closed is None
+    assert manager.frames_dropped == 1
+
+def test_drop_policy_drops_an_incoming_location_rather_than_a_message():
+    async def scenario():
+        manager = make_manager(max_queue=2, slow_consumer_policy="drop")
+        websocket = await stalled_rider(manager)
+        await manager.send_personal_message({"type": "a"}, "rider")
+        await manager.send_personal_message({"type": "b"}, "rider")
+        await manager.send_ride_update("r1", {"type": "location"}, coalescible=True)
+        websocket.blocked.set()
+        await settle()
+        return websocket, manager
+
+    websocket, manager = asyncio.run(scenario())
+    assert types(websocket) == ["first", "a", "b"]
+    assert (manager.frames_dropped, websocket.closed) == (1, None)
+
+def test_drop_policy_closes_rather_than_lose_a_sequenced_message():
+    async def scenario():
+        manager = make_manager(max_queue=2, slow_consumer_policy="drop")
+        websocket = await stalled_rider(manager)
+        await manager.send_personal_message({"type": "a"}, "rider")
+        await manager.send_personal_message({"type": "b"}, "rider")
+        await manager.send_personal_message({"type": "c"}, "rider")
+        await settle()
+        return websocket, manager
+
+    websocket, manager = asyncio.run(scenario())
+    assert websocket.closed == SLOW_CONSUMER_CLOSE_CODE
+    assert "rider" not in manager.active_connections
+    assert (manager.frames_dropped, manager.slow_consumers_closed) == (0, 1)
+    # Still replayable once the client reconnects and resumes
+    assert manager.replay.stats()["buffered_frames"] == 3
+
+def test_close_policy_closes_on_any_overflow():
+    async def scenario():
+        manager = make_manager(max_queue=1, slow_consumer_policy="close")
+        websocket = await stalled_rider(manager)
+        await manager.send_ride_update("r1", {"type": "location"}, coalescible=True)
+        await manager.send_ride_update("r1", {"type": "location"}, coalescible=True)
+        await settle()
+        return websocket, manager
+
+    websocket, manager = asyncio.run(scenario())
+    assert websocket.closed == SLOW_CONSUMER_CLOSE_CODE
+    assert manager.frames_dropped == 0
+
+def test_reconnect_from_a_device_supersedes_its_old_socket():
+    async def scenario():
+        manager = make_manager()
+        phone, tablet, phone_again = FakeWebSocket(), FakeWebSocket(), FakeWebSocket()
+        await manager.connect(phone, "u1", "phone")
+        await manager.connect(tablet, "u1", "tablet")
+        manager.subscribe_to_ride("u1", "r1")
+        await manager.connect(phone_again, "u1", "phone")
+        await manager.send_personal_message({"type": "hello"}, "u1")
+        await settle()
+        return manager, phone, tablet, phone_again
+
+    manager, phone, tablet, phone_again = asyncio.run(scenario())
+    assert phone.closed == SUPERSEDED_CLOSE_CODE
+    assert types(phone) == []
+    assert types(tablet) == types(phone_again) == ["hello"]
+    assert [c.device_id for c in manager.active_connections["u1"].values()] == ["tablet", "phone"]
+    # The user never fully disconnected, so keeps their rooms
+    assert manager.user_rides == {"u1": {"r1"}}
+    assert manager.superseded_closed == 1
+
+def test_oldest_socket_is_evicted_past_the_per_user_limit():
+    async def scenario():
+        manager = make_manager(max_connections_per_user=2)
+        sockets = [FakeWebSocket() for _ in range(3)]
+        for websocket in sockets:
+            await manager.connect(websocket, "u1")
+        await settle()
+        return manager, sockets
+
+    manager, sockets = asyncio.run(scenario())
+    assert [websocket.closed for websocket in sockets] == [SUPERSEDED_CLOSE_CODE, None, None]
+    assert len(manager.active_connections["u1"]) == 2
+
+def test_disconnecting_one_device_keeps_the_others():
+    async def scenario():
+        manager = make_manager()
+        await manager.connect(FakeWebSocket(), "u1", "phone")
+        tablet_id = await manager.connect(FakeWebSocket(), "u1", "tablet")
+        manager.subscribe_to_ride("u1", "r1")
+        manager.disconnect("u1", tablet_id)
+        still_subscribed = dict(manager.user_rides)
+        manager.disconnect("u1")
+        return still_subscribed, manager
+
+    still_subscribed, manager = asyncio.run(scenario())
+    assert still_subscribed == {"u1": {"r1"}}
+    assert manager.active_connections == {} and manager.ride_connections == {}
+
+async def start_workers(hub, *worker_ids):
+    managers = [make_manager(hub, worker_id) for worker_id in worker_ids]
+    for manager in managers:
+        await manager.backplane.start(manager._on_backplane_envelope)
+        await manager.directory.start()
+    await settle()
+    return managers
+
+async def stop_workers(*managers):
+    for manager in managers:
+        await manager.directory.stop()
+
+def test_open_room_subscribes_participants_on_every_worker_and_on_reconnect():
+    async def scenario():
+        a, b = await start_workers(set(), "a", "b")
+        rider, driver = FakeWebSocket(), FakeWebSocket()
+        await a.connect(rider, "rider")
+        a.open_ride_room("r1", ["rider", "driver"])
+        await settle()
+        # The driver connects to the other worker after the ride was confirmed
+        await b.connect(driver, "driver")
+        await settle()
+        await a.send_ride_update("r1", {"type": "driver_location"})
+        await settle()
+        await stop_workers(a, b)
+        return a, b, rider, driver
+
+    a, b, rider, driver = asyncio.run(scenario())
+    assert a.user_rides == {"rider": {"r1"}} and b.user_rides == {"driver": {"r1"}}
+    assert types(rider) == types(driver) == ["driver_location"]
+
+def test_room_frames_are_routed_to_subscribed_participants_only():
+    async def scenario():
+        a, b, c = await start_workers(set(), "a", "b", "c")
+        driver, bystander = FakeWebSocket(), FakeWebSocket()
+        await b.connect(driver, "driver")
+        await c.connect(bystander, "bystander")
+        await settle()
+        a.open_ride_room("r1", ["rider", "driver"])
+        await settle()
+        await a.send_ride_update("r1", {"type": "driver_location"})
+        await settle()
+        b.unsubscribe_from_ride("driver", "r1")
+        await a.send_ride_update("r1", {"type": "driver_location"})
+        await settle()
+        await stop_workers(a, b, c)
+        return driver, bystander
+
+    driver, bystander = asyncio.run(scenario())
+    assert types(driver) == ["driver_location"]
+    assert types(bystander) == []
+
+def test_close_room_sends_its_final_message_then_unsubscribes_everywhere():
+    async def scenario():
+        a, b = await start_workers(set(), "a", "b")
+        rider, driver = FakeWebSocket(), FakeWebSocket()
+        await a.connect(rider, "rider")
+        await b.connect(driver, "driver")
+        # Joined on its own before the room was opened on the other worker
+        b.subscribe_to_ride("driver", "r1")
+        await settle()
+        a.open_ride_room("r1", ["rider", "driver"])
+        await settle()
+        await a.close_ride_room("r1", {"type": "ride_room_closed"})
+        await settle()
+        await a.send_ride_update("r1", {"type": "driver_location"})
+        await settle()
+        await stop_workers(a, b)
+        return a, b, rider, driver
+
+    a, b, rider, driver = asyncio.run(scenario())
+    assert types(rider) == types(driver) == ["ride_room_closed"]
+    for manager in (a, b):
+        assert manager.room_participants == {} and manager.ride_connections == {}
+        assert manager.participant_rooms == {} and manager.user_rides == {}
+
+class FakeRideRepository:
+    def __init__(self, live):
+        self.live = live
+        self.batches = []
+
+    def get_ride_ids_in_status(self, ride_ids, statuses):
+        self.batches.append(list(ride_ids))
+        return [ride_id for ride_id in ride_ids if ride_id in self.live]
+
+def test_sweep_closes_rooms_whose_ride_has_ended():
+    async def scenario():
+        manager = make_manager()
+        manager._ride_repo = FakeRideRepository(live={"live"})
+        await manager.connect(FakeWebSocket(), "rider")
+        manager.open_ride_room("live", ["rider", "driver"])
+        manager.open_ride_room("missed_close", ["rider", "driver"])
+        manager.subscribe_to_ride("rider", "self_joined")
+        swept = await manager.sweep_orphan_rooms(batch_size=2)
+        return manager, swept
+
+    manager, swept = asyncio.run(scenario())
+    assert swept == 2
+    assert set(manager.room_participants) == {"live"} and set(manager.ride_connections) == {"live"}
+    assert manager.participant_rooms == {"rider": {"live"}, "driver": {"live"}}
+    assert manager.user_rides == {"rider": {"live"}}
+    assert [len(batch) for batch in manager._ride_repo.batches] == [2, 1]
+    assert manager.room_stats()["orphan_rooms_swept"] == 2
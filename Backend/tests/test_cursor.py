@@ -0,0 +1,34 @@
+import base64
+
+import pytest
+
+from shared.utils import decode_cursor, encode_cursor
+
+RIDE_ID = "0ddfeef4-ec3f-43e1-a64c-70fe00a6c374"
+
+def forge(raw: str) -> str:
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii")
+
+def test_cursor_round_trips_a_keyset_position():
+    cursor = encode_cursor("2026-10-19T06:13:51.429151", RIDE_ID)
+    assert decode_cursor(cursor) == ("2026-10-19T06:13:51.429151", RIDE_ID)
+    assert decode_cursor(None) is None
+    assert decode_cursor("") is None
+
+def test_decoded_position_is_canonical():
+    cursor = forge(f"2026-10-19T06:13:51+00:00|{RIDE_ID.upper()}")
+    assert decode_cursor(cursor) == ("2026-10-19T06:13:51+00:00", RIDE_ID)
+
+@pytest.mark.parametrize("cursor", [
+    "not base64!",
+    forge("no separator"),
+    forge(f"yesterday|{RIDE_ID}"),
+    forge("2026-10-19T06:13:51|not-a-uuid"),
+    # Filter syntax smuggled into either half of the position
+    forge(f"2026-10-19T06:13:51),or(user_id.neq.x|{RIDE_ID}"),
+    forge(f"2026-10-19T06:13:51|{RIDE_ID}),or(status.eq.pending"),
+    forge(f"2026-10-19T06:13:51|{RIDE_ID}|{RIDE_ID}"),
+])
+def test_tampered_cursors_are_rejected(cursor):
+    with pytest.raises(ValueError):
+        decode_cursor(cursor)
@@ -0,0 +1,122 @@
+import asyncio
+import math
+
+import pytest
+
+from rides import dispatch
+from rides.dispatch import RideDispatcher
+from rides.websocket.backplane import InProcessBackplane
+from rides.websocket.connection_manager import ConnectionManager
+from shared.grid_index import KM_PER_DEGREE
+
+PICKUP = (23.785, 90.405)
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+class FakeRides:
+    def __init__(self):
+        self.answered = set()
+
+    def get_ride_ids_in_status(self, ride_ids, statuses):
+        return [ride_id for ride_id in ride_ids if ride_id not in self.answered]
+
+class FakeApplications:
+    def get_ride_ids_with_applications(self, ride_ids):
+        return set()
+
+def east_of_pickup(km):
+    latitude, longitude = PICKUP
+    return latitude, longitude + km / (KM_PER_DEGREE * math.cos(math.radians(latitude)))
+
+@pytest.fixture
+def world(monkeypatch):
+    """A dispatcher on a fake clock, and a worker whose drivers stand at known
+    distances east of the pickup (plus one that never reported a position)"""
+    manager = ConnectionManager(backplane=InProcessBackplane(set(), "a"))
+    monkeypatch.setattr(dispatch, "connection_manager", manager)
+    offers = []
+
+    async def broadcast_to_drivers(message, driver_ids):
+        if driver_ids:
+            offers.append(sorted(driver_ids))
+
+    manager.broadcast_to_drivers = broadcast_to_drivers
+    clock = FakeClock()
+    dispatcher = RideDispatcher(radii_km=[2, 5, 10], step_seconds=20, clock=clock)
+    dispatcher.ride_repo, dispatcher.app_repo = FakeRides(), FakeApplications()
+
+    def place(driver_id, km=None):
+        manager.presence.handle({"kind": "driver", "op": "up", "driver": driver_id, "holder": "b",
+                                 "busy": False, "as_of": 1.0})
+        if km is not None:
+            cell = manager.presence.cells.cell_of(*east_of_pickup(km))
+            manager.presence.handle({"kind": "driver", "op": "cell", "driver": driver_id, "cell": list(cell)})
+
+    return dispatcher, clock, offers, place, manager
+
+async def step(dispatcher, clock):
+    clock.now += dispatcher.step_seconds
+    await dispatcher._widen(dispatcher.wheel.advance())
+
+def test_search_widens_through_the_radii_then_falls_back_to_everyone(world):
+    dispatcher, clock, offers, place, _ = world
+    for driver_id, km in (("near", 1), ("mid", 4), ("far", 8), ("edge", 9.7), ("outside", 30)):
+        place(driver_id, km)
+    place("unlocated")
+
+    async def scenario():
+        await dispatcher.dispatch("ride", {"type": "new_ride_request"}, *PICKUP)
+        for _ in range(4):
+            await step(dispatcher, clock)
+
+    asyncio.run(scenario())
+    # 9.7 km due east is past 9 cells north-south, but inside the 10 km radius
+    assert offers == [["near"], ["mid"], ["edge", "far"], ["outside", "unlocated"]]
+    assert dispatcher.stats()["active_searches"] == 0
+    assert dispatcher.stats()["fallback_offers"] == 1
+
+def test_empty_radii_are_skipped_at_once(world):
+    dispatcher, clock, offers, place, _ = world
+    place("far", 8)
+
+    async def scenario():
+        await dispatcher.dispatch("ride", {"type": "new_ride_request"}, *PICKUP)
+        await step(dispatcher, clock)
+
+    asyncio.run(scenario())
+    # Nobody within 2 or 5 km: the 10 km step goes out immediately, and the
+    # fallback finds nobody new
+    assert offers == [["far"]]
+    assert dispatcher.stats()["active_searches"] == 0
+
+def test_busy_drivers_are_not_offered_the_ride(world):
+    dispatcher, clock, offers, place, manager = world
+    place("near", 1)
+    place("busy", 1)
+    manager.presence.handle({"kind": "driver", "op": "busy", "driver": "busy", "busy": True, "as_of": 2.0})
+
+    asyncio.run(dispatcher.dispatch("ride", {"type": "new_ride_request"}, *PICKUP))
+    assert offers == [["near"]]
+
+def test_search_stops_once_answered_or_ended(world):
+    dispatcher, clock, offers, place, _ = world
+    place("near", 1)
+    place("mid", 4)
+
+    async def scenario():
+        await dispatcher.dispatch("answered", {"type": "new_ride_request"}, *PICKUP)
+        await dispatcher.dispatch("ended", {"type": "new_ride_request"}, *PICKUP)
+        # Applied for on another worker, and confirmed on this one
+        dispatcher.ride_repo.answered.add("answered")
+        dispatcher.end_search("ended")
+        await step(dispatcher, clock)
+
+    asyncio.run(scenario())
+    assert offers == [["near"], ["near"]]
+    assert dispatcher.stats()["searches_answered"] == 1
+    assert dispatcher.stats()["active_searches"] == 0
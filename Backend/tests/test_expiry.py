@@ -0,0 +1,80 @@
+import asyncio
+from types import SimpleNamespace
+
+from rides import expiry
+from rides.expiry import RideExpirySweeper
+
+class FakeRides:
+    def __init__(self, statuses):
+        self.statuses = statuses
+
+    def update_rides_in_status(self, ride_ids, updates, status):
+        updated = [ride_id for ride_id in ride_ids if self.statuses.get(ride_id) == status]
+        for ride_id in updated:
+            self.statuses[ride_id] = updates["status"]
+        return [SimpleNamespace(ride_id=ride_id, user_id=f"rider-{ride_id}") for ride_id in updated]
+
+class FakeApplications:
+    def __init__(self, applications):
+        self.applications = applications
+        self.failures = 0
+
+    def delete_applications_for_rides(self, ride_ids):
+        if self.failures:
+            self.failures -= 1
+            raise RuntimeError("database unavailable")
+        deleted = [app for app in self.applications if app.ride_id in ride_ids]
+        self.applications = [app for app in self.applications if app.ride_id not in ride_ids]
+        return deleted
+
+class FakeEvents:
+    def __init__(self):
+        self.events = []
+
+    def append_events(self, events):
+        self.events.extend(events)
+        return events
+
+def make_sweeper(monkeypatch, statuses, applications):
+    sent = []
+
+    async def send_personal_message(message, user_id, replay=True):
+        sent.append((message["type"], user_id))
+
+    monkeypatch.setattr(expiry.connection_manager, "send_personal_message", send_personal_message)
+    sweeper = RideExpirySweeper(ttl_seconds=60, retry_seconds=0)
+    sweeper.ride_repo = FakeRides(statuses)
+    sweeper.app_repo = FakeApplications(applications)
+    sweeper.event_repo = FakeEvents()
+    return sweeper, sent
+
+def application(ride_id, driver_id):
+    return SimpleNamespace(ride_id=ride_id, driver_id=driver_id)
+
+def test_expiry_cancels_only_pending_rides_and_notifies_everyone(monkeypatch):
+    sweeper, sent = make_sweeper(monkeypatch, {"r1": "pending", "r2": "confirmed"},
+                                 [application("r1", "d1"), application("r2", "d2")])
+
+    assert asyncio.run(sweeper.expire_rides(["r1", "r2"])) == 1
+    assert sweeper.ride_repo.statuses == {"r1": "cancelled", "r2": "confirmed"}
+    assert sent == [("ride_expired", "rider-r1"), ("ride_unavailable", "d1")]
+    assert [event["ride_id"] for event in sweeper.event_repo.events] == ["r1"]
+    assert [app.ride_id for app in sweeper.app_repo.applications] == ["r2"]
+
+def test_failed_cleanup_is_retried_without_the_cancel(monkeypatch):
+    sweeper, sent = make_sweeper(monkeypatch, {"r1": "pending"}, [application("r1", "d1")])
+    sweeper.app_repo.failures = 1
+
+    assert asyncio.run(sweeper.expire_rides(["r1"])) == 1
+    # The ride is cancelled and its rider told; its applicants are not yet
+    assert sent == [("ride_expired", "rider-r1")]
+    assert sweeper.stats()["unfinished_cleanups"] == 1
+
+    # A retried sweep no longer finds the ride pending...
+    assert asyncio.run(sweeper.expire_rides(["r1"])) == 0
+    # ...but the recorded cleanup still runs
+    asyncio.run(sweeper.retry_unfinished())
+    assert sent == [("ride_expired", "rider-r1"), ("ride_unavailable", "d1")]
+    assert sweeper.app_repo.applications == []
+    assert sweeper.stats()["unfinished_cleanups"] == 0
+    assert len(sweeper.event_repo.events) == 1
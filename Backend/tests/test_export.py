@@ -0,0 +1,62 @@
+import csv
+import io
+import json
+
+from rides.export import RIDE_EXPORT_COLUMNS, iter_csv, iter_ndjson
+from rides.repositories.ride_repository import RideRepository
+
+TRICKY = {
+    "ride_id": "r1",
+    "user_id": "u1",
+    "pickup": 'Road 5, "Green" Villa\nGate 2',
+    "drop": "Gulshan-2, ঢাকা",
+    "fare": 187.35,
+    "cancel_reason": None,
+    "extra": "not exported"
+}
+
+def test_ndjson_writes_one_escaped_object_per_line():
+    lines = list(iter_ndjson([TRICKY, {"ride_id": "r2"}]))
+    assert all(line.endswith("\n") and line.count("\n") == 1 for line in lines)
+    first = json.loads(lines[0])
+    assert list(first) == RIDE_EXPORT_COLUMNS
+    assert (first["pickup"], first["drop"], first["fare"]) == (TRICKY["pickup"], TRICKY["drop"], 187.35)
+    assert first["cancel_reason"] is None and "extra" not in first
+
+def test_csv_quotes_separators_quotes_and_newlines():
+    chunks = list(iter_csv([TRICKY, {"ride_id": "r2"}]))
+    assert len(chunks) == 3  # header, then one chunk per ride
+    rows = list(csv.reader(io.StringIO("".join(chunks))))
+    assert rows[0] == RIDE_EXPORT_COLUMNS
+    row = dict(zip(RIDE_EXPORT_COLUMNS, rows[1]))
+    assert (row["pickup"], row["drop"], row["fare"]) == (TRICKY["pickup"], TRICKY["drop"], "187.35")
+    assert row["cancel_reason"] == "" and row["driver_id"] == ""
+    assert rows[2][0] == "r2"
+
+def test_export_reads_one_page_at_a_time():
+    repo = RideRepository(None)
+    pages = [
+        [{"ride_id": f"r{n}", "created_at": f"2026-01-0{n}"} for n in (1, 2)],
+        [{"ride_id": f"r{n}", "created_at": f"2026-01-0{n}"} for n in (3, 4)],
+        [{"ride_id": "r5", "created_at": "2026-01-05"}]
+    ]
+    requests = []
+
+    def get_rides_page(column, participant_id, limit, after, **filters):
+        requests.append(after)
+        return pages[len(requests) - 1]
+
+    repo.get_rides_page = get_rides_page
+    lines = iter_ndjson(repo.iter_rides("user_id", "u1", chunk_size=2))
+
+    # Lazy: nothing is read until the response asks for the first line
+    assert requests == []
+    next(lines)
+    assert requests == [None]
+    next(lines)
+    next(lines)
+    # The next page starts after the last row of the previous one
+    assert requests == [None, ("2026-01-02", "r2")]
+    assert [json.loads(line)["ride_id"] for line in lines] == ["r4", "r5"]
+    # A short page ends the export without another query
+    assert requests == [None, ("2026-01-02", "r2"), ("2026-01-04", "r4")]
@@ -0,0 +1,92 @@
+import math
+
+from shared.grid_index import KM_PER_DEGREE, GridIndex
+
+def test_cells_are_floor_divisions_of_the_coordinates():
+    grid = GridIndex(cell_degrees=0.01)
+    assert grid.cell_of(23.7806, 90.4070) == (2378, 9040)
+    assert grid.cell_of(-0.005, -0.005) == (-1, -1)
+
+def test_rings_cover_the_radius_at_the_equator():
+    grid = GridIndex(cell_degrees=0.01)
+    cell_km = 0.01 * KM_PER_DEGREE
+    assert grid.rings_for(0, (0, 0)) == (0, 0)
+    assert grid.rings_for(cell_km * 1.01, (0, 0)) == (2, 2)
+    rows, columns = grid.rings_for(5, (0, 0))
+    assert rows * cell_km >= 5
+    assert columns == rows
+
+def test_columns_widen_with_latitude():
+    grid = GridIndex(cell_degrees=0.01)
+    cell_km = 0.01 * KM_PER_DEGREE
+    for latitude in (23.78, -23.78, 60.0):
+        center = grid.cell_of(latitude, 90.0)
+        rows, columns = grid.rings_for(10, center)
+        assert rows == math.ceil(10 / cell_km)
+        # Even the searched row farthest from the equator spans 10 km east-west
+        farthest = max(abs(center[0] - rows), abs(center[0] + rows + 1)) * 0.01
+        assert columns * cell_km * math.cos(math.radians(farthest)) >= 10
+    assert grid.rings_for(10, grid.cell_of(60.0, 0.0))[1] >= 2 * rows
+
+def test_within_reaches_the_radius_east_west_away_from_the_equator():
+    grid = GridIndex(cell_degrees=0.01)
+    latitude, longitude = 23.785, 90.405
+    # 9.9 km is under 9 cells north-south, but over 9.7 cells east-west here
+    east = longitude + 9.9 / (KM_PER_DEGREE * math.cos(math.radians(latitude)))
+    grid.place("east", grid.cell_of(latitude, east))
+    grid.place("west", grid.cell_of(latitude, 2 * longitude - east))
+    center = grid.cell_of(latitude, longitude)
+
+    square = math.ceil(10 / (0.01 * KM_PER_DEGREE))
+    assert list(grid.within(center, square)) == []
+    rows, columns = grid.rings_for(10, center)
+    assert rows == square and columns > rows
+    assert set(grid.within(center, rows, columns)) == {"east", "west"}
+
+def test_place_moves_a_key_between_cells():
+    grid = GridIndex()
+    assert grid.place("d1", (0, 0)) is True
+    assert grid.place("d1", (0, 0)) is False
+    assert grid.place("d1", (3, 4)) is True
+    assert grid.cell("d1") == (3, 4)
+    assert list(grid.within((0, 0), 0)) == []
+    assert grid.stats()["occupied_cells"] == 1
+
+    grid.remove("d1")
+    grid.remove("d1")
+    assert "d1" not in grid
+    assert grid.stats()["occupied_cells"] == 0
+
+def test_ring_visits_exactly_the_cells_at_that_distance():
+    grid = GridIndex()
+    for row in range(-3, 4):
+        for column in range(-3, 4):
+            grid.place((row, column), (row, column))
+
+    for k in range(4):
+        expected = {(row, column) for row in range(-3, 4) for column in range(-3, 4)
+                    if max(abs(row), abs(column)) == k}
+        found = list(grid.ring((0, 0), k))
+        assert len(found) == len(expected)  # no cell visited twice
+        assert set(found) == expected
+
+def test_within_returns_nearest_rings_first():
+    grid = GridIndex()
+    grid.place("far", (5, -5))
+    grid.place("near", (1, 0))
+    grid.place("here", (0, 0))
+    grid.place("outside", (9, 0))
+
+    assert list(grid.within((0, 0), 5)) == ["here", "near", "far"]
+
+def test_rectangular_search_visits_each_cell_once():
+    grid = GridIndex()
+    for row in range(-4, 5):
+        for column in range(-4, 5):
+            grid.place((row, column), (row, column))
+
+    found = list(grid.within((0, 0), 2, 4))
+    assert len(found) == len(set(found))
+    assert set(found) == {(row, column) for row in range(-2, 3) for column in range(-4, 5)}
+    steps = [set(grid.ring((0, 0), k, 2, 4)) for k in range(5)]
+    assert steps[3] == {(row, column) for row in range(-2, 3) for column in (-3, 3)}
@@ -0,0 +1,187 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+from fastapi import HTTPException
+
+from shared.idempotency import IdempotencyStore
+
+class FakeQuery:
+    """The part of the Supabase query builder IdempotencyStore uses"""
+
+    def __init__(self, rows):
+        self.rows = rows
+        self.operation = None
+        self.payload = None
+        self.filters = []
+        self.conflict_columns = []
+
+    def upsert(self, data, on_conflict, ignore_duplicates):
+        assert ignore_duplicates
+        self.operation, self.payload = "upsert", data
+        self.conflict_columns = on_conflict.split(",")
+        return self
+
+    def select(self, columns):
+        self.operation = "select"
+        return self
+
+    def update(self, data):
+        self.operation, self.payload = "update", data
+        return self
+
+    def delete(self):
+        self.operation = "delete"
+        return self
+
+    def eq(self, column, value):
+        self.filters.append(lambda row: row[column] == value)
+        return self
+
+    def lt(self, column, value):
+        self.filters.append(lambda row: row[column] < value)
+        return self
+
+    def execute(self):
+        if self.operation == "upsert":
+            if any(all(row[c] == self.payload[c] for c in self.conflict_columns) for row in self.rows):
+                return SimpleNamespace(data=[])
+            self.rows.append(dict(self.payload))
+            return SimpleNamespace(data=[dict(self.payload)])
+        matched = [row for row in self.rows if all(match(row) for match in self.filters)]
+        if self.operation == "update":
+            for row in matched:
+                row.update(self.payload)
+        elif self.operation == "delete":
+            self.rows[:] = [row for row in self.rows if row not in matched]
+        return SimpleNamespace(data=[dict(row) for row in matched])
+
+class FakeClient:
+    def __init__(self):
+        self.rows = []
+
+    def table(self, name):
+        assert name == "idempotency_keys"
+        return FakeQuery(self.rows)
+
+@pytest.fixture
+def client():
+    return FakeClient()
+
+class Counter:
+    def __init__(self):
+        self.calls = 0
+
+    def __call__(self):
+        self.calls += 1
+        return {"ride_id": "r1", "call": self.calls}
+
+def test_without_key_the_operation_always_runs(client):
+    operation = Counter()
+    store = IdempotencyStore(client)
+    store.run("u1", "rides.create", None, {}, operation)
+    store.run("u1", "rides.create", None, {}, operation)
+    assert operation.calls == 2
+    assert client.rows == []
+
+def test_retry_on_another_worker_gets_the_stored_response(client):
+    operation = Counter()
+    first, second = IdempotencyStore(client), IdempotencyStore(client)
+    assert first.run("u1", "rides.create", "k", {"pickup": "a"}, operation) == {"ride_id": "r1", "call": 1}
+    assert second.run("u1", "rides.create", "k", {"pickup": "a"}, operation) == {"ride_id": "r1", "call": 1}
+    assert operation.calls == 1
+
+def test_keys_are_scoped_by_user_and_operation(client):
+    operation = Counter()
+    store = IdempotencyStore(client)
+    store.run("u1", "rides.create", "k", {}, operation)
+    store.run("u2", "rides.create", "k", {}, operation)
+    store.run("u1", "rides.apply", "k", {}, operation)
+    assert operation.calls == 3
+
+def test_reusing_a_key_with_another_payload_is_rejected(client):
+    store = IdempotencyStore(client)
+    store.run("u1", "rides.create", "k", {"pickup": "a"}, Counter())
+    with pytest.raises(HTTPException) as raised:
+        store.run("u1", "rides.create", "k", {"pickup": "b"}, Counter())
+    assert raised.value.status_code == 422
+
+def test_retry_while_in_flight_is_rejected(client):
+    store = IdempotencyStore(client)
+
+    def operation():
+        with pytest.raises(HTTPException) as raised:
+            IdempotencyStore(client).run("u1", "rides.create", "k", {}, Counter())
+        assert raised.value.status_code == 409
+        return {"ok": True}
+
+    assert store.run("u1", "rides.create", "k", {}, operation) == {"ok": True}
+
+def test_failed_operation_releases_its_key(client):
+    store = IdempotencyStore(client)
+
+    def failing():
+        raise RuntimeError("database down")
+
+    with pytest.raises(RuntimeError):
+        store.run("u1", "rides.create", "k", {}, failing)
+    assert client.rows == []
+    assert store.run("u1", "rides.create", "k", {}, Counter())["call"] == 1
+
+def test_abandoned_in_flight_key_can_be_claimed_again(client):
+    store = IdempotencyStore(client, in_flight_timeout_seconds=300)
+    store._claim(("u1", "rides.create", "k"), store.fingerprint({}))
+    with pytest.raises(HTTPException):
+        store.run("u1", "rides.create", "k", {}, Counter())
+
+    client.rows[0]["expires_at"] = "2000-01-01T00:00:00+00:00"  # its worker died
+    assert store.run("u1", "rides.create", "k", {}, Counter()) == {"ride_id": "r1", "call": 1}
+
+def test_expired_completed_key_runs_the_operation_again(client):
+    operation = Counter()
+    store = IdempotencyStore(client)
+    store.run("u1", "rides.create", "k", {}, operation)
+    client.rows[0]["expires_at"] = "2000-01-01T00:00:00+00:00"
+    assert store.run("u1", "rides.create", "k", {}, operation)["call"] == 2
+
+def test_overlong_key_is_rejected(client):
+    with pytest.raises(HTTPException) as raised:
+        IdempotencyStore(client).run("u1", "rides.create", "k" * 256, {}, Counter())
+    assert raised.value.status_code == 400
+
+def test_run_async_stores_the_response(client):
+    store = IdempotencyStore(client)
+    calls = []
+
+    async def operation():
+        calls.append(1)
+        return {"message": "Applied"}
+
+    async def scenario():
+        first = await store.run_async("u1", "rides.apply", "k", {"ride_id": "r1"}, operation)
+        second = await store.run_async("u1", "rides.apply", "k", {"ride_id": "r1"}, operation)
+        return first, second
+
+    assert asyncio.run(scenario()) == ({"message": "Applied"}, {"message": "Applied"})
+    assert len(calls) == 1
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+def test_expired_keys_of_every_user_are_purged_periodically(client):
+    clock = FakeClock()
+    store = IdempotencyStore(client, purge_interval_seconds=300, clock=clock)
+    store.run("u1", "rides.create", "old", {}, Counter())
+    store.run("u2", "rides.create", "live", {}, Counter())
+    client.rows[0]["expires_at"] = "2000-01-01T00:00:00+00:00"
+
+    clock.now = 299
+    store.run("u3", "rides.create", "k", {}, Counter())
+    assert len(client.rows) == 3  # not due yet
+    clock.now = 300
+    store.run("u3", "rides.create", "k2", {}, Counter())
+    assert sorted(row["idempotency_key"] for row in client.rows) == ["k", "k2", "live"]
@@ -0,0 +1,93 @@
+import asyncio
+import threading
+
+from rides.websocket.backplane import InProcessBackplane
+from rides.websocket.presence import BUSY, OFFLINE, ONLINE, DriverPresence
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1_000_000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+def make_presence(connected, lookup=None, clock=None):
+    presence = DriverPresence(InProcessBackplane(set(), "a"), connected.__contains__, clock=clock or FakeClock())
+    if lookup is not None:
+        presence.bind(lookup)
+    return presence
+
+async def settle(presence):
+    for _ in range(100):
+        if not presence._pending:
+            return
+        await asyncio.sleep(0.001)
+
+def test_connected_drivers_are_available_until_busy():
+    async def scenario():
+        connected = {"driver", "rider"}
+        roles = {"driver": False, "rider": None}
+        presence = make_presence(connected, roles.get)
+        presence.user_connected("driver")
+        presence.user_connected("rider")
+        await settle(presence)
+        states = [set(presence.available), presence.status("driver"), presence.status("rider")]
+
+        presence.set_busy("driver", True)
+        states += [set(presence.available), presence.status("driver")]
+        presence.set_busy("driver", False)
+        states += [set(presence.available)]
+
+        connected.discard("driver")
+        presence.user_disconnected("driver")
+        states += [set(presence.available), presence.status("driver")]
+        return states
+
+    assert asyncio.run(scenario()) == [{"driver"}, ONLINE, OFFLINE, set(), BUSY, {"driver"}, set(), OFFLINE]
+
+def test_lookup_started_before_a_ride_ended_cannot_mark_the_driver_busy():
+    async def scenario():
+        clock = FakeClock()
+        read, release = threading.Event(), threading.Event()
+
+        def lookup(user_id):
+            # Reads "on a ride" from the database, then is held up
+            read.set()
+            release.wait(5)
+            return True
+
+        presence = make_presence({"driver"}, lookup, clock)
+        presence.user_connected("driver")
+        await asyncio.to_thread(read.wait, 5)
+        # The ride ends while the lookup's result is still in flight
+        clock.now += 1
+        presence.set_busy("driver", False)
+        release.set()
+        await settle(presence)
+        return presence
+
+    presence = asyncio.run(scenario())
+    assert presence.status("driver") == ONLINE
+    assert "driver" in presence.available
+
+def test_stale_busy_states_from_other_workers_are_ignored():
+    presence = make_presence(set())
+    presence.handle({"kind": "driver", "op": "up", "driver": "d1", "holder": "b", "busy": False, "as_of": 10.0})
+    presence.handle({"kind": "driver", "op": "busy", "driver": "d1", "busy": True, "as_of": 20.0})
+    # Delivered late: older than the state already applied
+    presence.handle({"kind": "driver", "op": "busy", "driver": "d1", "busy": False, "as_of": 15.0})
+    assert presence.status("d1") == BUSY and presence.available == set()
+
+    presence.handle({"kind": "driver", "op": "busy", "driver": "d1", "busy": False, "as_of": 25.0})
+    assert presence.available == {"d1"}
+
+def test_drivers_of_a_worker_that_left_go_offline():
+    presence = make_presence(set())
+    presence.handle({"kind": "driver", "op": "up", "driver": "d1", "holder": "b", "busy": False, "as_of": 1.0})
+    presence.handle({"kind": "driver", "op": "up", "driver": "d2", "holder": "c", "busy": False, "as_of": 1.0})
+    presence.handle({"kind": "driver", "op": "cell", "driver": "d1", "cell": [5, 5]})
+
+    presence.worker_left("b")
+    assert presence.available == {"d2"}
+    assert presence.status("d1") == OFFLINE
+    assert presence.cells.cell("d1") is None
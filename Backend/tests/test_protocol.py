@@ -0,0 +1,59 @@
+import math
+import uuid
+
+import pytest
+
+from rides.websocket import protocol
+from rides.websocket.protocol import (
+    BINARY_SUBPROTOCOL, MSG_DRIVER_LOCATION, decode_binary_message, encode_driver_location,
+    encode_location_update, negotiate_subprotocol
+)
+
+RIDE_ID = str(uuid.uuid4())
+DRIVER_ID = str(uuid.uuid4())
+
+def test_subprotocol_is_opt_in():
+    assert negotiate_subprotocol([]) is None
+    assert negotiate_subprotocol(["other", BINARY_SUBPROTOCOL]) == BINARY_SUBPROTOCOL
+
+def test_location_update_round_trips_to_the_json_message():
+    frame = encode_location_update(RIDE_ID, 23.7806, 90.407, heading=90.0, speed=12.5, recorded_at=1_700_000_000_000)
+    assert decode_binary_message(frame) == {
+        "type": "location_update",
+        "data": {
+            "ride_id": RIDE_ID,
+            "latitude": 23.7806,
+            "longitude": 90.407,
+            "heading": 90.0,
+            "speed": 12.5,
+            "recorded_at": 1_700_000_000_000
+        }
+    }
+
+def test_optional_fields_are_omitted_and_no_ride_decodes_to_none():
+    message = decode_binary_message(encode_location_update(None, 23.0, 90.0))
+    assert message["data"] == {"ride_id": None, "latitude": 23.0, "longitude": 90.0}
+
+@pytest.mark.parametrize("frame", [
+    b"",
+    bytes([protocol.MSG_DRIVER_LOCATION]) + bytes(60),  # server-to-client type
+    encode_location_update(RIDE_ID, 1.0, 2.0)[:-1],    # truncated
+])
+def test_malformed_frames_raise_value_error(frame):
+    with pytest.raises(ValueError):
+        decode_binary_message(frame)
+
+def test_driver_location_encodes_every_field():
+    frame = encode_driver_location({
+        "ride_id": RIDE_ID, "driver_id": DRIVER_ID, "latitude": 23.78, "longitude": 90.41,
+        "speed": 8.0, "recorded_at": 42
+    })
+    kind, ride, driver, latitude, longitude, heading, speed, recorded_at = protocol._DRIVER_LOCATION.unpack(frame)
+    assert kind == MSG_DRIVER_LOCATION
+    assert (str(uuid.UUID(bytes=ride)), str(uuid.UUID(bytes=driver))) == (RIDE_ID, DRIVER_ID)
+    assert (latitude, longitude, speed, recorded_at) == (23.78, 90.41, 8.0, 42)
+    assert math.isnan(heading)
+
+def test_driver_location_without_uuid_ids_falls_back_to_json():
+    assert encode_driver_location({"ride_id": "r1", "driver_id": DRIVER_ID, "latitude": 1.0, "longitude": 2.0}) is None
+    assert encode_driver_location({"ride_id": RIDE_ID, "driver_id": DRIVER_ID, "latitude": "north"}) is None
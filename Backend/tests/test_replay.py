@@ -0,0 +1,86 @@
+import pytest
+
+from rides.websocket.replay import ReplayStore
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1_000_000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+@pytest.fixture
+def clock():
+    return FakeClock()
+
+def record(store, user_id, text):
+    return store.record(user_id, lambda seq: f"{seq}:{text}")
+
+def seq_of(frame):
+    return int(frame.split(":")[0])
+
+def test_sequence_numbers_are_epoch_milliseconds_and_strictly_increase(clock):
+    store = ReplayStore(clock=clock)
+    clock.now += 1
+    first = seq_of(record(store, "u1", "a"))
+    second = seq_of(record(store, "u1", "b"))  # same millisecond
+    assert first == int(clock.now * 1000)
+    assert second == first + 1
+
+def test_since_returns_the_frames_after_last_seq(clock):
+    store = ReplayStore(clock=clock)
+    clock.now += 1
+    frames = []
+    for text in "abc":
+        frames.append(record(store, "u1", text))
+        clock.now += 1
+    assert store.since("u1", seq_of(frames[0])) == frames[1:]
+    assert store.since("u1", seq_of(frames[2])) == []
+
+def test_overflow_makes_older_positions_unreplayable(clock):
+    store = ReplayStore(size=2, clock=clock)
+    clock.now += 1
+    frames = [record(store, "u1", text) for text in "abc"]
+    assert store.since("u1", seq_of(frames[0])) == frames[1:]
+    assert store.since("u1", seq_of(frames[0]) - 1) is None
+
+def test_expire_drops_old_frames_and_empty_buffers(clock):
+    store = ReplayStore(ttl_seconds=300, clock=clock)
+    clock.now += 1
+    old = record(store, "u1", "old")
+    clock.now += 200
+    new = record(store, "u1", "new")
+    clock.now += 150
+    store.expire()
+
+    assert store.since("u1", seq_of(old)) == [new]
+    assert store.since("u1", seq_of(old) - 1) is None
+    clock.now += 300
+    store.expire()
+    assert store.stats()["buffers"] == 0
+
+def test_without_a_buffer_only_recent_positions_are_complete(clock):
+    store = ReplayStore(ttl_seconds=300, clock=clock)
+    clock.now += 400
+    now_ms = int(clock.now * 1000)
+    assert store.since("u1", now_ms - 100_000) == []
+    assert store.since("u1", now_ms - 301_000) is None
+
+def test_positions_from_before_the_store_started_need_a_resync(clock):
+    started_ms = int(clock.now * 1000)
+    store = ReplayStore(clock=clock)
+    clock.now += 10
+    assert store.since("u1", started_ms - 1) is None
+    assert store.since("u1", started_ms + 1) == []
+
+def test_ownership_change_invalidates_earlier_positions(clock):
+    store = ReplayStore(clock=clock)
+    clock.now += 10
+    last_seen = int(clock.now * 1000)
+    clock.now += 1
+    store.ownership_changed()  # the user may have been sequenced elsewhere meanwhile
+    clock.now += 1
+    frame = record(store, "u1", "after")
+
+    assert store.since("u1", last_seen) is None
+    assert store.since("u1", seq_of(frame) - 1) == [frame]
@@ -0,0 +1,70 @@
+from types import SimpleNamespace
+
+import pytest
+from fastapi import HTTPException
+
+from rides.domain.state_machine import TRANSITIONS, RideStateMachine
+
+class FakeRideRepository:
+    """update_ride_if with the same matching rule as the conditional update"""
+
+    def __init__(self, **rides):
+        self.rides = rides
+        self.reads = 0
+
+    def update_ride_if(self, ride_id, changes, from_statuses, actor_columns, actor_id):
+        ride = self.rides.get(ride_id)
+        if ride is None or ride.status not in from_statuses:
+            return None
+        if actor_id not in [getattr(ride, column) for column in actor_columns]:
+            return None
+        for column, value in changes.items():
+            setattr(ride, column, value)
+        return ride
+
+    def get_ride_by_id(self, ride_id):
+        self.reads += 1
+        return self.rides.get(ride_id)
+
+def make_machine(status="pending", driver_id="driver"):
+    repo = FakeRideRepository(r1=SimpleNamespace(ride_id="r1", user_id="rider", driver_id=driver_id, status=status))
+    return RideStateMachine(repo), repo
+
+def rejection(machine, action, actor_id, ride_id="r1"):
+    with pytest.raises(HTTPException) as raised:
+        machine.transition(ride_id, action, actor_id)
+    return raised.value.status_code, raised.value.detail
+
+def test_allowed_transition_applies_the_updates_without_a_read():
+    machine, repo = make_machine(status="confirmed")
+    ride = machine.transition("r1", "start", "driver", {"start_time": "now"})
+    assert (ride.status, ride.start_time) == ("ongoing", "now")
+    assert repo.reads == 0
+
+def test_wrong_status_is_a_bad_request():
+    machine, _ = make_machine(status="pending")
+    assert rejection(machine, "complete", "driver") == (400, TRANSITIONS["complete"].invalid_status_detail)
+
+def test_wrong_actor_is_forbidden_even_in_the_right_status():
+    machine, _ = make_machine(status="confirmed")
+    assert rejection(machine, "start", "rider") == (403, TRANSITIONS["start"].forbidden_detail)
+    # Both checks fail: the actor is reported first
+    assert rejection(machine, "complete", "someone") == (403, TRANSITIONS["complete"].forbidden_detail)
+
+def test_missing_ride_uses_the_transitions_not_found_error():
+    machine, _ = make_machine()
+    assert rejection(machine, "cancel", "rider", ride_id="missing") == (404, "Ride not found")
+    assert rejection(machine, "confirm", "rider", ride_id="missing") == (403, TRANSITIONS["confirm"].forbidden_detail)
+
+def test_either_party_may_cancel_until_the_ride_ends():
+    for actor_id in ("rider", "driver"):
+        machine, _ = make_machine(status="ongoing")
+        assert machine.transition("r1", "cancel", actor_id).status == "cancelled"
+
+    machine, _ = make_machine(status="completed")
+    assert rejection(machine, "cancel", "rider") == (400, TRANSITIONS["cancel"].invalid_status_detail)
+
+def test_second_of_two_racing_transitions_is_rejected():
+    machine, _ = make_machine(status="pending")
+    machine.transition("r1", "cancel", "rider")
+    assert rejection(machine, "confirm", "rider") == (400, TRANSITIONS["confirm"].invalid_status_detail)
@@ -0,0 +1,90 @@
+from shared.timer_wheel import TimerWheel
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+    def advance(self, seconds: float):
+        self.now += seconds
+
+def make_wheel(**kwargs):
+    clock = FakeClock()
+    return TimerWheel(clock=clock, **kwargs), clock
+
+def test_timer_fires_once_its_delay_has_elapsed():
+    wheel, clock = make_wheel()
+    wheel.schedule("ride", 3)
+
+    clock.advance(2)
+    assert wheel.advance() == []
+    clock.advance(1)
+    assert wheel.advance() == ["ride"]
+    assert "ride" not in wheel
+    clock.advance(10)
+    assert wheel.advance() == []
+
+def test_zero_delay_fires_on_next_tick():
+    wheel, clock = make_wheel()
+    wheel.schedule("ride", 0)
+    assert wheel.advance() == []
+    clock.advance(1)
+    assert wheel.advance() == ["ride"]
+
+def test_cancel_and_reschedule():
+    wheel, clock = make_wheel()
+    wheel.schedule("a", 5)
+    wheel.schedule("b", 5)
+    assert wheel.cancel("a") is True
+    assert wheel.cancel("a") is False
+    wheel.schedule("b", 10)  # re-arming replaces the earlier deadline
+    assert len(wheel) == 1
+
+    clock.advance(5)
+    assert wheel.advance() == []
+    clock.advance(5)
+    assert wheel.advance() == ["b"]
+
+def test_timers_cascade_from_higher_levels_on_time():
+    wheel, clock = make_wheel(slots_per_level=4, levels=3)
+    delays = [1, 3, 4, 5, 15, 16, 17, 40, 63]
+    for delay in delays:
+        wheel.schedule(delay, delay)
+
+    fired_at = {}
+    for second in range(1, 70):
+        clock.advance(1)
+        for key in wheel.advance():
+            fired_at[key] = second
+    assert fired_at == {delay: delay for delay in delays}
+
+def test_deadline_beyond_the_wheel_range_still_fires_on_time():
+    wheel, clock = make_wheel(slots_per_level=4, levels=2)  # range: 16 ticks
+    wheel.schedule("far", 50)
+
+    fired_at = None
+    for second in range(1, 60):
+        clock.advance(1)
+        if wheel.advance():
+            fired_at = second
+    assert fired_at == 50
+
+def test_advance_catches_up_on_missed_ticks():
+    wheel, clock = make_wheel()
+    for key, delay in (("a", 2), ("b", 30), ("c", 200)):
+        wheel.schedule(key, delay)
+
+    clock.advance(100)
+    assert sorted(wheel.advance()) == ["a", "b"]
+    clock.advance(100)
+    assert wheel.advance() == ["c"]
+
+def test_tick_size_rounds_deadlines_up():
+    wheel, clock = make_wheel(tick_seconds=0.5)
+    wheel.schedule("ride", 1.2)
+    clock.advance(1.0)
+    assert wheel.advance() == []
+    clock.advance(0.5)
+    assert wheel.advance() == ["ride"]